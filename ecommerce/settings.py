@@ -31,8 +31,11 @@ ALLOWED_HOSTS = ['.vercel.app']
 
 # Application definition
 
+# django.contrib.admin at /admin/. The staff dashboard at /dashboard/ does not
+# need it; turn it off where cold starts matter and it is not used.
+ADMIN_ENABLED = config('ADMIN_ENABLED', default=True, cast=bool)
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -43,13 +46,18 @@ INSTALLED_APPS = [
     'crispy_bootstrap5',
     'widget_tweaks',
 ]
+if ADMIN_ENABLED:
+    INSTALLED_APPS.insert(0, 'django.contrib.admin')
 
 MIDDLEWARE = [
+    'store.perf.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'store.assets.AssetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.routers.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,12 +68,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept for the life of the process, with DEBUG
+            # on too. `manage.py compile_templates` checks them all at deploy time.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.views.cart_items_count',
             ],
         },
     },
@@ -77,12 +93,127 @@ WSGI_APPLICATION = 'ecommerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE: 'sqlite' (default) or 'postgres' (needs the psycopg package,
+# and psycopg[pool] for DB_POOL).
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgres':
+    # A pool replaces persistent connections; Django refuses both at once.
+    DB_POOL = config('DB_POOL', default=False, cast=bool)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='ecommerce'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                    'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                    'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+                } if DB_POOL else False,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Take the write lock when a transaction starts, so two
+                # transactions never both read and then fail to upgrade.
+                'transaction_mode': config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+            },
+            # A file rather than an in-memory database so tests can use threads.
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+# Read replicas (store.routers): catalog and order-history reads go to these.
+# DB_REPLICAS lists SQLite files (kept in sync by `manage.py replicate`) or
+# PostgreSQL hosts; tests use the primary.
+DB_REPLICAS = [location.strip() for location in config('DB_REPLICAS', default='').split(',') if location.strip()]
+DB_REPLICA_ALIASES = []
+for number, location in enumerate(DB_REPLICAS, start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+        'HOST' if DB_ENGINE == 'postgres' else 'NAME': location,
+    }
+    DB_REPLICA_ALIASES.append(alias)
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+# How long a session reads from the primary after it wrote something
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=15, cast=int)
+
+# PRAGMAs store.db runs on every new SQLite connection
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='wal'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='normal'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-32000, cast=int),  # negative: KiB
+    'temp_store': 'memory',
+}
+
+# Product search: 'auto', 'sqlite' (FTS5), 'postgres' (tsvector) or 'python'
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='auto')
+SEARCH_MAX_RESULTS = config('SEARCH_MAX_RESULTS', default=1000, cast=int)
+
+# Order numbers reserved per worker process at a time (1 = no caching)
+ORDER_NUMBER_BLOCK_SIZE = config('ORDER_NUMBER_BLOCK_SIZE', default=1, cast=int)
+
+
+# Cache: 'locmem', 'file' or 'redis' (any Redis-compatible server, needs the
+# redis package). CACHE_LOCATION overrides the default location of each.
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'store'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379'),
+}
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': config('CACHE_LOCATION', default=CACHE_BACKENDS[CACHE_BACKEND][1]),
     }
 }
+STORE_CACHE_TIMEOUT = config('STORE_CACHE_TIMEOUT', default=600, cast=int)
+
+
+# Request instrumentation (store.perf): Server-Timing headers (for staff
+# only unless PERF_SERVER_TIMING), per-view latency histograms at
+# /dashboard/perf/ and an opt-in sampling profiler for slow requests.
+PERF_ENABLED = config('PERF_ENABLED', default=True, cast=bool)
+PERF_SERVER_TIMING = config('PERF_SERVER_TIMING', default=DEBUG, cast=bool)
+PERF_WINDOW = config('PERF_WINDOW', default=1000, cast=int)
+PERF_SLOW_MS = config('PERF_SLOW_MS', default=500, cast=int)
+PERF_PROFILE = config('PERF_PROFILE', default=False, cast=bool)
+PERF_PROFILE_INTERVAL_MS = config('PERF_PROFILE_INTERVAL_MS', default=5, cast=float)
+PERF_PROFILE_DIR = config('PERF_PROFILE_DIR', default=os.path.join(BASE_DIR, 'profiles'))
+PERF_PROFILE_KEEP = config('PERF_PROFILE_KEEP', default=50, cast=int)
+
+# Work ecommerce/wsgi.py can do before the first request (store.startup): load
+# the URLconf and views and compile these templates. It makes the import
+# longer, so only turn it on where instances start ahead of traffic.
+# `manage.py profile_startup` measures the cold start.
+WARM_ON_STARTUP = config('WARM_ON_STARTUP', default=False, cast=bool)
+WARM_TEMPLATES = [
+    'store/home.html',
+    'store/product_list.html',
+    'store/product_detail.html',
+    'store/pagination.html',
+    'store/cart.html',
+    'store/checkout.html',
+    'store/login.html',
+    'store/register.html',
+]
 
 
 # Password validation
@@ -126,6 +257,22 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# collectstatic writes content-hashed names plus gzip/brotli copies (store.storage)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'store.storage.CompressedManifestStaticFilesStorage'},
+}
+
+# Serve /static/ and /media/ from the app (store.assets); turn off when a web
+# server or CDN serves them. Hashed static files are cached for a year.
+SERVE_ASSETS = config('SERVE_ASSETS', default=True, cast=bool)
+STATIC_MAX_AGE = config('STATIC_MAX_AGE', default=60, cast=int)
+MEDIA_MAX_AGE = config('MEDIA_MAX_AGE', default=86400, cast=int)
+
+# Resized WebP/JPEG copies of uploaded images (store.images)
+IMAGE_DERIVATIVES_DIR = 'derivatives'
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=2, cast=int)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
@@ -139,6 +286,30 @@ STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY', default='')
 PAYSTACK_PUBLIC_KEY = config('PAYSTACK_PUBLIC_KEY', default='')
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+
+# Payment verification (store.payments): which gateway confirms each payment
+# method, where the gateways live (point these at a fake server in tests) and
+# how the shared HTTP connection pool behaves.
+PAYMENT_PROVIDERS = {
+    'card': config('CARD_PAYMENT_PROVIDER', default='stripe'),
+    'transfer': config('TRANSFER_PAYMENT_PROVIDER', default='paystack'),
+}
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='https://api.stripe.com')
+PAYSTACK_API_BASE = config('PAYSTACK_API_BASE', default='https://api.paystack.co')
+PAYMENT_HTTP_TIMEOUT = (3.05, config('PAYMENT_HTTP_READ_TIMEOUT', default=10, cast=float))
+PAYMENT_HTTP_POOL_SIZE = config('PAYMENT_HTTP_POOL_SIZE', default=10, cast=int)
+
+# Email (console by default; set EMAIL_BACKEND to smtp in production)
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='support@imperiallumine.com')
+
+# Background tasks (store.queue, run with `manage.py run_workers`)
+TASK_WORKERS = config('TASK_WORKERS', default=2, cast=int)
+TASK_POLL_SECONDS = config('TASK_POLL_SECONDS', default=1.0, cast=float)
+TASK_LEASE_SECONDS = config('TASK_LEASE_SECONDS', default=300, cast=int)
+TASK_BACKOFF_SECONDS = config('TASK_BACKOFF_SECONDS', default=5, cast=int)
+TASK_BACKOFF_MAX_SECONDS = config('TASK_BACKOFF_MAX_SECONDS', default=3600, cast=int)
 
 LOGIN_URL = '/login/'  # Match your actual login URL pattern
 LOGIN_REDIRECT_URL = '/'  # Where to redirect after successful login
@@ -9,10 +9,17 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
 
 application = get_wsgi_application()
 
+# Do the first request's setup work now (store.startup).
+if settings.WARM_ON_STARTUP:
+    from store.startup import warm
+
+    warm()
+
 app = application
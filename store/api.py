@@ -0,0 +1,150 @@
+# store/api.py
+"""
+JSON cart API.
+
+``GET  /api/cart/`` returns the cart and its totals.
+``POST /api/cart/`` takes a batch of quantity changes::
+
+    {"items": [{"product_id": 3, "quantity": 2}, {"product_id": 7, "quantity": 0}]}
+
+Quantities are absolute; 0 removes the product. The whole batch is applied in
+one transaction with a single upsert (plus one DELETE for removals) and the
+response carries the new cart, so a page can update without reloading.
+
+``POST /api/payments/<provider>/webhook/`` receives gateway webhooks. It only
+checks the signature and queues a ``verify_payment`` task; the gateway is
+asked about the payment by a worker, never by the request.
+
+The views are async and run natively under ``ecommerce.asgi``.
+"""
+import json
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, require_POST
+
+from . import cart_summary, payments, queue, tasks
+from .models import Cart, Product
+
+MAX_BATCH_SIZE = 100
+
+
+class CartChangeError(Exception):
+    pass
+
+
+def parse_changes(body):
+    """Return ``{product_id: quantity}`` from a request body."""
+    try:
+        items = json.loads(body or b'{}').get('items')
+    except (ValueError, AttributeError):
+        raise CartChangeError('Request body must be a JSON object.')
+    if not isinstance(items, list) or not items:
+        raise CartChangeError('"items" must be a non-empty list.')
+    if len(items) > MAX_BATCH_SIZE:
+        raise CartChangeError(f'At most {MAX_BATCH_SIZE} items can be changed at once.')
+
+    changes = {}
+    for item in items:
+        try:
+            product_id, quantity = int(item['product_id']), int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CartChangeError('Every item needs an integer "product_id" and "quantity".')
+        if quantity < 0:
+            raise CartChangeError('Quantities cannot be negative.')
+        changes[product_id] = quantity
+    return changes
+
+
+@transaction.atomic
+def apply_changes(user, changes):
+    updates = {pk: quantity for pk, quantity in changes.items() if quantity}
+    removals = [pk for pk, quantity in changes.items() if not quantity]
+
+    if updates:
+        products = Product.objects.filter(pk__in=updates, available=True).only('id', 'name', 'stock').in_bulk()
+        for pk, quantity in updates.items():
+            product = products.get(pk)
+            if product is None:
+                raise CartChangeError(f'Product {pk} is not available.')
+            if quantity > product.stock:
+                raise CartChangeError(f'Only {product.stock} of {product.name} left in stock.')
+        Cart.objects.bulk_create(
+            [Cart(user=user, product_id=pk, quantity=quantity) for pk, quantity in updates.items()],
+            update_conflicts=True,
+            unique_fields=['user', 'product'],
+            update_fields=['quantity'],
+        )
+
+    if removals:
+        Cart.objects.filter(user=user, product_id__in=removals).delete()
+
+
+def cart_payload(request, user):
+    cart_items = list(Cart.objects.filter(user=user).select_related('product').order_by('added_at'))
+    count, subtotal = cart_summary.recalculate(request, cart_items)
+    return {
+        'items': [
+            {
+                'id': item.pk,
+                'product_id': item.product_id,
+                'name': item.product.name,
+                'price': str(item.product.price),
+                'quantity': item.quantity,
+                'total': str(item.get_total_price()),
+            }
+            for item in cart_items
+        ],
+        'count': count,
+        'subtotal': str(Decimal(subtotal).quantize(cart_summary.CENTS)),
+    }
+
+
+def update_cart(request, user, changes):
+    apply_changes(user, changes)
+    return cart_payload(request, user)
+
+
+@require_http_methods(['GET', 'POST'])
+async def cart(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+
+    if request.method == 'GET':
+        return JsonResponse(await sync_to_async(cart_payload)(request, user))
+
+    try:
+        changes = parse_changes(request.body)
+        payload = await sync_to_async(update_cart)(request, user, changes)
+    except CartChangeError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(payload)
+
+
+def queue_verification(provider, event_id, reference):
+    payment = payments.find_payment(reference)
+    if payment is None or payment.provider != provider.name:
+        return False
+    queue.enqueue(tasks.verify_payment, key=f'payment-webhook:{provider.name}:{event_id}', payment_id=payment.pk)
+    return True
+
+
+@csrf_exempt
+@require_POST
+async def payment_webhook(request, provider):
+    try:
+        provider = payments.get_provider(provider)
+    except LookupError:
+        return JsonResponse({'error': 'Unknown provider.'}, status=404)
+    try:
+        event_id, reference = provider.parse_webhook(request)
+    except (payments.WebhookError, ValueError):
+        return JsonResponse({'error': 'Invalid signature.'}, status=400)
+
+    # Acknowledge events for unknown payments too, or the gateway keeps retrying.
+    queued = await sync_to_async(queue_verification)(provider, event_id, reference)
+    return JsonResponse({'queued': queued})
@@ -0,0 +1,232 @@
+# store/assets.py
+"""
+Static and media files served by the application itself.
+
+Every request, assets included, reaches Django through ``ecommerce/wsgi.py``
+(see ``vercel.json``), so ``AssetMiddleware`` answers ``STATIC_URL`` and
+``MEDIA_URL`` paths before the session, auth and CSRF middleware run:
+
+* the precompressed ``.br`` or ``.gz`` copy written by ``collectstatic``
+  (``store.storage``) is sent when the browser accepts it;
+* static files with a content hash in their name are cached for a year
+  (``immutable``); other static files for ``STATIC_MAX_AGE`` seconds and
+  media files for ``MEDIA_MAX_AGE`` seconds;
+* responses carry an ETag and Last-Modified, and ``If-None-Match`` or
+  ``If-Modified-Since`` get a 304;
+* single byte ranges get a 206;
+* files go out through ``FileResponse``, so a server with ``wsgi.file_wrapper``
+  (gunicorn) uses sendfile.
+
+Turn it off with ``SERVE_ASSETS = False`` when a web server or CDN serves the
+files.
+"""
+import mimetypes
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .storage import ENCODINGS
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Names ManifestStaticFilesStorage gives files: name.<12 hex digits>.ext
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _Limited:
+    """The next ``length`` bytes of an open file."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _url_prefix(url):
+    # Absolute URLs (a CDN) are not served from here.
+    if not url or '://' in url:
+        return None
+    return '/' + url.lstrip('/')
+
+
+def resolve(root, path):
+    """The file ``path`` under ``root``, or ``None`` if it is missing or outside ``root``."""
+    if not root:
+        return None
+    root = os.path.realpath(root)
+    full = os.path.realpath(os.path.join(root, path))
+    if not full.startswith(root + os.sep) or not os.path.isfile(full):
+        return None
+    return full
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding and params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def byte_range(request, size, etag):
+    """
+    ``(start, end)`` of the single range requested, ``None`` for the whole
+    file, or ``False`` if the range cannot be satisfied.
+    """
+    header = request.headers.get('Range')
+    if not header or request.method != 'GET':
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Multiple or malformed ranges: send the whole file.
+        return None
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def file_response(request, path, cache_control, variants=False):
+    """
+    Serve the file at ``path``; with ``variants``, the compressed copy of it
+    the browser accepts, if there is one.
+    """
+    served, encoding = path, ''
+    if variants:
+        accepted = accepted_encodings(request)
+        for coding, suffix in ENCODINGS:
+            if coding in accepted and os.path.isfile(path + suffix):
+                served, encoding = path + suffix, coding
+                break
+
+    stat = os.stat(served)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control,
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        file = open(served, 'rb')
+        # Ranges are only offered on the uncompressed file.
+        requested = None if encoding else byte_range(request, stat.st_size, etag)
+        if requested is False:
+            file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif requested:
+            start, end = requested
+            file.seek(start)
+            length = end - start + 1
+            # Up to the end of the file, the file itself can be sent with sendfile.
+            body = file if end == stat.st_size - 1 else _Limited(file, length)
+            response = FileResponse(body, status=206, content_type=content_type, filename=os.path.basename(path))
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = length
+        else:
+            response = FileResponse(file, content_type=content_type, filename=os.path.basename(path))
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+        # Served inline; the filename is only there for FileResponse.
+        del response['Content-Disposition']
+
+    for name, value in headers.items():
+        response[name] = value
+    if variants:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+class AssetMiddleware:
+    """Put it right after ``SecurityMiddleware``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.static_prefix = _url_prefix(settings.STATIC_URL)
+        self.media_prefix = _url_prefix(settings.MEDIA_URL)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.wants(request):
+            response = self.serve(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.wants(request):
+            # Looking up and opening the file is blocking I/O; keep it off the event loop.
+            response = await sync_to_async(self.serve, thread_sensitive=False)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def wants(self, request):
+        """Whether ``request`` may be for an asset."""
+        if request.method not in ('GET', 'HEAD') or not getattr(settings, 'SERVE_ASSETS', True):
+            return False
+        path = request.path_info
+        return any(prefix and path.startswith(prefix) for prefix in (self.static_prefix, self.media_prefix))
+
+    def serve(self, request):
+        path = request.path_info
+        if self.static_prefix and path.startswith(self.static_prefix):
+            name = path[len(self.static_prefix):]
+            found = resolve(settings.STATIC_ROOT, name)
+            if found is None and settings.DEBUG:
+                # Not collected yet: serve from the app and project directories.
+                found = finders.find(name)
+            if found is None:
+                return None
+            if HASHED_NAME.search(name):
+                cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+            else:
+                cache_control = f"public, max-age={getattr(settings, 'STATIC_MAX_AGE', 60)}"
+            return file_response(request, found, cache_control, variants=True)
+
+        if self.media_prefix and path.startswith(self.media_prefix):
+            found = resolve(settings.MEDIA_ROOT, path[len(self.media_prefix):])
+            if found is None:
+                return None
+            # Uploads can be replaced under the same name, so browsers revalidate
+            # with If-None-Match once this expires.
+            cache_control = f"public, max-age={getattr(settings, 'MEDIA_MAX_AGE', 86400)}"
+            return file_response(request, found, cache_control)
+        return None
@@ -0,0 +1,691 @@
+# store/benchmarks.py
+"""
+Load benchmarks for the storefront and checkout flows.
+
+``seed()`` builds a catalog of any size, from a thousand to a million
+products, in fixed-size chunks so memory stays flat, plus customers with
+addresses, carts and order history. Each ``Scenario`` is one request a
+shopper makes: browsing the home page, listing, searching and sorting
+products, opening a product, adding it to the cart and checking out.
+
+``run_client()`` sends every scenario through the Django test client one
+request at a time and counts the queries each one runs; ``run_http()`` fires
+them at a live server from ``concurrency`` threads over keep-alive
+connections. Both return, per scenario, the p50/p95/p99 latency in
+milliseconds, throughput and error count. ``render_templates()`` times the
+page template of each scenario on its own, re-rendering it with the context
+the view built. ``compare()`` checks a run against a saved baseline.
+
+``sqlite_writes()`` measures SQLite write concurrency on its own, with and
+without the connection tuning in ``store.db``.
+
+``manage.py benchmark`` runs all of this against a separate test database.
+
+``cold_start()`` starts fresh interpreters the way a new serverless instance
+does, imports the WSGI application and serves one page, and reports where
+the time went (``manage.py profile_startup``).
+"""
+import itertools
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Callable, NamedTuple
+
+import requests
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.signals import template_rendered
+from django.test.testcases import LiveServerThread, _StaticFilesHandler
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from . import facets, metrics, search
+from .db import apply_pragmas
+from .models import Address, Cart, Category, Order, OrderItem, Product, UserProfile
+from .perf import percentile
+
+# Words product names are built from, so searches match many products.
+ADJECTIVES = ['classic', 'silk', 'leather', 'linen', 'velvet', 'woven', 'golden', 'royal', 'denim', 'cotton']
+NOUNS = ['dress', 'shirt', 'handbag', 'sandal', 'scarf', 'jacket', 'wrapper', 'necklace', 'cap', 'belt']
+
+SORTS = ['newest', 'price_low', 'price_high', 'discount']
+
+CUSTOMER_PREFIX = 'bench-customer-'
+
+# Stock large enough that checkout never runs out during a benchmark.
+STOCK = 10 ** 6
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _log(stdout, message):
+    if stdout:
+        stdout.write(message)
+
+
+def seed(products=1000, customers=20, orders=None, cart_items=3, batch_size=2000, image='products/rack.jpeg',
+         stdout=None):
+    """
+    Create ``products`` products, ``customers`` customers with an address and
+    ``cart_items`` items in their cart, and ``orders`` orders (default: one per
+    ten products) of two items each. Rebuild the search index, sales
+    metrics and facet counts afterwards, since bulk inserts bypass the signals.
+    """
+    orders = products // 10 if orders is None else orders
+    categories = list(Category.objects.all()) or Category.objects.bulk_create(
+        Category(name=name, slug=name.replace('_', '-'))
+        for name, _ in Category.CATEGORY_CHOICES
+    )
+
+    rows = (
+        Product(
+            category=categories[i % len(categories)],
+            name=f'{ADJECTIVES[i % 10].title()} {NOUNS[i // 10 % 10]} {i}',
+            slug=f'bench-{i}',
+            description=f'{ADJECTIVES[i // 100 % 10]} {NOUNS[i % 10]} number {i}',
+            price=Decimal(500 + i % 50000),
+            old_price=Decimal(1000 + i % 50000) if i % 4 == 0 else None,
+            stock=STOCK,
+            image=image,
+        )
+        for i in range(products)
+    )
+    for done, chunk in enumerate(_chunks(rows, batch_size), start=1):
+        Product.objects.bulk_create(chunk)
+        _log(stdout, f'Products: {min(done * batch_size, products)}/{products}')
+    bounds = Product.objects.filter(slug__startswith='bench-').aggregate(low=Min('pk'), high=Max('pk'))
+
+    password = make_password(None)
+    users = User.objects.bulk_create(
+        User(username=f'{CUSTOMER_PREFIX}{i}', password=password) for i in range(customers)
+    )
+    UserProfile.objects.bulk_create(UserProfile(user=user) for user in users)
+    addresses = Address.objects.bulk_create(
+        Address(
+            user=user, full_name=f'Customer {i}', phone_number='08000000000',
+            address_line1=f'{i} Market Road', city='Lagos', state='Lagos',
+            postal_code='100001', is_default=True,
+        )
+        for i, user in enumerate(users)
+    )
+    if products:
+        Cart.objects.bulk_create(
+            Cart(user=user, product_id=bounds['low'] + (i * cart_items + n) % products)
+            for i, user in enumerate(users) for n in range(cart_items)
+        )
+
+    statuses = [status for status, _ in Order.STATUS_CHOICES]
+    rows = (
+        Order(
+            user=users[i % customers],
+            order_number=f'ORD-BENCH-{i:08d}',
+            delivery_number=f'DEL-BENCH-{i:08d}',
+            status=statuses[i % len(statuses)],
+            payment_method='card',
+            payment_status=i % 2 == 0,
+            total_amount=Decimal(1000 + i % 50000),
+            shipping_address=addresses[i % customers],
+        )
+        for i in range(orders if customers and products else 0)
+    )
+    for done, chunk in enumerate(_chunks(rows, batch_size), start=1):
+        created = Order.objects.bulk_create(chunk)
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                product_id=bounds['low'] + (order.pk * 7 + n) % products,
+                quantity=1,
+                price=order.total_amount / 2,
+            )
+            for order in created for n in range(2)
+        )
+        _log(stdout, f'Orders: {min(done * batch_size, orders)}/{orders}')
+
+    _log(stdout, 'Rebuilding the search index, sales metrics and facet counts...')
+    search.rebuild(batch_size=batch_size)
+    metrics.rebuild()
+    facets.rebuild()
+
+
+class Context(NamedTuple):
+    """What the scenarios pick their URLs from."""
+    products: list      # (id, slug) samples
+    categories: list    # slugs
+    customers: list     # (user, address id)
+    terms: list         # search queries
+
+
+def load_context(samples=500, seed=0):
+    """Sample the products and customers the scenarios will request."""
+    rng = random.Random(seed)
+    bounds = Product.objects.filter(available=True).aggregate(low=Min('pk'), high=Max('pk'))
+    products = []
+    if bounds['low'] is not None:
+        span = range(bounds['low'], bounds['high'] + 1)
+        ids = rng.sample(span, min(samples, len(span)))
+        products = list(Product.objects.filter(pk__in=ids, available=True).values_list('pk', 'slug'))
+    customers = [
+        (address.user, address.pk)
+        for address in Address.objects.filter(user__username__startswith=CUSTOMER_PREFIX, is_default=True)
+        .select_related('user').order_by('pk')
+    ]
+    return Context(
+        products=products,
+        categories=list(Category.objects.values_list('slug', flat=True)),
+        customers=customers,
+        terms=[f'{adjective} {noun}' for adjective in ADJECTIVES for noun in NOUNS[:3]] + NOUNS,
+    )
+
+
+def _pick(items, i):
+    return items[i * 7919 % len(items)]
+
+
+def _home(ctx, i, customer):
+    return 'get', reverse('store:home'), None
+
+
+def _product_list(ctx, i, customer):
+    url = reverse('store:product_list')
+    if i % 2 and ctx.categories:
+        url = reverse('store:product_list_by_category', kwargs={'category_slug': _pick(ctx.categories, i)})
+    return 'get', f'{url}?sort={SORTS[i % len(SORTS)]}', None
+
+
+def _product_search(ctx, i, customer):
+    query = _pick(ctx.terms, i).replace(' ', '+')
+    sort = f'&sort={SORTS[i % len(SORTS)]}' if i % 3 == 0 else ''
+    return 'get', f"{reverse('store:product_list')}?q={query}{sort}", None
+
+
+def _product_detail(ctx, i, customer):
+    return 'get', reverse('store:product_detail', kwargs={'slug': _pick(ctx.products, i)[1]}), None
+
+
+def _add_to_cart(ctx, i, customer):
+    return 'post', reverse('store:add_to_cart', kwargs={'product_id': _pick(ctx.products, i)[0]}), {}
+
+
+def _checkout(ctx, i, customer):
+    user, address_id = customer
+    return 'post', reverse('store:checkout'), {'address': address_id, 'payment_method': 'cash_on_delivery'}
+
+
+class Scenario(NamedTuple):
+    name: str
+    request: Callable           # (context, iteration, customer) -> (method, path, data)
+    login: bool = False
+    prepare: Callable = None    # request sent untimed before each timed one
+    expect: tuple = (200,)
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [
+        Scenario('home', _home),
+        Scenario('product_list', _product_list),
+        Scenario('product_search', _product_search),
+        Scenario('product_detail', _product_detail),
+        Scenario('add_to_cart', _add_to_cart, login=True, expect=(302,)),
+        # Every checkout needs a cart, so add one product first.
+        Scenario('checkout', _checkout, login=True, prepare=_add_to_cart, expect=(302,)),
+    ]
+}
+
+
+def summarize(latencies, elapsed, errors=0, queries=None):
+    """Summary of one scenario run; latencies are in seconds, the summary in milliseconds."""
+    ordered = sorted(latencies)
+    summary = {'requests': len(ordered), 'errors': errors}
+    for q in (50, 95, 99):
+        summary[f'p{q}'] = round(percentile(ordered, q) * 1000, 2) if ordered else None
+    summary['mean'] = round(statistics.fmean(ordered) * 1000, 2) if ordered else None
+    summary['rps'] = round(len(ordered) / elapsed, 1) if elapsed else None
+    summary['queries'] = round(statistics.fmean(queries), 1) if queries else None
+    return summary
+
+
+def _send(client, method, path, data):
+    response = getattr(client, method)(path, data) if method == 'post' else client.get(path)
+    # Flash messages are never displayed here; drop them so the cookie (or
+    # session) does not grow with every request.
+    client.cookies.pop('messages', None)
+    return response
+
+
+def run_client(names, ctx, iterations=100, warmup=5, cold_cache=False):
+    """Run each scenario ``iterations`` times through the test client; return ``{name: summary}``."""
+    results = {}
+    for name in names:
+        scenario = SCENARIOS[name]
+        client = Client()
+        customer = ctx.customers[0] if ctx.customers else None
+        if scenario.login:
+            client.force_login(customer[0])
+
+        latencies, queries, errors = [], [], 0
+        for i in range(-warmup, iterations):
+            if scenario.prepare:
+                _send(client, *scenario.prepare(ctx, i, customer))
+            if cold_cache:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = _send(client, *scenario.request(ctx, i, customer))
+                took = time.perf_counter() - start
+            if i < 0:
+                continue
+            latencies.append(took)
+            queries.append(len(captured))
+            errors += response.status_code not in scenario.expect
+        # Throughput of the timed requests only, not the untimed preparation.
+        results[name] = summarize(latencies, sum(latencies), errors, queries)
+    return results
+
+
+def render_templates(names, ctx, iterations=100, cold_cache=False):
+    """
+    Request each GET scenario once through the test client, then render its
+    page template ``iterations`` more times with the context the view built.
+    Return ``{template name: summary}``; a template several scenarios render
+    is timed with the first one's context. Needs the test environment, which
+    reports rendered templates.
+    """
+    results = {}
+    for name in names:
+        scenario = SCENARIOS[name]
+        client = Client()
+        customer = ctx.customers[0] if ctx.customers else None
+        if scenario.login:
+            client.force_login(customer[0])
+        method, path, data = scenario.request(ctx, 0, customer)
+        if method != 'get':
+            continue
+
+        rendered = []
+
+        def capture(sender, template, context, **kwargs):
+            rendered.append((template, context))
+
+        template_rendered.connect(capture)
+        try:
+            response = _send(client, method, path, data)
+        finally:
+            template_rendered.disconnect(capture)
+        # The page template starts rendering first; base and included ones follow.
+        template, context = rendered[0]
+        if template.name in results:
+            continue
+
+        latencies, queries, errors = [], [], int(response.status_code not in scenario.expect)
+        for _ in range(iterations):
+            if cold_cache:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                template.render(context)
+                latencies.append(time.perf_counter() - start)
+            queries.append(len(captured))
+        results[template.name] = summarize(latencies, sum(latencies), errors, queries)
+    return results
+
+
+@contextmanager
+def live_server(host='127.0.0.1'):
+    """Serve the site from a multithreaded WSGI server in this process; yield its base URL."""
+    thread = LiveServerThread(host, _StaticFilesHandler)
+    thread.daemon = True
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, host]):
+        thread.start()
+        thread.is_ready.wait()
+        if thread.error:
+            raise thread.error
+        try:
+            yield f'http://{host}:{thread.port}'
+        finally:
+            thread.terminate()
+
+
+def _http_session(customer, login):
+    session = requests.Session()
+    # Any 32-character secret is a valid CSRF cookie; send it back as the header.
+    token = get_random_string(32)
+    session.cookies.set(settings.CSRF_COOKIE_NAME, token)
+    session.headers['X-CSRFToken'] = token
+    if login:
+        client = Client()
+        client.force_login(customer[0])
+        session.cookies.set(settings.SESSION_COOKIE_NAME, client.cookies[settings.SESSION_COOKIE_NAME].value)
+    return session
+
+
+def run_http(names, ctx, base_url, requests_per_scenario=200, concurrency=8, timeout=30):
+    """
+    Send ``requests_per_scenario`` requests per scenario to ``base_url`` from
+    ``concurrency`` threads, each with its own customer and keep-alive
+    connection; return ``{name: summary}``.
+    """
+    results = {}
+    for name in names:
+        scenario = SCENARIOS[name]
+        counter = itertools.count()
+        lock = threading.Lock()
+        latencies, errors = [], [0]
+
+        def worker(number):
+            customer = ctx.customers[number % len(ctx.customers)] if ctx.customers else None
+            session = _http_session(customer, scenario.login)
+            with session:
+                while (i := next(counter)) < requests_per_scenario:
+                    if scenario.prepare:
+                        method, path, data = scenario.prepare(ctx, i, customer)
+                        session.request(method, base_url + path, data=data, allow_redirects=False, timeout=timeout)
+                    method, path, data = scenario.request(ctx, i, customer)
+                    start = time.perf_counter()
+                    try:
+                        response = session.request(
+                            method, base_url + path, data=data, allow_redirects=False, timeout=timeout,
+                        )
+                        failed = response.status_code not in scenario.expect
+                    except requests.RequestException:
+                        failed = True
+                    took = time.perf_counter() - start
+                    session.cookies.pop('messages', None)
+                    with lock:
+                        latencies.append(took)
+                        errors[0] += failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        elapsed = time.perf_counter() - started
+        # Preparation requests are included in the wall time, so checkout
+        # throughput is per completed add-and-checkout pair.
+        results[name] = summarize(latencies, elapsed, errors[0])
+    return results
+
+
+def save_baseline(path, results, meta=None):
+    with open(path, 'w') as f:
+        json.dump({'meta': meta or {}, 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class Change(NamedTuple):
+    key: str
+    metric: str
+    baseline: float
+    current: float
+    change: float       # relative, e.g. 0.25 for +25%
+    regressed: bool
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compare ``results`` with ``baseline`` results (both ``{key: summary}``).
+    p95 latency may grow and throughput may drop by ``threshold`` before it
+    counts as a regression; any extra query or error always does.
+    """
+    changes = []
+    for key, current in sorted(results.items()):
+        old = baseline.get(key)
+        if not old:
+            continue
+        for metric, worse in (('p95', 1), ('rps', -1), ('queries', 1), ('errors', 1)):
+            before, after = old.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else (math.inf if after else 0.0)
+            if metric in ('queries', 'errors'):
+                regressed = after > before
+            else:
+                regressed = change * worse > threshold
+            changes.append(Change(key, metric, before, after, change, regressed))
+    return changes
+
+
+# SQLite as Django opens it without store.db: rollback journal, full fsync,
+# deferred transactions and Python's 5 second busy timeout.
+SQLITE_DEFAULTS = {'journal_mode': 'delete', 'synchronous': 'full'}
+
+
+def sqlite_writes(path, pragmas, immediate, writers=8, transactions=100, readers=2, timeout=5.0):
+    """
+    Run ``transactions`` checkout-shaped transactions (read a product's stock,
+    update it, insert an order) from each of ``writers`` threads against a
+    new SQLite database at ``path``, while ``readers`` threads keep
+    aggregating the orders table. Return the write summary plus ``reads``,
+    the reads per second.
+    """
+    products = 50
+    setup = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(setup, pragmas)
+    setup.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, stock INTEGER NOT NULL)')
+    setup.execute('CREATE TABLE orders (id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL, total INTEGER NOT NULL)')
+    setup.executemany('INSERT INTO product (stock) VALUES (?)', [(STOCK,)] * products)
+    setup.close()
+
+    def connect():
+        db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        apply_pragmas(db, pragmas)
+        return db
+
+    lock = threading.Lock()
+    latencies, errors, reads = [], [0], [0]
+    stop = threading.Event()
+
+    def write(number):
+        db = connect()
+        for i in range(transactions):
+            product = (number * transactions + i) % products + 1
+            start = time.perf_counter()
+            try:
+                db.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+                stock = db.execute('SELECT stock FROM product WHERE id = ?', (product,)).fetchone()[0]
+                db.execute('UPDATE product SET stock = ? WHERE id = ?', (stock - 1, product))
+                db.execute('INSERT INTO orders (product_id, total) VALUES (?, ?)', (product, 1000))
+                db.execute('COMMIT')
+                failed = False
+            except sqlite3.OperationalError:
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+                failed = True
+            took = time.perf_counter() - start
+            with lock:
+                latencies.append(took)
+                errors[0] += failed
+        db.close()
+
+    def read():
+        db = connect()
+        while not stop.is_set():
+            try:
+                db.execute('SELECT COUNT(*), SUM(total) FROM orders').fetchone()
+            except sqlite3.OperationalError:
+                continue
+            with lock:
+                reads[0] += 1
+        db.close()
+
+    reader_threads = [threading.Thread(target=read) for _ in range(readers)]
+    for thread in reader_threads:
+        thread.start()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=writers) as pool:
+            list(pool.map(write, range(writers)))
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in reader_threads:
+            thread.join()
+    summary = summarize(latencies, elapsed, errors[0])
+    summary['reads'] = round(reads[0] / elapsed, 1)
+    return summary
+
+
+def sqlite_write_comparison(directory, **options):
+    """``{'default': summary, 'tuned': summary}`` for ``sqlite_writes`` in ``directory``."""
+    return {
+        'default': sqlite_writes(os.path.join(directory, 'default.sqlite3'), SQLITE_DEFAULTS, False, **options),
+        'tuned': sqlite_writes(
+            os.path.join(directory, 'tuned.sqlite3'), settings.SQLITE_PRAGMAS,
+            settings.DATABASES['default'].get('OPTIONS', {}).get('transaction_mode') == 'IMMEDIATE', **options,
+        ),
+    }
+
+
+# Run by cold_start() in a new interpreter: argv is the WSGI module, the
+# application attribute, the path and the host. Prints one JSON line.
+_COLD_START_SCRIPT = """
+import io, json, sys, time
+from contextlib import ExitStack
+start = time.perf_counter()
+# __import__ rather than importlib, which -X importtime does not report.
+__import__(sys.argv[1])
+application = getattr(sys.modules[sys.argv[1]], sys.argv[2])
+loaded = time.perf_counter()
+
+from django.db import connections
+queries = []
+
+def count(execute, sql, params, many, context):
+    queries[-1] += 1
+    return execute(sql, params, many, context)
+
+def get(path, host):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': host,
+        'SERVER_PORT': '443', 'HTTP_HOST': host, 'wsgi.url_scheme': 'https',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+    }
+    status = []
+    queries.append(0)
+    began = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(count))
+        response = application(environ, lambda s, headers, exc_info=None: status.append(int(s[:3])))
+        b''.join(response)
+        response.close()
+    return status[0], time.perf_counter() - began
+
+status, first = get(sys.argv[3], sys.argv[4])
+_, second = get(sys.argv[3], sys.argv[4])
+print(json.dumps({
+    'status': status, 'load': loaded - start, 'first': first, 'second': second, 'queries': queries[0],
+}))
+"""
+
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+class Import(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int      # 0 for modules the program imported itself
+
+
+def parse_importtime(text):
+    """The ``Import`` rows in ``python -X importtime`` output, in the order printed."""
+    rows = []
+    for line in text.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append(Import(module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def package_times(rows):
+    """``Counter`` of top-level package -> milliseconds spent importing its modules."""
+    totals = Counter()
+    for row in rows:
+        totals[row.module.partition('.')[0]] += row.self_us / 1000
+    return totals
+
+
+def startup_host():
+    """A host name ``ALLOWED_HOSTS`` accepts."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.') or 'localhost'
+    return 'localhost'
+
+
+def cold_start(path='/', runs=5, warm=None, timeout=120):
+    """
+    Start ``runs`` interpreters (``python -X importtime``) that each import
+    ``WSGI_APPLICATION`` and ``GET`` ``path`` twice; ``warm``, unless
+    ``None``, overrides ``WARM_ON_STARTUP`` in them.
+
+    Return ``(summary, imports)``. The summary has the median ``load``
+    (importing the WSGI module), ``first`` and ``second`` request, ``total``
+    (load and first request, also as p50 and p95) and ``process`` (the whole
+    interpreter, startup and exit included) in milliseconds, plus the queries
+    of the first request and the modules imported. ``imports`` are the
+    ``Import`` rows of the median run.
+
+    Raises ``RuntimeError`` with the end of its stderr if an interpreter fails.
+    """
+    module, _, attribute = settings.WSGI_APPLICATION.rpartition('.')
+    env = dict(os.environ)
+    if warm is not None:
+        env['WARM_ON_STARTUP'] = str(warm)
+    command = [sys.executable, '-X', 'importtime', '-c', _COLD_START_SCRIPT, module, attribute, path, startup_host()]
+    samples, errors = [], 0
+    for _ in range(runs):
+        began = time.perf_counter()
+        done = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+                              timeout=timeout)
+        process = time.perf_counter() - began
+        if done.returncode:
+            raise RuntimeError(done.stderr[-2000:])
+        sample = json.loads(done.stdout.strip().splitlines()[-1])
+        errors += sample['status'] >= 400
+        sample.update(total=sample['load'] + sample['first'], process=process, imports=done.stderr)
+        samples.append(sample)
+
+    def ms(seconds):
+        return round(seconds * 1000, 1)
+
+    totals = sorted(sample['total'] for sample in samples)
+    median = min(samples, key=lambda sample: abs(sample['total'] - statistics.median(totals)))
+    summary = {
+        'runs': runs,
+        'errors': errors,
+        'p50': ms(percentile(totals, 50)),
+        'p95': ms(percentile(totals, 95)),
+        'queries': median['queries'],
+        'modules': len(parse_importtime(median['imports'])),
+    }
+    for metric in ('load', 'first', 'second', 'total', 'process'):
+        summary[metric] = ms(statistics.median(sample[metric] for sample in samples))
+    return summary, parse_importtime(median['imports'])
@@ -0,0 +1,73 @@
+# store/caching.py
+"""
+Versioned caching for catalog pages.
+
+Cached querysets and template fragments are keyed on the current version of
+one or more namespaces:
+
+* ``catalog``         - anything listing products or categories
+* ``category:<id>``   - pages showing the products of one category
+* ``product:<slug>``  - pages showing one product
+* ``recommendations`` - related products, rebuilt by store.recommendations
+
+``invalidate()`` moves a namespace to a new version, so every key built on it
+is missed from then on and simply expires; nothing has to be deleted.
+``store.signals`` invalidates the namespaces affected by Product and Category
+changes.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+CATALOG = 'catalog'
+RECOMMENDATIONS = 'recommendations'
+
+
+def get_cache():
+    return caches[getattr(settings, 'STORE_CACHE_ALIAS', 'default')]
+
+
+def timeout():
+    return getattr(settings, 'STORE_CACHE_TIMEOUT', 600)
+
+
+def category_namespace(category_id):
+    return f'category:{category_id}'
+
+
+def product_namespace(slug):
+    return f'product:{slug}'
+
+
+def _version_key(namespace):
+    return f'store:version:{namespace}'
+
+
+def versions(*namespaces):
+    """Return the current version of each namespace, joined into one string."""
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # A version that was never set (or was evicted) starts at the
+            # current time so it can never match an older cached entry.
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def invalidate(*namespaces):
+    get_cache().set_many({_version_key(namespace): time.time_ns() for namespace in namespaces}, None)
+
+
+def cached(name, namespaces, build):
+    """Return ``build()``, cached until one of ``namespaces`` is invalidated."""
+    cache = get_cache()
+    key = f'store:{name}:{versions(*namespaces)}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout())
+    return value
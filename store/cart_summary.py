@@ -0,0 +1,64 @@
+# store/cart_summary.py
+"""
+Per-user cart summary kept in the session.
+
+The header badge and the cart totals read the number of cart lines and the
+subtotal from the session, which is loaded for every logged-in request
+anyway, so showing them costs no queries. The cart views adjust the summary
+as they change the cart; ``cart_view`` and login recompute it from the
+database, which also repairs any drift (for example a price change, or a
+cart edited from another device).
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Sum
+
+from .models import Cart
+
+SESSION_KEY = 'cart_summary'
+CENTS = Decimal('0.01')
+
+
+def _store(request, count, subtotal):
+    data = {'count': count, 'subtotal': str(Decimal(subtotal).quantize(CENTS))}
+    # Only a changed summary marks the session as modified and costs a write.
+    if request.session.get(SESSION_KEY) != data:
+        request.session[SESSION_KEY] = data
+
+
+def get_summary(request):
+    """Return ``(count, subtotal)`` for the current user's cart."""
+    if not request.user.is_authenticated:
+        return 0, Decimal('0')
+    data = request.session.get(SESSION_KEY)
+    if data is None:
+        return recalculate(request)
+    return data['count'], Decimal(data['subtotal'])
+
+
+def recalculate(request, cart_items=None):
+    """Rebuild the summary, from ``cart_items`` if given or else with one query."""
+    if cart_items is not None:
+        count = len(cart_items)
+        subtotal = sum((item.get_total_price() for item in cart_items), Decimal('0'))
+    else:
+        totals = Cart.objects.filter(user=request.user).aggregate(
+            count=Count('id'),
+            subtotal=Sum(F('quantity') * F('product__price'), output_field=DecimalField()),
+        )
+        count, subtotal = totals['count'], totals['subtotal'] or Decimal('0')
+    _store(request, count, subtotal)
+    return count, subtotal
+
+
+def adjust(request, lines=0, amount=Decimal('0')):
+    """Apply a change that has already been written to the cart table."""
+    if SESSION_KEY not in request.session:
+        recalculate(request)
+        return
+    count, subtotal = get_summary(request)
+    _store(request, max(count + lines, 0), max(subtotal + amount, Decimal('0')))
+
+
+def clear(request):
+    _store(request, 0, Decimal('0'))
@@ -0,0 +1,298 @@
+# store/catalog.py
+"""
+Bulk catalog import and export.
+
+``catalog_import`` and ``catalog_export`` (and the dashboard's export
+download) move products as CSV or JSON Lines, one product per row, keyed on
+``slug``. Everything streams: rows are read, validated and written
+``chunk_size`` at a time, and exports are generated row by row, so memory
+does not grow with the size of the file.
+
+Importing a chunk takes a handful of queries whatever its size: one to load
+the products whose slugs it names, one ``bulk_create`` and one
+``bulk_update``. Categories are given by slug or name and resolved from an
+in-memory map. A column that is missing from a row leaves the field as it is
+(or at its default for a new product); an empty cell clears an optional
+field. Rows are validated with ``Model.full_clean()``, without the
+uniqueness queries, and rejected rows are reported with their line number
+rather than stopping the import.
+
+Images are names of files already in media storage (``products/rack.jpeg``),
+uploaded separately; their derivatives (store.images) are built by a worker
+pool while later chunks are imported.
+
+Bulk writes bypass the model signals, so each chunk updates the search index
+and the facet counts itself and invalidates the cached pages it affects.
+"""
+import copy
+import csv
+import itertools
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import NamedTuple
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, models, transaction
+from django.utils import timezone
+
+from . import facets, images, search, signals
+from .models import Category, Product
+
+# Columns, in export order; ``category`` is the category's slug.
+FIELDS = ['slug', 'name', 'category', 'description', 'price', 'old_price', 'stock', 'available',
+          'image', 'image2', 'image3']
+IMAGE_FIELDS = ['image', 'image2', 'image3']
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Rejected rows reported in detail; the rest are only counted.
+MAX_ERRORS = 100
+
+TRUE = {'1', 'true', 't', 'yes', 'y'}
+FALSE = {'0', 'false', 'f', 'no', 'n'}
+
+
+class ImportResult(NamedTuple):
+    created: int
+    updated: int
+    rejected: int
+    errors: list        # (line, message), the first MAX_ERRORS
+    images: int
+    image_errors: list  # (image name, message)
+
+
+def format_for(path, default='csv'):
+    """The format a file name implies: ``jsonl`` for .jsonl and .ndjson, else ``default``."""
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if path.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(file, fmt):
+    """Yield ``(line, row)`` for every product in the open text ``file``."""
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(file, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, ValueError(f'invalid JSON: {e}')
+            continue
+        yield line, row if isinstance(row, dict) else ValueError('not a JSON object')
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class CategoryMap:
+    """Categories by slug and by name, loaded once per import."""
+
+    def __init__(self):
+        self.categories = {}
+        for category in Category.objects.all():
+            self.categories[category.slug] = category
+            self.categories.setdefault(category.name, category)
+
+    def get(self, key):
+        return self.categories.get(str(key).strip())
+
+
+def _value(field, raw):
+    """``raw`` as the value to assign to ``field``; invalid values are left for full_clean()."""
+    if isinstance(raw, str):
+        raw = raw.strip()
+        if raw == '':
+            return None if field.null else ''
+        if isinstance(field, models.BooleanField):
+            lowered = raw.lower()
+            return True if lowered in TRUE else False if lowered in FALSE else raw
+    return raw
+
+
+def _message(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f'{name}: {" ".join(messages)}' for name, messages in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+def prepare(row, product, categories):
+    """Apply ``row`` to ``product`` and validate it; raise ValidationError."""
+    for name in FIELDS:
+        if name not in row or name == 'slug':
+            continue
+        if name == 'category':
+            category = categories.get(row[name] or '')
+            if category is None:
+                raise ValidationError({'category': [f'unknown category {row[name]!r}']})
+            product.category = category
+            continue
+        field = Product._meta.get_field(name)
+        setattr(product, field.attname, _value(field, row[name]))
+    if product.category_id is None:
+        raise ValidationError({'category': ['This field is required.']})
+    # The category came from the map, so skip the query ForeignKey.validate() makes.
+    product.full_clean(exclude=['category'], validate_unique=False, validate_constraints=False)
+    return product
+
+
+def _changed_images(product, before):
+    return [
+        getattr(product, name).name for name in IMAGE_FIELDS
+        if getattr(product, name).name and (before is None or before.get(name) != getattr(product, name).name)
+    ]
+
+
+def _write_chunk(rows, categories, errors):
+    """Import one chunk of ``(line, row)``; return ``(created, updated, rejected, image names)``."""
+    slugs = {str(row.get('slug') or '').strip() for _, row in rows if isinstance(row, dict)}
+    existing = Product.objects.select_related('category').in_bulk(slugs - {''}, field_name='slug')
+
+    creates, updates, rejected, image_names, changes = {}, {}, 0, [], []
+    for line, row in rows:
+        try:
+            if isinstance(row, Exception):
+                raise ValidationError(str(row))
+            slug = str(row.get('slug') or '').strip()
+            if not slug:
+                raise ValidationError({'slug': ['This field cannot be blank.']})
+            product = creates.get(slug) or updates.get(slug)
+            if product is None:
+                product = existing.get(slug) or Product(slug=slug)
+                product._import_before = {name: getattr(product, name).name for name in IMAGE_FIELDS} \
+                    if product.pk else None
+                product._import_state = facets.state_of(product) if product.pk else None
+            # Work on a copy, so that a rejected row leaves nothing behind for
+            # a later row with the same slug.
+            product = prepare(row, copy.copy(product), categories)
+        except ValidationError as e:
+            rejected += 1
+            errors.append((line, _message(e)))
+            continue
+        (updates if product.pk else creates)[slug] = product
+
+    if creates:
+        Product.objects.bulk_create(creates.values())
+        missing = [product for product in creates.values() if product.pk is None]
+        if missing:
+            # Databases without RETURNING leave the primary keys unset.
+            ids = Product.objects.filter(slug__in=[product.slug for product in missing]).in_bulk(field_name='slug')
+            for product in missing:
+                product.pk = ids[product.slug].pk
+    if updates:
+        # bulk_update() does not apply auto_now.
+        now = timezone.now()
+        for product in updates.values():
+            product.updated_at = now
+        Product.objects.bulk_update(updates.values(), [name for name in FIELDS if name != 'slug'] + ['updated_at'])
+
+    written = [*creates.values(), *updates.values()]
+    for product in written:
+        image_names += _changed_images(product, product._import_before)
+        changes.append((product._import_state, facets.state_of(product)))
+    facets.record_many(changes)
+    search.index_products(written)
+    signals.invalidate_on_commit(*{
+        namespace for product in written for namespace in signals.product_namespaces(product)
+    })
+    return len(creates), len(updates), rejected, image_names
+
+
+def import_products(rows, chunk_size=500, workers=2, dry_run=False, progress=None):
+    """
+    Create or update products from ``(line, row)`` pairs (see ``read_rows``).
+    With ``dry_run`` every chunk is validated and written, then rolled back.
+    ``progress(result)`` is called after each chunk.
+    """
+    categories = CategoryMap()
+    created = updated = rejected = built = 0
+    errors, image_errors, pending = [], [], {}
+
+    def collect(done):
+        nonlocal built
+        for future in done:
+            name = pending.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                image_errors.append((name, str(e)))
+            else:
+                built += 1
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='catalog') if workers and not dry_run else None
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            chunk_errors = []
+            try:
+                with transaction.atomic():
+                    counts = _write_chunk(chunk, categories, chunk_errors)
+                    if dry_run:
+                        transaction.set_rollback(True)
+            except DatabaseError as e:
+                # A database error fails the whole chunk; earlier chunks stay written.
+                counts = (0, 0, len(chunk), [])
+                chunk_errors = [(chunk[0][0], f'chunk starting here failed: {e}')]
+            created, updated, rejected = created + counts[0], updated + counts[1], rejected + counts[2]
+            errors.extend(chunk_errors[:MAX_ERRORS - len(errors)])
+
+            if pool:
+                for name in dict.fromkeys(counts[3]):
+                    pending[pool.submit(images.generate, name)] = name
+                # Bounded, so that a slow image does not queue the whole file.
+                while len(pending) > workers * 4:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            if progress:
+                progress(ImportResult(created, updated, rejected, errors, built, image_errors))
+        if pool:
+            collect(wait(pending).done)
+    finally:
+        if pool:
+            pool.shutdown()
+    return ImportResult(created, updated, rejected, errors, built, image_errors)
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Yield one dict per product, in primary key order."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    for product in queryset.select_related('category').order_by('pk').iterator(chunk_size=chunk_size):
+        row = {}
+        for name in FIELDS:
+            if name == 'category':
+                row[name] = product.category.slug
+            elif name in IMAGE_FIELDS:
+                row[name] = getattr(product, name).name or ''
+            else:
+                value = getattr(product, name)
+                row[name] = '' if value is None else value
+        yield row
+
+
+class _Echo:
+    """A file-like object whose ``write`` returns what it was given, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def render(rows, fmt, fields=FIELDS):
+    """Yield ``rows`` as lines of CSV (``fields``, after a header) or JSON Lines."""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([row[name] for name in fields])
+        return
+    for row in rows:
+        yield json.dumps(row, default=str, ensure_ascii=False) + '\n'
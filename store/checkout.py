@@ -0,0 +1,118 @@
+# store/checkout.py
+"""
+Checkout pipeline.
+
+``place_order`` turns a user's cart into an order inside one transaction and
+with a fixed number of queries, whatever the size of the cart:
+
+* the cart's products are locked once, in primary key order;
+* stock is checked and decremented by a single conditional UPDATE, so an
+  order that would take any product below zero is rolled back as a whole;
+* the products it sells out are moved to "out of stock" in the facet
+  counts (store.facets), which that UPDATE bypasses;
+* the order lines are written with one ``bulk_create``;
+* the confirmation email is queued in the same transaction (store.queue)
+  and sent by a worker, not by the request.
+"""
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+
+from . import caching, facets, payments, queue, tasks
+from .models import Cart, Order, OrderItem, OrderTracking, Payment, Product
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def place_order(user, cart_items, payment_method, shipping_address):
+    """Create an order from ``cart_items`` and empty them from the cart."""
+    quantities = {}
+    for item in cart_items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    if not quantities:
+        raise CheckoutError('Your cart is empty.')
+
+    with transaction.atomic():
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(pk__in=quantities)
+            .only('id', 'name', 'slug', 'category', 'price', 'old_price', 'stock', 'available')
+            .order_by('pk')
+        }
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None or not product.available:
+                raise CheckoutError('Some items in your cart are no longer available.')
+            if product.stock < quantity:
+                raise CheckoutError(f'Only {product.stock} of {product.name} left in stock.')
+
+        # The stock condition is repeated in the UPDATE itself so that stock can
+        # never go negative, even on databases without row-level locks.
+        in_stock = Q()
+        for product_id, quantity in quantities.items():
+            in_stock |= Q(pk=product_id, stock__gte=quantity)
+        updated = Product.objects.filter(in_stock).update(
+            stock=Case(
+                *[When(pk=product_id, then=F('stock') - quantity) for product_id, quantity in quantities.items()],
+                default=F('stock'),
+                output_field=PositiveIntegerField(),
+            )
+        )
+        if updated != len(quantities):
+            raise CheckoutError('Some items in your cart just went out of stock.')
+
+        # The UPDATE bypasses the signals that keep the facet counts.
+        sold_out = [products[pk] for pk, quantity in quantities.items() if products[pk].stock == quantity]
+        changes = []
+        for product in sold_out:
+            before = facets.state_of(product)
+            product.stock = 0
+            changes.append((before, facets.state_of(product)))
+        facets.record_many(changes)
+
+        total = sum(products[pk].price * quantity for pk, quantity in quantities.items())
+
+        order = Order.objects.create(
+            user=user,
+            status='pending',
+            payment_method=payment_method,
+            total_amount=total,
+            shipping_address=shipping_address,
+        )
+
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pk, quantity=quantity, price=products[pk].price)
+            for pk, quantity in quantities.items()
+        ])
+
+        Cart.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+
+        OrderTracking.objects.create(
+            order=order,
+            status='pending',
+            description='Order has been placed',
+            updated_by=user,
+        )
+
+        Payment.objects.create(
+            order=order,
+            amount=total,
+            payment_method=payment_method,
+            provider=payments.provider_for(payment_method),
+        )
+
+        queue.enqueue(
+            tasks.send_order_confirmation,
+            key=f'order-confirmation:{order.pk}',
+            order_id=order.pk,
+        )
+
+        # Product pages show the stock level, and listings count the products in stock.
+        namespaces = [caching.product_namespace(product.slug) for product in products.values()]
+        if sold_out:
+            namespaces.append(caching.CATALOG)
+        transaction.on_commit(lambda: caching.invalidate(*namespaces))
+
+    return order
@@ -0,0 +1,52 @@
+# store/db.py
+"""
+Tuning applied to every new SQLite connection.
+
+``configure_connection`` runs on ``connection_created`` and applies
+``SQLITE_PRAGMAS``:
+
+* ``journal_mode=wal``: readers no longer block the writer or each other;
+  writers still take turns.
+* ``synchronous=normal``: with WAL, commits skip an fsync. A power cut can
+  lose the last few commits but cannot corrupt the database.
+* ``busy_timeout``: a writer waits this many milliseconds for the lock
+  instead of failing with "database is locked".
+* ``mmap_size``, ``cache_size``, ``temp_store``: more of the database read
+  through memory mapping and kept in the page cache.
+
+A busy timeout does not help a transaction that read first and then tries to
+write while another writer holds the lock; SQLite fails it at once to avoid
+a deadlock. That is why settings also start SQLite transactions with
+``BEGIN IMMEDIATE`` (``OPTIONS['transaction_mode']``).
+
+PostgreSQL needs none of this; see ``DB_ENGINE`` in settings.
+"""
+import logging
+import re
+import sqlite3
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'^-?\w+$')
+
+
+def apply_pragmas(db, pragmas):
+    """Run ``PRAGMA name = value`` on the sqlite3 connection ``db`` for each item of ``pragmas``."""
+    for name, value in pragmas.items():
+        if not (_WORD.match(name) and _WORD.match(str(value))):
+            raise ValueError(f'Invalid SQLite pragma {name}={value!r}')
+        try:
+            db.execute(f'PRAGMA {name} = {value}').fetchall()
+        except sqlite3.OperationalError as e:
+            # e.g. WAL on a read-only file system; the database still works.
+            logger.warning('Could not set PRAGMA %s = %s: %s', name, value, e)
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection, getattr(settings, 'SQLITE_PRAGMAS', {}))
@@ -0,0 +1,263 @@
+# store/facets.py
+"""
+Facet counts for the product list.
+
+The product list narrows available products by category, price band, stock
+and discount, and shows next to every option how many products choosing it
+would leave. ``FacetCount`` holds one row per combination ("cell") of those
+values with the number of products in it: at most categories x price bands
+x 2 x discount bands rows, however large the catalog. Every count on the
+page is a sum over those rows, read with one query.
+
+``store.signals`` calls ``record()`` whenever a Product is saved or deleted,
+and ``store.checkout`` when an order sells the last of a product, inside the
+same transaction. Changes that bypass both (``bulk_create``,
+``QuerySet.update``, raw SQL) are not seen; run ``rebuild_facets`` after them.
+
+Cells cannot count what the table does not describe: a search, or a
+discount range that does not start on a band limit. For those the matching
+products are grouped by cell instead, which for a search is at most
+``SEARCH_MAX_RESULTS`` rows.
+"""
+from bisect import bisect_right
+from collections import Counter
+from decimal import ROUND_HALF_UP, Decimal
+from typing import NamedTuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Case, Count, ExpressionWrapper, F, IntegerField, Q, Value, When
+
+from .models import FacetCount, Product
+
+# Lower limits, in naira, of the price bands after the first.
+PRICE_LIMITS = [Decimal(5000), Decimal(20000), Decimal(50000), Decimal(100000)]
+
+# Lower limits, in percent, of the discount bands after "no discount".
+DISCOUNT_LIMITS = [1, 10, 25, 50]
+
+# Fields a product's cell depends on
+FIELDS = ('available', 'category_id', 'price', 'old_price', 'stock')
+
+
+class Cell(NamedTuple):
+    category_id: int
+    price_band: int
+    in_stock: bool
+    discount_band: int
+
+
+class Selection(NamedTuple):
+    """What the product list is narrowed to; ``None`` (or ``False``) leaves a facet open."""
+    category: int | None = None
+    price_band: int | None = None
+    in_stock: bool = False
+    min_discount: int | None = None
+    max_discount: int | None = None
+
+
+def price_band(price):
+    return bisect_right(PRICE_LIMITS, price)
+
+
+def price_bands():
+    """``(band, low, high)`` for every price band; ``high`` is ``None`` for the last."""
+    limits = [None, *PRICE_LIMITS, None]
+    return [(band, limits[band], limits[band + 1]) for band in range(len(PRICE_LIMITS) + 1)]
+
+
+def discount_band(percent):
+    return bisect_right(DISCOUNT_LIMITS, percent)
+
+
+def _cents(value):
+    return int((Decimal(str(value)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def discount_percentage(price, old_price):
+    """``Product.discount_percentage`` for values that may not have been written yet."""
+    if old_price is None:
+        return 0
+    price, old_price = _cents(price), _cents(old_price)
+    return (old_price - price) * 100 // old_price if old_price > price else 0
+
+
+def state_of(product):
+    """
+    Return ``(available, cell)`` for ``product``, or ``None`` if any field is
+    not loaded (or, on a new product, not set yet).
+    """
+    if any(name not in product.__dict__ for name in FIELDS):
+        return None
+    available, category_id, price, old_price, stock = (product.__dict__[name] for name in FIELDS)
+    if category_id is None or price is None:
+        return None
+    cell = Cell(
+        category_id=category_id,
+        price_band=price_band(Decimal(str(price))),
+        in_stock=stock > 0,
+        discount_band=discount_band(discount_percentage(price, old_price)),
+    )
+    return bool(available), cell
+
+
+def stored_state(pk):
+    row = Product.objects.filter(pk=pk).values(*FIELDS).first()
+    return state_of(Product(**row)) if row else None
+
+
+def _counted(state):
+    # Only available products are counted.
+    return state[1] if state and state[0] else None
+
+
+def _add(cell, products):
+    rows = FacetCount.objects.filter(**cell._asdict())
+    if rows.update(products=F('products') + products) or products < 0:
+        # A missing row has nothing to take away: its category is being deleted.
+        return
+    try:
+        with transaction.atomic():
+            FacetCount.objects.create(**cell._asdict(), products=products)
+    except IntegrityError:
+        # Another transaction created the row first.
+        rows.update(products=F('products') + products)
+
+
+def record(old, new):
+    """Move a product from state ``old`` to state ``new`` (either may be None)."""
+    record_many([(old, new)])
+
+
+def record_many(changes):
+    """``record()`` for several ``(old, new)`` pairs, with one update per cell changed."""
+    deltas = Counter()
+    for old, new in changes:
+        old, new = _counted(old), _counted(new)
+        if old == new:
+            continue
+        if old is not None:
+            deltas[old] -= 1
+        if new is not None:
+            deltas[new] += 1
+    if not any(deltas.values()):
+        return
+    with transaction.atomic():
+        for cell, products in deltas.items():
+            if products:
+                _add(cell, products)
+
+
+def _band(field, limits):
+    return Case(
+        *[When(**{f'{field}__gte': limit}, then=Value(band)) for band, limit in reversed(list(enumerate(limits, 1)))],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def cells(queryset):
+    """Count the available products of ``queryset`` per cell, with one GROUP BY."""
+    rows = (
+        queryset.filter(available=True)
+        .order_by()
+        .annotate(
+            facet_price=_band('price', PRICE_LIMITS),
+            facet_stock=ExpressionWrapper(Q(stock__gt=0), output_field=BooleanField()),
+            facet_discount=_band('discount_percentage', DISCOUNT_LIMITS),
+        )
+        .values_list('category_id', 'facet_price', 'facet_stock', 'facet_discount')
+        .annotate(products=Count('id'))
+    )
+    return Counter({Cell(category, price, bool(stock), discount): products
+                    for category, price, stock, discount, products in rows})
+
+
+def stored_cells():
+    rows = FacetCount.objects.filter(products__gt=0).values_list(
+        'category_id', 'price_band', 'in_stock', 'discount_band', 'products')
+    return Counter({Cell(*row[:4]): row[4] for row in rows})
+
+
+def on_band_limits(selection):
+    """Whether the cells can tell which products ``selection``'s discount range takes."""
+    return selection.max_discount is None and selection.min_discount in (None, 0, *DISCOUNT_LIMITS)
+
+
+def cells_for(selection, product_ids=None):
+    """
+    The cells to count ``selection`` from: the stored ones, or the products
+    ``product_ids`` (a search) and ``selection``'s discount range take, grouped.
+    """
+    if product_ids is None and on_band_limits(selection):
+        return stored_cells()
+    queryset = Product.objects.all()
+    if product_ids is not None:
+        queryset = queryset.filter(pk__in=product_ids)
+    if not on_band_limits(selection):
+        queryset = queryset.discount_between(selection.min_discount, selection.max_discount)
+    return cells(queryset)
+
+
+def apply(queryset, selection):
+    """Narrow a Product queryset to ``selection``."""
+    if selection.category is not None:
+        queryset = queryset.filter(category_id=selection.category)
+    if selection.price_band is not None:
+        _, low, high = price_bands()[selection.price_band]
+        if low is not None:
+            queryset = queryset.filter(price__gte=low)
+        if high is not None:
+            queryset = queryset.filter(price__lt=high)
+    if selection.in_stock:
+        queryset = queryset.filter(stock__gt=0)
+    return queryset.discount_between(selection.min_discount, selection.max_discount)
+
+
+def counts(cell_counts, selection):
+    """
+    Return ``{'total', 'category', 'price_band', 'in_stock', 'discount'}``:
+    the products ``selection`` leaves, and for the options of every facet the
+    products choosing that option would leave, the other facets staying as
+    selected. ``category`` and ``price_band`` map options to counts;
+    ``discount`` maps every discount limit to the products discounted at
+    least that much.
+    """
+    exact = on_band_limits(selection)
+    min_band = discount_band(selection.min_discount) if exact and selection.min_discount else 0
+
+    def matches(cell, open_facet):
+        return (
+            (open_facet == 'category' or selection.category is None or cell.category_id == selection.category)
+            and (open_facet == 'price' or selection.price_band is None or cell.price_band == selection.price_band)
+            and (open_facet == 'stock' or not selection.in_stock or cell.in_stock)
+            and (open_facet == 'discount' or cell.discount_band >= min_band)
+        )
+
+    result = {'total': 0, 'category': Counter(), 'price_band': Counter(), 'in_stock': 0,
+              'discount': dict.fromkeys(DISCOUNT_LIMITS, 0)}
+    for cell, products in cell_counts.items():
+        if matches(cell, None):
+            result['total'] += products
+        if matches(cell, 'category'):
+            result['category'][cell.category_id] += products
+        if matches(cell, 'price'):
+            result['price_band'][cell.price_band] += products
+        if matches(cell, 'stock') and cell.in_stock:
+            result['in_stock'] += products
+        if matches(cell, 'discount'):
+            for band, limit in enumerate(DISCOUNT_LIMITS, 1):
+                if cell.discount_band >= band:
+                    result['discount'][limit] += products
+    return result
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute ``FacetCount`` from the products table; return the number of products counted."""
+    counted = cells(Product.objects.all())
+    FacetCount.objects.all().delete()
+    FacetCount.objects.bulk_create(
+        (FacetCount(**cell._asdict(), products=products) for cell, products in counted.items()),
+        batch_size=500,
+    )
+    return sum(counted.values())
@@ -1,7 +1,8 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
-from .models import *
+from .models import Address, Category, Order, Product, UserProfile
+from . import images
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -79,7 +80,22 @@ class OrderStatusForm(forms.Form):
     location = forms.CharField(max_length=200, required=False)
 
 
-class ProductForm(forms.ModelForm):
+class ImageDerivativesMixin:
+    """Queue resized copies of every image field that was uploaded with the form."""
+    image_fields = []
+
+    def save(self, commit=True):
+        instance = super().save(commit=commit)
+        if commit:
+            images.schedule(*(
+                getattr(instance, name).name for name in self.image_fields if name in self.changed_data
+            ))
+        return instance
+
+
+class ProductForm(ImageDerivativesMixin, forms.ModelForm):
+    image_fields = ['image', 'image2', 'image3']
+
     class Meta:
         model = Product
         fields = ['category', 'name', 'slug', 'description', 'price', 'old_price',
@@ -87,7 +103,9 @@ class ProductForm(forms.ModelForm):
         widgets = {
             'description': forms.Textarea(attrs={'rows': 5}),
         }
-class CategoryForm(forms.ModelForm):
+class CategoryForm(ImageDerivativesMixin, forms.ModelForm):
+    image_fields = ['image']
+
     class Meta:
         model = Category
         fields = ['name', 'slug', 'description', 'image']
@@ -0,0 +1,161 @@
+# store/images.py
+"""
+Resized copies ("derivatives") of uploaded product and category images.
+
+Every source image gets a ``thumb``, ``card`` and ``detail`` size, each in
+WebP and JPEG, stored next to a small JSON manifest::
+
+    derivatives/products/rack/thumb-160.webp
+    derivatives/products/rack/manifest.json
+
+Derivatives are built in a background thread pool once the upload has been
+committed, so saving a form never waits for Pillow, which is only imported
+when the first derivative is built. Until the manifest exists, templates fall
+back to the original file. The ``responsive_image`` template tag
+(``store_images``) turns a manifest into ``srcset`` markup.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_for
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+# name -> target width in pixels; images are never enlarged
+SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'detail': 1200,
+}
+
+# format -> (file extension, Pillow save options)
+FORMATS = {
+    'webp': ('webp', {'quality': 75, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+# How long templates remember that a manifest does not exist yet.
+MISSING_TIMEOUT = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def derivative_dir(name):
+    root = getattr(settings, 'IMAGE_DERIVATIVES_DIR', 'derivatives')
+    return f'{root}/{os.path.splitext(name)[0]}'
+
+
+def _manifest_key(name):
+    return f'store:image:{name}'
+
+
+def _resize(image, width):
+    from PIL import Image
+
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def generate(name, storage=None):
+    """Build every derivative of the stored image ``name`` and return its manifest."""
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    with storage.open(name) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+
+    directory = derivative_dir(name)
+    manifest = {fmt: [] for fmt in FORMATS}
+    widths_done = set()
+    for size, width in sorted(SIZES.items(), key=lambda item: item[1]):
+        resized = _resize(image, width)
+        if resized.width in widths_done:
+            # The source is narrower than this size; a smaller one already covers it.
+            continue
+        widths_done.add(resized.width)
+        for fmt, (extension, options) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, fmt.upper(), **options)
+            path = f'{directory}/{size}-{resized.width}.{extension}'
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, ContentFile(buffer.getvalue()))
+            manifest[fmt].append({'size': size, 'width': resized.width, 'path': path})
+
+    path = f'{directory}/manifest.json'
+    if storage.exists(path):
+        storage.delete(path)
+    storage.save(path, ContentFile(json.dumps(manifest).encode()))
+    caching.get_cache().set(_manifest_key(name), manifest, None)
+    return manifest
+
+
+def manifest(name, storage=None):
+    """Return the manifest for ``name``, or ``None`` while it has not been generated."""
+    if not name:
+        return None
+    cache = caching.get_cache()
+    found = cache.get(_manifest_key(name))
+    if found is not None:
+        return found or None
+
+    storage = storage or default_storage
+    path = f'{derivative_dir(name)}/manifest.json'
+    try:
+        with storage.open(path) as f:
+            found = json.load(f)
+    except (OSError, ValueError):
+        cache.set(_manifest_key(name), {}, MISSING_TIMEOUT)
+        return None
+    cache.set(_manifest_key(name), found, None)
+    return found
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'IMAGE_WORKERS', 2)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='images')
+        return _executor
+
+
+def _run(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Could not build derivatives for %s', name)
+
+
+def schedule(*names):
+    """Build derivatives for ``names`` in the worker pool after the current transaction commits."""
+    names = [name for name in names if name]
+
+    def submit():
+        for name in names:
+            future = _get_executor().submit(_run, name)
+            _pending.add(future)
+            future.add_done_callback(_pending.discard)
+
+    if names:
+        transaction.on_commit(submit)
+
+
+def wait(timeout=None):
+    """Block until every scheduled derivative has been built."""
+    wait_for(list(_pending), timeout=timeout)
@@ -0,0 +1,115 @@
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+
+from store import benchmarks
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a test database and load-test the storefront and checkout: '
+        'latency percentiles, throughput and query counts per scenario.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help='Products to seed (1k to 1M).')
+        parser.add_argument('--customers', type=int, default=20, help='Customers to seed.')
+        parser.add_argument('--orders', type=int, default=None, help='Orders to seed (default: products / 10).')
+        parser.add_argument('--scenario', action='append', choices=sorted(benchmarks.SCENARIOS), dest='scenarios',
+                            help='Scenario to run (repeatable; default: all).')
+        parser.add_argument('--mode', choices=['client', 'http', 'both', 'templates'], default='both',
+                            help='Test client (with query counts), concurrent HTTP, both, or page template '
+                                 'render times.')
+        parser.add_argument('--iterations', type=int, default=100,
+                            help='Test client requests or template renders per scenario.')
+        parser.add_argument('--requests', type=int, default=500, help='HTTP requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent HTTP clients.')
+        parser.add_argument('--cold-cache', action='store_true',
+                            help='Clear the cache before every test client request or template render.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database, and reuse it if it is already seeded.')
+        parser.add_argument('--save-baseline', metavar='FILE', help='Write the results to FILE.')
+        parser.add_argument('--compare', metavar='FILE', help='Compare the results with a saved baseline.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative p95 or throughput change that counts as a regression.')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error if --compare finds a regression.')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(benchmarks.SCENARIOS)
+        verbosity = self.verbosity = options['verbosity']
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity, interactive=False, keepdb=options['keepdb'])
+        try:
+            if options['keepdb'] and Product.objects.exists():
+                self.stdout.write(f'Reusing the seeded database ({Product.objects.count()} products).')
+            else:
+                self.stdout.write(f"Seeding {options['products']} products...")
+                benchmarks.seed(
+                    products=options['products'], customers=options['customers'], orders=options['orders'],
+                    stdout=self.stdout if verbosity > 1 else None,
+                )
+            ctx = benchmarks.load_context()
+            if not ctx.products or not ctx.customers:
+                raise CommandError('The benchmark database has no products or customers; drop --keepdb.')
+
+            results = {}
+            if options['mode'] in ('client', 'both'):
+                found = benchmarks.run_client(names, ctx, options['iterations'], cold_cache=options['cold_cache'])
+                results.update((f'client:{name}', summary) for name, summary in found.items())
+            if options['mode'] in ('http', 'both'):
+                with benchmarks.live_server() as url:
+                    found = benchmarks.run_http(names, ctx, url, options['requests'], options['concurrency'])
+                results.update((f'http:{name}', summary) for name, summary in found.items())
+            if options['mode'] == 'templates':
+                found = benchmarks.render_templates(names, ctx, options['iterations'], cold_cache=options['cold_cache'])
+                results.update((f'template:{name}', summary) for name, summary in found.items())
+        finally:
+            teardown_databases(old_config, verbosity, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.report(results)
+
+        if options['save_baseline']:
+            meta = {
+                'products': options['products'],
+                'concurrency': options['concurrency'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'created': timezone.now().isoformat(),
+            }
+            benchmarks.save_baseline(options['save_baseline'], results, meta)
+            self.stdout.write(f"Baseline saved to {options['save_baseline']}.")
+
+        if options['compare']:
+            baseline = benchmarks.load_baseline(options['compare'])
+            regressions = self.report_changes(benchmarks.compare(results, baseline['results'], options['threshold']))
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{regressions} regressions against {options["compare"]}.')
+
+    def report(self, results):
+        columns = ['requests', 'errors', 'p50', 'p95', 'p99', 'rps', 'queries']
+        width = max([24, *(len(key) + 2 for key in results)])
+        self.stdout.write(f"{'scenario':<{width}}" + ''.join(f'{column:>10}' for column in columns))
+        for key, summary in results.items():
+            cells = ''.join(f"{'-' if summary[c] is None else summary[c]:>10}" for c in columns)
+            style = self.style.WARNING if summary['errors'] else str
+            self.stdout.write(style(f'{key:<{width}}{cells}'))
+        self.stdout.write('Latencies in ms; rps is requests per second.')
+
+    def report_changes(self, changes):
+        regressions = 0
+        for change in changes:
+            line = f'{change.key} {change.metric}: {change.baseline} -> {change.current} ({change.change:+.0%})'
+            if change.regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f'REGRESSION {line}'))
+            elif self.verbosity > 1:
+                self.stdout.write(line)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+        return regressions
@@ -0,0 +1,31 @@
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from store import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare SQLite write concurrency with the default settings and with '
+        'the tuning in SQLITE_PRAGMAS (WAL, busy timeout, BEGIN IMMEDIATE).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writing threads.')
+        parser.add_argument('--transactions', type=int, default=100, help='Transactions per writer.')
+        parser.add_argument('--readers', type=int, default=2, help='Threads reading while the writers run.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            results = benchmarks.sqlite_write_comparison(
+                directory, writers=options['writers'], transactions=options['transactions'],
+                readers=options['readers'],
+            )
+
+        columns = ['requests', 'errors', 'p50', 'p95', 'p99', 'rps', 'reads']
+        self.stdout.write(f"{'sqlite':<10}" + ''.join(f'{column:>10}' for column in columns))
+        for name, summary in results.items():
+            cells = ''.join(f"{'-' if summary[c] is None else summary[c]:>10}" for c in columns)
+            self.stdout.write(f'{name:<10}{cells}')
+        self.stdout.write('Latencies in ms; rps is committed or failed writes per second, reads is reads per second.')
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import images
+from store.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP/JPEG copies of every product and category image.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild images that already have derivatives.')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'IMAGE_WORKERS', 2))
+
+    def handle(self, *args, **options):
+        names = set()
+        for image, image2, image3 in Product.objects.values_list('image', 'image2', 'image3').iterator():
+            names.update((image, image2, image3))
+        names.update(Category.objects.values_list('image', flat=True))
+        names = sorted(name for name in names if name)
+        if not options['force']:
+            names = [name for name in names if not images.manifest(name)]
+
+        built = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {name: pool.submit(images.generate, name) for name in names}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{name}: {e}')
+                else:
+                    built += 1
+                    if options['verbosity'] > 1:
+                        self.stdout.write(name)
+
+        self.stdout.write(self.style.SUCCESS(f'Built derivatives for {built} images ({failed} failed).'))
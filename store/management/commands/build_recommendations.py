@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related products shown on product pages from order history and product text.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=recommendations.NEIGHBORS,
+                            help='Related products to keep per product.')
+
+    def handle(self, *args, **options):
+        if options['neighbors'] < 1:
+            raise CommandError('--neighbors must be at least 1.')
+        try:
+            total = recommendations.build(options['neighbors'])
+        except ImportError as e:
+            raise CommandError(f'build_recommendations needs NumPy ({e}).')
+        self.stdout.write(self.style.SUCCESS(f'Stored related products for {total} products.'))
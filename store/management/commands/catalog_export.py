@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import catalog
+
+
+class Command(BaseCommand):
+    help = 'Write every product as CSV or JSON Lines, in the format catalog_import reads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(catalog.FORMATS),
+                            help='Default: from the output file extension, else csv.')
+        parser.add_argument('--output', default='-', help="File to write, or '-' for standard output.")
+
+    def handle(self, *args, **options):
+        path = options['output']
+        fmt = options['format'] or catalog.format_for(path)
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        lines = catalog.render(counted(catalog.export_rows()), fmt)
+        if path == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                file.writelines(lines)
+        except OSError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(f'Exported {exported} products to {path}.'))
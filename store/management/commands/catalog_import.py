@@ -0,0 +1,54 @@
+import sys
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store import catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Create or update products from a CSV or JSON Lines file keyed on slug, a chunk at a time. '
+        'Images name files already in media storage; their derivatives are built as the import runs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument('--format', choices=sorted(catalog.FORMATS),
+                            help='Default: from the file extension, else csv.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'IMAGE_WORKERS', 2),
+                            help='Threads building image derivatives; 0 to skip them.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row, then roll back.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or catalog.format_for(path)
+
+        def progress(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{result.created} created, {result.updated} updated, {result.rejected} rejected')
+
+        try:
+            file = nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(e)
+        with file as rows:
+            result = catalog.import_products(
+                catalog.read_rows(rows, fmt), chunk_size=options['chunk_size'], workers=options['workers'],
+                dry_run=options['dry_run'], progress=progress,
+            )
+
+        for line, message in result.errors:
+            self.stderr.write(f'line {line}: {message}')
+        if result.rejected > len(result.errors):
+            self.stderr.write(f'... and {result.rejected - len(result.errors)} more rejected rows')
+        for name, message in result.image_errors:
+            self.stderr.write(f'{name}: {message}')
+        summary = f'{result.created} products created, {result.updated} updated, {result.rejected} rejected'
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Dry run: {summary}; nothing was saved.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{summary}; built derivatives for {result.images} images ({len(result.image_errors)} failed).'))
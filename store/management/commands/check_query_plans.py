@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import query_plans
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the querysets the store views run and report full table scans and sorts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--allow', action='append', default=[], metavar='TABLE',
+                            help='Table that may be scanned (repeatable).')
+        parser.add_argument('--fail', action='store_true',
+                            help='Exit with an error if any query scans a table or sorts.')
+
+    def handle(self, *args, **options):
+        allowed = query_plans.ALLOWED_SCANS | set(options['allow'])
+        failures = 0
+        for label, plan, scans, sorts in query_plans.check(allowed):
+            if scans or sorts:
+                failures += 1
+                notes = [f'scans {", ".join(scans)}'] if scans else []
+                if sorts:
+                    notes.append('sorts without an index')
+                self.stdout.write(self.style.WARNING(f'{label}: {"; ".join(notes)}'))
+            elif options['verbosity'] > 1:
+                self.stdout.write(f'{label}: ok')
+            if options['verbosity'] > 1:
+                self.stdout.write(plan + '\n')
+
+        if failures and options['fail']:
+            raise CommandError(f'{failures} queries are not covered by an index.')
+        if failures:
+            self.stdout.write(self.style.WARNING(f'{failures} queries are not covered by an index.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Every query uses an index.'))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import startup
+
+
+class Command(BaseCommand):
+    help = (
+        'Compile every project template and the templates it extends and includes; '
+        'fail on syntax errors, unknown tag libraries and missing templates. Run it at deploy time.'
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        names, errors = startup.compile_templates()
+        took = (time.perf_counter() - start) * 1000
+        for name, message in errors:
+            self.stderr.write(f'{name}: {message}')
+        if errors:
+            raise CommandError(f'{len(errors)} of {len(names)} templates failed to compile.')
+        self.stdout.write(self.style.SUCCESS(f'Compiled {len(names)} templates in {took:.0f} ms.'))
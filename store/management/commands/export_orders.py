@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from store import catalog, order_export
+from store.models import Order
+
+
+def date(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the orders placed in a date range as CSV (one row per item) or JSON Lines (one object per order), '
+        'streaming them a chunk at a time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date, help='First day, YYYY-MM-DD.')
+        parser.add_argument('--to', dest='date_to', type=date, help='Last day, YYYY-MM-DD.')
+        parser.add_argument('--status', choices=[value for value, _ in Order.STATUS_CHOICES])
+        parser.add_argument('--format', choices=sorted(catalog.FORMATS),
+                            help='Default: from the output file extension, else csv.')
+        parser.add_argument('--output', default='-', help="File to write, or '-' for standard output.")
+        parser.add_argument('--chunk-size', type=int, default=order_export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['output']
+        fmt = options['format'] or catalog.format_for(path)
+        orders = order_export.filtered(options['status'], options['date_from'], options['date_to'])
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        lines = order_export.render(counted(order_export.export_rows(orders, options['chunk_size'])), fmt)
+        if path == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                file.writelines(lines)
+        except OSError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(f'Exported {exported} orders to {path}.'))
@@ -0,0 +1,80 @@
+import argparse
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the cold start of the WSGI entry point in fresh interpreters: '
+        'import time, first and second request, and the slowest imports.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Interpreters to start.')
+        parser.add_argument('--path', default='/', help='Page the first request asks for.')
+        parser.add_argument('--warm', action=argparse.BooleanOptionalAction,
+                            help='Override WARM_ON_STARTUP in the started interpreters.')
+        parser.add_argument('--top', type=int, default=15, help='Imports and packages to list.')
+        parser.add_argument('--save-baseline', metavar='FILE', help='Write the results to FILE.')
+        parser.add_argument('--compare', metavar='FILE', help='Compare the results with a saved baseline.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative p95 change that counts as a regression.')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error if --compare finds a regression.')
+
+    def handle(self, *args, **options):
+        try:
+            summary, imports = benchmarks.cold_start(options['path'], options['runs'], warm=options['warm'])
+        except RuntimeError as e:
+            raise CommandError(f'The application failed to start:\n{e}')
+        results = {f"cold_start:{options['path']}": summary}
+
+        columns = ['runs', 'errors', 'load', 'first', 'second', 'p50', 'p95', 'process', 'queries', 'modules']
+        self.stdout.write(f"{'scenario':<24}" + ''.join(f'{column:>10}' for column in columns))
+        for key, row in results.items():
+            cells = ''.join(f'{row[c]:>10}' for c in columns)
+            style = self.style.WARNING if row['errors'] else str
+            self.stdout.write(style(f'{key:<24}{cells}'))
+        self.stdout.write(
+            'Medians in ms: load imports the WSGI module, p50/p95 are load plus the first '
+            'request, process includes interpreter startup and exit.'
+        )
+
+        top = options['top']
+        self.stdout.write('\nImported by the entry point and the first request (cumulative ms):')
+        for row in sorted((row for row in imports if row.depth == 0), key=lambda row: -row.cumulative_us)[:top]:
+            self.stdout.write(f'{row.cumulative_us / 1000:>10.1f}  {row.module}')
+        self.stdout.write('\nPackages by import time (ms):')
+        for package, ms in benchmarks.package_times(imports).most_common(top):
+            self.stdout.write(f'{ms:>10.1f}  {package}')
+
+        if options['save_baseline']:
+            meta = {
+                'path': options['path'],
+                'warm': settings.WARM_ON_STARTUP if options['warm'] is None else options['warm'],
+                'admin': settings.ADMIN_ENABLED,
+                'python': platform.python_version(),
+                'created': timezone.now().isoformat(),
+            }
+            benchmarks.save_baseline(options['save_baseline'], results, meta)
+            self.stdout.write(f"Baseline saved to {options['save_baseline']}.")
+
+        if options['compare']:
+            baseline = benchmarks.load_baseline(options['compare'])
+            regressions = 0
+            for change in benchmarks.compare(results, baseline['results'], options['threshold']):
+                line = f'{change.key} {change.metric}: {change.baseline} -> {change.current} ({change.change:+.0%})'
+                if change.regressed:
+                    regressions += 1
+                    self.stdout.write(self.style.ERROR(f'REGRESSION {line}'))
+                else:
+                    self.stdout.write(line)
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+            elif options['fail_on_regression']:
+                raise CommandError(f'{regressions} regressions against {options["compare"]}.')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import facets
+
+
+class Command(BaseCommand):
+    help = 'Recompute the product list facet counts from the products table.'
+
+    def handle(self, *args, **options):
+        total = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt facet counts from {total} products.'))
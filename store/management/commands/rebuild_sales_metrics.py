@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import metrics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard sales metrics from the orders table.'
+
+    def handle(self, *args, **options):
+        total = metrics.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales metrics from {total} orders.'))
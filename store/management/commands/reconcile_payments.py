@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store import payments
+
+
+class Command(BaseCommand):
+    help = 'Verify pending card and transfer payments with their payment gateways.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Payments to check in this run.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Concurrent gateway requests (default: PAYMENT_HTTP_POOL_SIZE).')
+
+    def handle(self, *args, **options):
+        outcomes = payments.reconcile(limit=options['limit'], workers=options['workers'])
+        summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items())) or 'nothing to do'
+        self.stdout.write(self.style.SUCCESS(f'Checked {sum(outcomes.values())} payments: {summary}.'))
@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from store import routers
+
+
+class Command(BaseCommand):
+    help = (
+        'Stand-in replication for local development: copy the SQLite primary '
+        'into every replica in DB_REPLICA_ALIASES.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Copy again every INTERVAL seconds until interrupted (default: copy once).')
+
+    def handle(self, *args, **options):
+        aliases = routers.replicas()
+        if not aliases:
+            raise CommandError('No replicas configured; set DB_REPLICAS.')
+        databases = settings.DATABASES
+        if any(databases[alias]['ENGINE'] != 'django.db.backends.sqlite3' for alias in [DEFAULT_DB_ALIAS, *aliases]):
+            raise CommandError('Only SQLite replicas can be copied; use the database server\'s replication.')
+
+        while True:
+            started = time.monotonic()
+            for alias in aliases:
+                routers.copy_sqlite(databases[DEFAULT_DB_ALIAS]['NAME'], databases[alias]['NAME'])
+            if options['verbosity'] > 1 or not options['interval']:
+                took = time.monotonic() - started
+                self.stdout.write(f'Copied the primary to {", ".join(aliases)} in {took:.2f}s.')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store import queue
+
+
+def _process_main(worker, stop, options):
+    # The parent handles Ctrl-C and SIGTERM by setting ``stop``; let the
+    # current task finish instead of dying halfway through it.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    queue.work(worker, stop, options['poll'], options['once'], options['batch'])
+
+
+class Command(BaseCommand):
+    help = 'Run background task workers until interrupted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'TASK_WORKERS', 2))
+        parser.add_argument('--processes', action='store_true',
+                            help='Run each worker in its own process instead of a thread.')
+        parser.add_argument('--poll', type=float, default=getattr(settings, 'TASK_POLL_SECONDS', 1.0),
+                            help='Seconds to wait when no task is due.')
+        parser.add_argument('--batch', type=int, default=1, help='Tasks claimed at a time per worker.')
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due.')
+
+    def handle(self, *args, **options):
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        names = [f'{prefix}:{i}' for i in range(options['workers'])]
+
+        if options['processes']:
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            # Forked children must not share the parent's database connections.
+            connections.close_all()
+            workers = [context.Process(target=_process_main, args=(name, stop, options)) for name in names]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(
+                    target=queue.work, name=name,
+                    args=(name, stop, options['poll'], options['once'], options['batch']),
+                )
+                for name in names
+            ]
+
+        def shutdown(signum, frame):
+            self.stdout.write('Stopping workers after their current task...')
+            stop.set()
+
+        previous = {sig: signal.signal(sig, shutdown) for sig in (signal.SIGINT, signal.SIGTERM)}
+        kind = 'processes' if options['processes'] else 'threads'
+        self.stdout.write(self.style.SUCCESS(f'Running {len(workers)} worker {kind}.'))
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
@@ -0,0 +1,144 @@
+# store/metrics.py
+"""
+Sales metrics for the admin dashboard.
+
+``SalesTotal`` (one row per order status) and ``DailySales`` (one row per day
+orders were placed) hold running order counts and paid revenue, so the
+dashboard reads a handful of rows instead of aggregating the orders table.
+
+``store.signals`` calls ``record()`` whenever an Order is saved or deleted,
+inside the same transaction. Changes that bypass signals (``bulk_create``,
+``QuerySet.update``, raw SQL) are not seen; run ``rebuild_sales_metrics``
+after them.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Order, SalesTotal
+
+ZERO = Decimal('0')
+
+# Fields an order's contribution depends on
+FIELDS = ('status', 'payment_status', 'total_amount', 'created_at')
+
+
+def state_of(order):
+    """
+    Return what ``order`` contributes to the metrics, as
+    ``(status, paid, amount, day)``, or ``None`` if any field is not loaded.
+    """
+    values = [order.__dict__.get(name) for name in FIELDS]
+    if any(value is None for value in values):
+        return None
+    status, paid, amount, created_at = values
+    return status, bool(paid), Decimal(str(amount)), timezone.localdate(created_at)
+
+
+def stored_state(pk):
+    row = Order.objects.filter(pk=pk).values(*FIELDS).first()
+    return state_of(Order(**row)) if row else None
+
+
+def _add(model, lookup, orders, paid_orders, revenue):
+    rows = model.objects.filter(**lookup)
+    changes = {
+        'orders': F('orders') + orders,
+        'paid_orders': F('paid_orders') + paid_orders,
+        'revenue': F('revenue') + revenue,
+    }
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, orders=orders, paid_orders=paid_orders, revenue=revenue)
+    except IntegrityError:
+        # Another transaction created the row first.
+        rows.update(**changes)
+
+
+def record(old, new):
+    """Move an order's contribution from state ``old`` to state ``new`` (either may be None)."""
+    if old == new:
+        return
+    deltas = {}
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        status, paid, amount, day = state
+        for key in (('status', status), ('day', day)):
+            orders, paid_orders, revenue = deltas.get(key, (0, 0, ZERO))
+            deltas[key] = (
+                orders + sign,
+                paid_orders + sign * paid,
+                revenue + sign * amount if paid else revenue,
+            )
+
+    with transaction.atomic():
+        for (kind, value), delta in deltas.items():
+            if delta == (0, 0, ZERO):
+                continue
+            if kind == 'status':
+                _add(SalesTotal, {'status': value}, *delta)
+            else:
+                _add(DailySales, {'day': value}, *delta)
+
+
+def totals():
+    """Return order counts per status and overall, and total paid revenue."""
+    by_status = {status: 0 for status, _ in Order.STATUS_CHOICES}
+    revenue = ZERO
+    for status, orders, amount in SalesTotal.objects.values_list('status', 'orders', 'revenue'):
+        by_status[status] = orders
+        revenue += amount
+    return {
+        'orders': sum(by_status.values()),
+        'by_status': by_status,
+        'revenue': revenue,
+    }
+
+
+def daily_series(days=30, today=None):
+    """Return one ``{'day', 'orders', 'paid_orders', 'revenue'}`` dict per day, oldest first."""
+    today = today or timezone.localdate()
+    start = today - datetime.timedelta(days=days - 1)
+    rows = {
+        row['day']: row
+        for row in DailySales.objects.filter(day__gte=start, day__lte=today)
+        .values('day', 'orders', 'paid_orders', 'revenue')
+    }
+    series = []
+    for offset in range(days):
+        day = start + datetime.timedelta(days=offset)
+        series.append(rows.get(day, {'day': day, 'orders': 0, 'paid_orders': 0, 'revenue': ZERO}))
+    return series
+
+
+def aggregate(orders):
+    """Compute the metric rows for the ``orders`` queryset from scratch."""
+    sums = {
+        'orders': Count('id'),
+        'paid_orders': Count('id', filter=Q(payment_status=True)),
+        'revenue': Sum('total_amount', filter=Q(payment_status=True), default=ZERO),
+    }
+    statuses = [SalesTotal(**row) for row in orders.order_by().values('status').annotate(**sums)]
+    days = [
+        DailySales(**row)
+        for row in orders.order_by().annotate(day=TruncDate('created_at')).values('day').annotate(**sums)
+    ]
+    return statuses, days
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every metric row from the orders table; return the number of orders."""
+    statuses, days = aggregate(Order.objects.all())
+    SalesTotal.objects.all().delete()
+    DailySales.objects.all().delete()
+    SalesTotal.objects.bulk_create(statuses)
+    DailySales.objects.bulk_create(days, batch_size=500)
+    return sum(row.orders for row in statuses)
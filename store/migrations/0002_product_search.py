@@ -0,0 +1,74 @@
+# Generated by Django 6.0.2 on 2026-10-16 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_native_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts "
+                    "USING fts5(name, description, category, tokenize='porter unicode61')"
+                )
+            except Exception:
+                # SQLite built without FTS5: the python backend is used instead.
+                return
+            cursor.execute(
+                "INSERT INTO store_product_fts (rowid, name, description, category) "
+                "SELECT p.id, p.name, p.description, c.name "
+                "FROM store_product p JOIN store_category c ON c.id = p.category_id"
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS store_product_search ("
+                "product_id bigint PRIMARY KEY REFERENCES store_product (id) "
+                "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS store_product_search_document_idx "
+                "ON store_product_search USING gin (document)"
+            )
+            cursor.execute(
+                "INSERT INTO store_product_search (product_id, document) "
+                "SELECT p.id, setweight(to_tsvector('english', p.name), 'A') || "
+                "setweight(to_tsvector('english', replace(c.name, '_', ' ')), 'B') || "
+                "setweight(to_tsvector('english', p.description), 'C') "
+                "FROM store_product p JOIN store_category c ON c.id = p.category_id "
+                "ON CONFLICT (product_id) DO NOTHING"
+            )
+
+
+def drop_native_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("DROP TABLE IF EXISTS store_product_fts")
+        elif connection.vendor == 'postgresql':
+            cursor.execute("DROP TABLE IF EXISTS store_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'product'], name='store_search_term_idx')],
+            },
+        ),
+        migrations.RunPython(create_native_index, drop_native_index),
+    ]
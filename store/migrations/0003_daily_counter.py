@@ -0,0 +1,46 @@
+# Generated by Django 6.0.2 on 2026-10-16 10:05
+
+from datetime import datetime
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    # Continue numbering after the orders already issued each day.
+    Order = apps.get_model('store', 'Order')
+    DailyCounter = apps.get_model('store', 'DailyCounter')
+    latest = {}
+    for number in Order.objects.values_list('order_number', flat=True).iterator():
+        try:
+            _, stamp, value = number.split('-')
+            day = datetime.strptime(stamp, '%Y%m%d').date()
+            value = int(value)
+        except ValueError:
+            continue
+        latest[day] = max(latest.get(day, 0), value)
+    DailyCounter.objects.bulk_create(
+        DailyCounter(name='order', day=day, value=value) for day, value in latest.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20)),
+                ('day', models.DateField()),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('name', 'day')},
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.2 on 2026-10-16 15:20
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    SalesTotal = apps.get_model('store', 'SalesTotal')
+    DailySales = apps.get_model('store', 'DailySales')
+    sums = {
+        'orders': Count('id'),
+        'paid_orders': Count('id', filter=Q(payment_status=True)),
+        'revenue': Sum('total_amount', filter=Q(payment_status=True), default=Decimal('0')),
+    }
+    orders = Order.objects.order_by()
+    SalesTotal.objects.bulk_create(SalesTotal(**row) for row in orders.values('status').annotate(**sums))
+    DailySales.objects.bulk_create(
+        (DailySales(**row) for row in orders.annotate(day=TruncDate('created_at')).values('day').annotate(**sums)),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_store_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('orders', models.BigIntegerField(default=0)),
+                ('paid_orders', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('payment_confirmed', 'Payment Confirmed'), ('picked_up', 'Picked Up'), ('packaging', 'Packaging'), ('in_transit', 'In Transit'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20, unique=True)),
+                ('orders', models.BigIntegerField(default=0)),
+                ('paid_orders', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-16 21:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_providers(apps, schema_editor):
+    Payment = apps.get_model('store', 'Payment')
+    for method, provider in getattr(settings, 'PAYMENT_PROVIDERS', {}).items():
+        Payment.objects.filter(status='pending', payment_method=method).update(provider=provider)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_task_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='provider',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status', 'pending'), models.Q(('provider', ''), _negated=True)), fields=['checked_at'], name='store_payment_unchecked_idx'),
+        ),
+        migrations.RunPython(set_providers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:15
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_payment_verification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount_percentage',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(old_price__gt=models.F('price'), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('old_price'), '*', models.Value(100))), models.IntegerField()), '-', django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('price'), '*', models.Value(100))), models.IntegerField())), '*', models.Value(100)), '/', django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('old_price'), '*', models.Value(100))), models.IntegerField()))), default=0), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['-discount_percentage', '-id'], name='store_product_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['category', '-discount_percentage', '-id'], name='store_product_cat_disc_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import BooleanField, Case, Count, ExpressionWrapper, IntegerField, Q, Value, When
+
+PRICE_LIMITS = [5000, 20000, 50000, 100000]
+DISCOUNT_LIMITS = [1, 10, 25, 50]
+
+
+def band(field, limits):
+    return Case(
+        *[When(**{f'{field}__gte': limit}, then=Value(n)) for n, limit in reversed(list(enumerate(limits, 1)))],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def backfill(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    FacetCount = apps.get_model('store', 'FacetCount')
+    rows = (
+        Product.objects.filter(available=True)
+        .order_by()
+        .values('category_id')
+        .annotate(
+            price_band=band('price', PRICE_LIMITS),
+            in_stock=ExpressionWrapper(Q(stock__gt=0), output_field=BooleanField()),
+            discount_band=band('discount_percentage', DISCOUNT_LIMITS),
+        )
+        .values('category_id', 'price_band', 'in_stock', 'discount_band')
+        .annotate(products=Count('id'))
+    )
+    FacetCount.objects.bulk_create((FacetCount(**row) for row in rows), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_discount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_band', models.PositiveSmallIntegerField()),
+                ('in_stock', models.BooleanField()),
+                ('discount_band', models.PositiveSmallIntegerField()),
+                ('products', models.BigIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.category')),
+            ],
+            options={
+                'unique_together': {('category', 'price_band', 'in_stock', 'discount_band')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,8 @@
 from django.db import models
+from django.db.models.functions import Cast, Round
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator
-import uuid
-from datetime import datetime
 
 
 class Category(models.Model):
@@ -16,6 +15,7 @@ class Category(models.Model):
         ('automobile', 'Automobile'),
         ('industrial_scientific', 'Industrial & Scientific'),
     ]
+    CATEGORY_NAMES = dict(CATEGORY_CHOICES)
 
     name = models.CharField(max_length=50, choices=CATEGORY_CHOICES, unique=True)
     slug = models.SlugField(max_length=100, unique=True)
@@ -28,10 +28,37 @@ class Category(models.Model):
         ordering = ['name']
 
     def __str__(self):
-        return dict(self.CATEGORY_CHOICES)[self.name]
+        return self.CATEGORY_NAMES[self.name]
 
     def get_display_name(self):
-        return dict(self.CATEGORY_CHOICES)[self.name]
+        return self.CATEGORY_NAMES[self.name]
+
+
+def _cents(field):
+    return Cast(Round(models.F(field) * 100), models.IntegerField())
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Listings read everything a product card shows from the row: the discount
+    is the ``discount_percentage`` generated column and the stock flag an
+    annotation, so templates never do arithmetic per product.
+    """
+
+    def with_in_stock(self):
+        return self.annotate(in_stock=models.ExpressionWrapper(models.Q(stock__gt=0), output_field=models.BooleanField()))
+
+    def discount_between(self, low=None, high=None):
+        """Products discounted by at least ``low`` and at most ``high`` percent."""
+        queryset = self
+        if low is not None:
+            queryset = queryset.filter(discount_percentage__gte=low)
+        if high is not None:
+            queryset = queryset.filter(discount_percentage__lte=high)
+        return queryset
+
+    def for_listing(self):
+        return self.filter(available=True).with_in_stock()
 
 
 class Product(models.Model):
@@ -49,9 +76,43 @@ class Product(models.Model):
     image3 = models.ImageField(upload_to='products/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # get_discount_percentage(), kept up to date by the database and indexed
+    # for the "biggest discount" sort. Prices are compared in whole cents so
+    # SQLite's floating point gives the same answer as Decimal.
+    discount_percentage = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                old_price__gt=models.F('price'),
+                then=(_cents('old_price') - _cents('price')) * 100 / _cents('old_price'),
+            ),
+            default=0,
+        ),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Storefront listings only ever show available products, in the
+            # orderings offered by store.pagination.
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(available=True),
+                         name='store_product_new_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(available=True),
+                         name='store_product_price_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=models.Q(available=True),
+                         name='store_product_cat_new_idx'),
+            models.Index(fields=['category', 'price', 'id'], condition=models.Q(available=True),
+                         name='store_product_cat_price_idx'),
+            models.Index(fields=['-discount_percentage', '-id'], condition=models.Q(available=True),
+                         name='store_product_discount_idx'),
+            models.Index(fields=['category', '-discount_percentage', '-id'], condition=models.Q(available=True),
+                         name='store_product_cat_disc_idx'),
+            # Admin listings, which include unavailable products
+            models.Index(fields=['-created_at'], name='store_product_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -65,6 +126,32 @@ class Product(models.Model):
         return 0
 
 
+class ProductSearchTerm(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=50)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [models.Index(fields=['term', 'product'], name='store_search_term_idx')]
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
+class ProductNeighbor(models.Model):
+    """The ``rank``-th product recommended next to ``product``, written by store.recommendations."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbor_of')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ['product', 'rank']
+
+    def __str__(self):
+        return f"{self.product_id} #{self.rank}: {self.neighbor_id}"
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     phone_number = models.CharField(max_length=15, blank=True)
@@ -89,6 +176,7 @@ class Address(models.Model):
 
     class Meta:
         ordering = ['-is_default', '-created_at']
+        indexes = [models.Index(fields=['user', '-is_default', '-created_at'], name='store_address_user_idx')]
 
     def __str__(self):
         return f"{self.full_name}, {self.city}, {self.state}"
@@ -102,6 +190,7 @@ class Cart(models.Model):
 
     class Meta:
         unique_together = ['user', 'product']
+        indexes = [models.Index(fields=['user', 'added_at'], name='store_cart_user_added_idx')]
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
@@ -141,24 +230,81 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='store_order_new_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='store_order_user_new_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='store_order_status_new_idx'),
+            # Covers the revenue total, which only reads paid orders' amounts
+            models.Index(fields=['payment_status', 'total_amount'], name='store_order_paid_idx'),
+        ]
 
     def __str__(self):
         return self.order_number
 
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            timestamp = datetime.now().strftime('%Y%m%d')
-            count = Order.objects.count() + 1
-            self.order_number = f"ORD-{timestamp}-{count:04d}"
+        if not self.order_number or not self.delivery_number:
+            from .numbering import next_order_numbers
 
-        if not self.delivery_number:
-            timestamp = datetime.now().strftime('%Y%m%d')
-            count = Order.objects.count() + 1
-            self.delivery_number = f"DEL-{timestamp}-{count:04d}"
+            order_number, delivery_number = next_order_numbers()
+            self.order_number = self.order_number or order_number
+            self.delivery_number = self.delivery_number or delivery_number
 
         super().save(*args, **kwargs)
 
 
+class DailyCounter(models.Model):
+    name = models.CharField(max_length=20)
+    day = models.DateField()
+    value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['name', 'day']
+
+    def __str__(self):
+        return f"{self.name} {self.day}: {self.value}"
+
+
+class SalesTotal(models.Model):
+    """Orders and paid revenue per order status, maintained by store.metrics."""
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, unique=True)
+    orders = models.BigIntegerField(default=0)
+    paid_orders = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.orders}"
+
+
+class DailySales(models.Model):
+    """Orders and paid revenue per day the orders were placed, maintained by store.metrics."""
+    day = models.DateField(unique=True)
+    orders = models.BigIntegerField(default=0)
+    paid_orders = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Daily sales'
+        ordering = ['day']
+
+    def __str__(self):
+        return f"{self.day}: {self.orders}"
+
+
+class FacetCount(models.Model):
+    """Available products per combination of facet values, maintained by store.facets."""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    price_band = models.PositiveSmallIntegerField()
+    in_stock = models.BooleanField()
+    discount_band = models.PositiveSmallIntegerField()
+    products = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['category', 'price_band', 'in_stock', 'discount_band']
+
+    def __str__(self):
+        return f"{self.category_id}/{self.price_band}/{self.in_stock}/{self.discount_band}: {self.products}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -182,6 +328,7 @@ class OrderTracking(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['order', '-created_at'], name='store_tracking_order_idx')]
 
     def __str__(self):
         return f"{self.order.order_number} - {self.status}"
@@ -201,6 +348,54 @@ class Payment(models.Model):
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
     transaction_id = models.CharField(max_length=100, blank=True)
     payment_date = models.DateTimeField(auto_now_add=True)
+    # Gateway that verifies this payment (store.payments); blank if none does
+    provider = models.CharField(max_length=20, blank=True)
+    checked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The reconciler picks the pending payments checked longest ago.
+            models.Index(fields=['checked_at'], condition=models.Q(status='pending') & ~models.Q(provider=''),
+                         name='store_payment_unchecked_idx'),
+        ]
 
     def __str__(self):
         return f"Payment for {self.order.order_number}"
+
+
+class Task(models.Model):
+    """A unit of background work, run by ``manage.py run_workers`` (see store.queue)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            # Workers only look for due tasks and expired leases.
+            models.Index(fields=['run_at', 'id'], condition=models.Q(status='queued'), name='store_task_due_idx'),
+            models.Index(fields=['locked_at'], condition=models.Q(status='running'), name='store_task_lease_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
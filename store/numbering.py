@@ -0,0 +1,68 @@
+# store/numbering.py
+"""
+Order and delivery number allocation.
+
+Numbers come from a per-day counter row in ``DailyCounter`` that is bumped
+with a single atomic UPDATE, so allocating a number never scans the orders
+table and concurrent checkouts can never be handed the same value.
+
+With ``ORDER_NUMBER_BLOCK_SIZE`` above 1 every worker process reserves a
+block of numbers at once and hands them out from memory; numbers stay unique
+and increase within a process, at the cost of gaps when a worker exits.
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DailyCounter
+
+ORDER_SEQUENCE = 'order'
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def reserve(name, day, count=1):
+    """Atomically reserve ``count`` values and return the last one."""
+    counters = DailyCounter.objects.filter(name=name, day=day)
+    with transaction.atomic():
+        # UPDATE first: it takes the row (or database) write lock straight
+        # away, so two workers can never read the same value.
+        if not counters.update(value=F('value') + count):
+            try:
+                with transaction.atomic():
+                    DailyCounter.objects.create(name=name, day=day, value=count)
+            except IntegrityError:
+                counters.update(value=F('value') + count)
+        return counters.values_list('value', flat=True).get()
+
+
+def next_value(name, day=None):
+    day = day or timezone.localdate()
+    block_size = getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', 1)
+    if block_size <= 1:
+        return reserve(name, day)
+
+    key = (name, day)
+    with _blocks_lock:
+        current, last = _blocks.get(key, (0, 0))
+        if current >= last:
+            last = reserve(name, day, block_size)
+            current = last - block_size
+        current += 1
+        _blocks[key] = (current, last)
+        # Blocks for earlier days will never be used again.
+        for stale in [k for k in _blocks if k[0] == name and k[1] != day]:
+            del _blocks[stale]
+    return current
+
+
+def next_order_numbers(day=None):
+    """Return a fresh ``(order_number, delivery_number)`` pair."""
+    day = day or timezone.localdate()
+    value = next_value(ORDER_SEQUENCE, day)
+    stamp = day.strftime('%Y%m%d')
+    return f"ORD-{stamp}-{value:04d}", f"DEL-{stamp}-{value:04d}"
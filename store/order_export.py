@@ -0,0 +1,118 @@
+# store/order_export.py
+"""
+Order export for accounting.
+
+``manage.py export_orders`` and the order dashboard's export download write
+orders placed in a date range, optionally of one status, oldest first:
+
+* JSON Lines: one object per order, with its payment, shipping address and
+  items nested;
+* CSV: one row per order item (``ORDER_FIELDS``, the address and payment
+  columns repeated on each), and one row with empty item columns for an order
+  without items.
+
+Orders are read ``chunk_size`` at a time with ``QuerySet.iterator()``: one
+query for the orders, joined to their customer, payment and shipping address,
+and one prefetch for the items of the chunk. Rows are rendered as they are
+read (store.catalog.render) and the dashboard streams them in a
+StreamingHttpResponse, so memory stays flat and bytes keep flowing to the
+client however many orders match.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import catalog
+from .models import Order, OrderItem, Payment
+
+CHUNK_SIZE = 1000
+
+ORDER_FIELDS = ['order_number', 'delivery_number', 'created_at', 'status', 'payment_method', 'paid',
+                'total_amount', 'customer', 'email']
+PAYMENT_FIELDS = ['payment_status', 'transaction_id', 'payment_provider', 'payment_date']
+ADDRESS_FIELDS = ['full_name', 'phone_number', 'address_line1', 'address_line2', 'city', 'state', 'postal_code',
+                  'country']
+ITEM_FIELDS = ['product', 'product_name', 'quantity', 'price', 'line_total']
+
+CSV_FIELDS = ORDER_FIELDS + PAYMENT_FIELDS + [f'shipping_{name}' for name in ADDRESS_FIELDS] + ITEM_FIELDS
+
+
+def filtered(status=None, date_from=None, date_to=None):
+    """Orders of ``status`` placed from ``date_from`` to ``date_to`` (inclusive, local dates)."""
+    orders = Order.objects.all()
+    if status:
+        orders = orders.filter(status=status)
+    # Compare with the day boundaries rather than created_at__date, so the
+    # (created_at, id) index is used.
+    if date_from:
+        orders = orders.filter(created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to:
+        orders = orders.filter(
+            created_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+    return orders
+
+
+def _iso(value):
+    return timezone.localtime(value).isoformat() if value else ''
+
+
+def export_rows(orders=None, chunk_size=CHUNK_SIZE):
+    """Yield one dict per order of ``orders``, oldest first, with ``payment``, ``shipping_address`` and ``items``."""
+    orders = Order.objects.all() if orders is None else orders
+    orders = orders.select_related('user', 'payment', 'shipping_address').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product')
+                 .only('order_id', 'quantity', 'price', 'product__slug', 'product__name').order_by('pk')),
+    ).order_by('created_at', 'pk')
+    for order in orders.iterator(chunk_size=chunk_size):
+        try:
+            payment = order.payment
+        except Payment.DoesNotExist:
+            payment = None
+        address = order.shipping_address
+        yield {
+            'order_number': order.order_number,
+            'delivery_number': order.delivery_number,
+            'created_at': _iso(order.created_at),
+            'status': order.status,
+            'payment_method': order.payment_method,
+            'paid': order.payment_status,
+            'total_amount': order.total_amount,
+            'customer': order.user.username,
+            'email': order.user.email,
+            'payment': payment and {
+                'payment_status': payment.status,
+                'transaction_id': payment.transaction_id,
+                'payment_provider': payment.provider,
+                'payment_date': _iso(payment.payment_date),
+            },
+            'shipping_address': address and {name: getattr(address, name) for name in ADDRESS_FIELDS},
+            'items': [
+                {
+                    'product': item.product.slug,
+                    'product_name': item.product.name,
+                    'quantity': item.quantity,
+                    'price': item.price,
+                    'line_total': item.get_total_price(),
+                }
+                for item in order.items.all()
+            ],
+        }
+
+
+def csv_rows(rows):
+    """Flatten ``export_rows()`` into one dict of ``CSV_FIELDS`` per order item."""
+    for row in rows:
+        flat = {name: row[name] for name in ORDER_FIELDS}
+        flat.update(row['payment'] or dict.fromkeys(PAYMENT_FIELDS, ''))
+        address = row['shipping_address'] or {}
+        flat.update({f'shipping_{name}': address.get(name, '') for name in ADDRESS_FIELDS})
+        for item in row['items'] or [dict.fromkeys(ITEM_FIELDS, '')]:
+            yield {**flat, **item}
+
+
+def render(rows, fmt):
+    """Yield ``export_rows()`` as lines of CSV or JSON Lines."""
+    if fmt == 'csv':
+        return catalog.render(csv_rows(rows), 'csv', CSV_FIELDS)
+    return catalog.render(rows, fmt)
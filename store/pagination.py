@@ -0,0 +1,201 @@
+# store/pagination.py
+"""
+Cursor (keyset) pagination.
+
+``Paginator`` runs a COUNT(*) and an OFFSET for every page, so deep pages get
+slower as a table grows. ``KeysetPaginator`` instead remembers the sort key of
+the last row shown and asks for the rows after it, which an index on the
+ordering answers in the same time for page 1 and page 10,000.
+
+Cursors are opaque, URL-safe strings. A cursor that cannot be decoded, or
+whose values the ordering fields do not accept, is treated as "first page"
+rather than an error, so stale or edited links still work.
+"""
+import base64
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import GeneratedField, Q
+
+# Orderings the storefront paginates on; the primary key breaks ties so the
+# order is total and no row is skipped or repeated between pages.
+ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'price_low': ('price', 'id'),
+    'price_high': ('-price', '-id'),
+    'discount': ('-discount_percentage', '-id'),
+}
+
+# Totals above this are shown as "more than" unless the database can estimate.
+ESTIMATE_LIMIT = 1000
+
+
+def _json_default(value):
+    # Full precision: DjangoJSONEncoder would cut datetimes to milliseconds,
+    # and the cursor has to match the stored value exactly.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(values, backwards=False):
+    payload = json.dumps({'v': values, 'b': backwards}, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(values, backwards)``, or ``(None, False)`` for a bad cursor."""
+    if not cursor:
+        return None, False
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, backwards = payload['v'], bool(payload['b'])
+    except (ValueError, KeyError, TypeError):
+        return None, False
+    if not isinstance(values, list):
+        return None, False
+    return values, backwards
+
+
+class CursorPage:
+    """
+    One page of results. ``count`` is the (possibly estimated) total, or
+    ``None`` when it was not computed or is above ``count_limit``.
+    """
+    count_limit = ESTIMATE_LIMIT
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page, estimate_count=False):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.estimate_count = estimate_count
+
+    def _fields(self, backwards):
+        # (field name, ascending?) for every ordering term
+        fields = []
+        for term in self.ordering:
+            descending = term.startswith('-')
+            fields.append((term.lstrip('-'), descending == backwards))
+        return fields
+
+    def _after(self, values, backwards):
+        """Q matching the rows that come after ``values`` in the walk order."""
+        condition = Q()
+        equal = Q()
+        for (name, ascending), value in zip(self._fields(backwards), values):
+            condition |= equal & Q(**{f'{name}__{"gt" if ascending else "lt"}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _key(self, obj):
+        return [getattr(obj, name) for name, _ in self._fields(False)]
+
+    def _decode(self, cursor):
+        values, backwards = decode_cursor(cursor)
+        if values is None or len(values) != len(self.ordering):
+            return None, False
+        opts = self.queryset.model._meta
+        if None in values:
+            # No ordering field is nullable, and validate() skips fields like auto_now ones.
+            return None, False
+        try:
+            values = [
+                self._field(opts.get_field(name)).clean(value, None)
+                for (name, _), value in zip(self._fields(False), values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            return None, False
+        return values, backwards
+
+    @staticmethod
+    def _field(field):
+        return field.output_field if isinstance(field, GeneratedField) else field
+
+    def query(self, cursor=None):
+        """The queryset for the page at ``cursor``, with one extra row to detect a next page."""
+        values, backwards = self._decode(cursor)
+        ordering = [
+            name if ascending else f'-{name}' for name, ascending in self._fields(backwards)
+        ]
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backwards))
+        return queryset[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        values, backwards = self._decode(cursor)
+        rows = list(self.query(cursor))
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if more or backwards:
+                next_cursor = encode_cursor(self._key(rows[-1]))
+            if values is not None and (more or not backwards):
+                previous_cursor = encode_cursor(self._key(rows[0]), backwards=True)
+
+        count = None
+        if self.estimate_count:
+            count = estimated_count(self.queryset)
+        return CursorPage(rows, next_cursor, previous_cursor, count)
+
+
+def paginate_sequence(sequence, cursor, per_page):
+    """Cursor-paginate an in-memory sequence, e.g. a ranked list of search hits."""
+    values, _ = decode_cursor(cursor)
+    start = values[0] if values and isinstance(values[0], int) and values[0] > 0 else 0
+    rows = list(sequence[start:start + per_page])
+    next_cursor = encode_cursor([start + per_page]) if start + per_page < len(sequence) else None
+    previous_cursor = encode_cursor([max(start - per_page, 0)]) if start else None
+    return CursorPage(rows, next_cursor, previous_cursor, count=len(sequence))
+
+
+def estimated_count(queryset, limit=ESTIMATE_LIMIT):
+    """
+    Approximate number of rows in ``queryset`` without counting all of them.
+
+    PostgreSQL answers from the planner's estimate; elsewhere the count stops
+    at ``limit`` and ``None`` is returned beyond it ("more than limit").
+    """
+    queryset = queryset.order_by()
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    count = queryset[:limit + 1].count()
+    return count if count <= limit else None
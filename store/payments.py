@@ -0,0 +1,285 @@
+# store/payments.py
+"""
+Payment verification against the payment gateways.
+
+Each gateway is a ``PaymentProvider`` that asks the gateway what happened to
+one payment (``verify``) and checks webhook signatures (``parse_webhook``).
+``PAYMENT_PROVIDERS`` maps payment methods to providers; cash on delivery has
+none and is never verified.
+
+Nothing here runs inside a checkout request:
+
+* webhooks only check the signature and queue a ``verify_payment`` task;
+* ``reconcile()`` (the ``reconcile_payments`` command) asks the gateways
+  about a batch of pending payments concurrently.
+
+All gateway calls share one ``requests.Session`` whose keep-alive connection
+pool is sized by ``PAYMENT_HTTP_POOL_SIZE``, with ``PAYMENT_HTTP_TIMEOUT`` on
+every request and retries only for idempotent GETs.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+COMPLETED = 'completed'
+FAILED = 'failed'
+PENDING = 'pending'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PaymentError(Exception):
+    """The gateway could not be reached or gave an unusable answer."""
+
+
+class WebhookError(Exception):
+    """A webhook request was not signed by the gateway."""
+
+
+class Result(NamedTuple):
+    status: str
+    transaction_id: str = ''
+    amount: Decimal = None
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            size = getattr(settings, 'PAYMENT_HTTP_POOL_SIZE', 10)
+            retry = Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504],
+                          allowed_methods=['GET'])
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def minor_units(amount):
+    """Stripe and Paystack count money in kobo (or cents)."""
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+class PaymentProvider:
+    name = None
+    api_base_setting = None
+    secret_setting = None
+
+    @property
+    def api_base(self):
+        return getattr(settings, self.api_base_setting).rstrip('/')
+
+    @property
+    def secret(self):
+        return getattr(settings, self.secret_setting)
+
+    def get(self, path, **params):
+        from requests import RequestException
+
+        try:
+            response = get_session().get(
+                f'{self.api_base}{path}',
+                params=params or None,
+                headers={'Authorization': f'Bearer {self.secret}'},
+                timeout=settings.PAYMENT_HTTP_TIMEOUT,
+            )
+        except RequestException as e:
+            raise PaymentError(f'{self.name}: {e}') from e
+        if response.status_code >= 500:
+            raise PaymentError(f'{self.name}: HTTP {response.status_code}')
+        try:
+            return response.status_code, response.json()
+        except ValueError as e:
+            raise PaymentError(f'{self.name}: invalid JSON') from e
+
+    def verify(self, payment):
+        """Return the gateway's ``Result`` for ``payment``."""
+        raise NotImplementedError
+
+    def parse_webhook(self, request):
+        """Return ``(event id, payment reference)`` from a signed webhook, or raise WebhookError."""
+        raise NotImplementedError
+
+
+class StripeProvider(PaymentProvider):
+    name = 'stripe'
+    api_base_setting = 'STRIPE_API_BASE'
+    secret_setting = 'STRIPE_SECRET_KEY'
+    signature_tolerance = 300
+
+    STATUSES = {'succeeded': COMPLETED, 'canceled': FAILED}
+
+    def verify(self, payment):
+        if payment.transaction_id.startswith('pi_'):
+            status, intent = self.get(f'/v1/payment_intents/{payment.transaction_id}')
+        else:
+            # Checkout sessions tag the PaymentIntent with the order number.
+            number = payment.order.order_number
+            status, found = self.get('/v1/payment_intents/search', query=f"metadata['order_number']:'{number}'")
+            intent = (found.get('data') or [None])[0] if status < 400 else found
+        if status == 404 or intent is None:
+            return Result(PENDING)
+        if status >= 400:
+            raise PaymentError(f'stripe: HTTP {status}')
+        return Result(
+            self.STATUSES.get(intent.get('status'), PENDING),
+            intent.get('id', ''),
+            Decimal(intent.get('amount_received') or intent.get('amount') or 0) / 100,
+        )
+
+    def parse_webhook(self, request):
+        header = request.headers.get('Stripe-Signature', '')
+        parts = dict(part.split('=', 1) for part in header.split(',') if '=' in part)
+        signed = f"{parts.get('t', '')}.".encode() + request.body
+        expected = hmac.new(settings.STRIPE_WEBHOOK_SECRET.encode(), signed, hashlib.sha256).hexdigest()
+        if not settings.STRIPE_WEBHOOK_SECRET or not hmac.compare_digest(expected, parts.get('v1', '')):
+            raise WebhookError('Bad Stripe signature')
+        if abs(time.time() - int(parts['t'])) > self.signature_tolerance:
+            raise WebhookError('Stale Stripe signature')
+
+        event = json.loads(request.body)
+        intent = event.get('data', {}).get('object', {})
+        return event.get('id'), intent.get('metadata', {}).get('order_number') or intent.get('id')
+
+
+class PaystackProvider(PaymentProvider):
+    name = 'paystack'
+    api_base_setting = 'PAYSTACK_API_BASE'
+    secret_setting = 'PAYSTACK_SECRET_KEY'
+
+    STATUSES = {'success': COMPLETED, 'failed': FAILED, 'abandoned': FAILED, 'reversed': FAILED}
+
+    def verify(self, payment):
+        # Transactions are initialized with the order number as reference.
+        reference = payment.transaction_id or payment.order.order_number
+        status, body = self.get(f'/transaction/verify/{reference}')
+        if status in (401, 403):
+            raise PaymentError(f'paystack: HTTP {status}')
+        if status >= 400 or not body.get('status'):
+            # Unknown reference: the customer has not paid yet.
+            return Result(PENDING)
+        data = body.get('data') or {}
+        return Result(
+            self.STATUSES.get(data.get('status'), PENDING),
+            str(data.get('reference') or reference),
+            Decimal(data.get('amount') or 0) / 100,
+        )
+
+    def parse_webhook(self, request):
+        signature = request.headers.get('X-Paystack-Signature', '')
+        expected = hmac.new(self.secret.encode(), request.body, hashlib.sha512).hexdigest()
+        if not self.secret or not hmac.compare_digest(expected, signature):
+            raise WebhookError('Bad Paystack signature')
+
+        event = json.loads(request.body)
+        data = event.get('data', {})
+        reference = data.get('reference')
+        return f"{event.get('event')}:{data.get('id') or reference}", reference
+
+
+PROVIDERS = {provider.name: provider for provider in (StripeProvider, PaystackProvider)}
+
+
+def get_provider(name):
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise LookupError(f'Unknown payment provider {name!r}')
+
+
+def provider_for(payment_method):
+    """Name of the provider that verifies ``payment_method``, or '' if none does."""
+    return getattr(settings, 'PAYMENT_PROVIDERS', {}).get(payment_method, '')
+
+
+def find_payment(reference):
+    """The Payment a webhook refers to, by gateway transaction id or order number."""
+    if not reference:
+        return None
+    return (
+        Payment.objects.filter(transaction_id=reference).first()
+        or Payment.objects.filter(order__order_number=reference).first()
+    )
+
+
+def apply(payment, result):
+    """Record ``result`` on ``payment`` and, once paid, on its order."""
+    status = result.status
+    if status == COMPLETED and result.amount is not None and minor_units(result.amount) != minor_units(payment.amount):
+        logger.warning('Payment %s: gateway amount %s does not match %s', payment.pk, result.amount, payment.amount)
+        status = FAILED
+
+    with transaction.atomic():
+        # Lock the row so a webhook and the reconciler cannot both apply a result.
+        current = Payment.objects.select_for_update().select_related('order').get(pk=payment.pk)
+        current.checked_at = timezone.now()
+        fields = ['checked_at']
+        if current.status == PENDING and status != PENDING:
+            current.status = status
+            fields.append('status')
+            if result.transaction_id and not current.transaction_id:
+                current.transaction_id = result.transaction_id
+                fields.append('transaction_id')
+        current.save(update_fields=fields)
+
+        if current.status == COMPLETED and not current.order.payment_status:
+            current.order.payment_status = True
+            # save() so the sales metrics see the change
+            current.order.save(update_fields=['payment_status', 'updated_at'])
+    return current
+
+
+def verify(payment):
+    """Ask the payment's gateway about it and record the answer."""
+    return apply(payment, get_provider(payment.provider).verify(payment))
+
+
+def _ask(payment):
+    try:
+        return get_provider(payment.provider).verify(payment)
+    except PaymentError as e:
+        logger.warning('Could not verify payment %s: %s', payment.pk, e)
+        return None
+
+
+def reconcile(limit=100, workers=None):
+    """
+    Verify up to ``limit`` pending payments, least recently checked first.
+    Gateways are asked ``workers`` at a time; the answers are then written
+    from this thread, so the pool never holds database connections.
+    Return ``{outcome: count}``.
+    """
+    workers = workers or getattr(settings, 'PAYMENT_HTTP_POOL_SIZE', 10)
+    pending = list(
+        Payment.objects.filter(status=PENDING).exclude(provider='')
+        .select_related('order')
+        .order_by(F('checked_at').asc(nulls_first=True), 'pk')[:limit]
+    )
+    outcomes = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for payment, result in zip(pending, pool.map(_ask, pending)):
+            status = apply(payment, result).status if result else 'error'
+            outcomes[status] = outcomes.get(status, 0) + 1
+    return outcomes
@@ -0,0 +1,415 @@
+# store/perf.py
+"""
+Per-request performance instrumentation.
+
+``PerformanceMiddleware`` records, for every request, the wall time, time
+spent in database queries, the number of queries and which of them repeat,
+time spent rendering templates, and cache hits and misses. It returns them
+in a ``Server-Timing`` header (shown in the browser's network panel) and
+adds them to a rolling window of the last ``PERF_WINDOW`` requests per view,
+which staff read at ``/dashboard/perf/``. Each worker process keeps its own
+window.
+
+Queries are grouped by fingerprint, the SQL with its parameters and literals
+blanked out, so a query run once per row of a list (N+1) shows up as one
+fingerprint with a high count.
+
+With ``PERF_PROFILE`` on, a sampling profiler takes the stack of every
+request thread each ``PERF_PROFILE_INTERVAL_MS``. Requests slower than
+``PERF_SLOW_MS`` have their samples written to ``PERF_PROFILE_DIR`` in folded
+format (one ``frame;frame;frame count`` line per stack), which flamegraph.pl
+and speedscope read directly. The profiler follows the request's thread, so
+it only covers requests served synchronously; under ASGI an async view's
+work is spread over the event loop and ``sync_to_async`` threads.
+"""
+import collections
+import contextvars
+import math
+import os
+import re
+import sys
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.base import Template
+from django.utils import timezone
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, None)
+
+_current = contextvars.ContextVar('store_perf_stats', default=None)
+_MISSING = object()
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r'IN \((?:\?, )*\?\)')
+
+
+def fingerprint(sql):
+    """``sql`` with parameters, literals and IN lists blanked out."""
+    sql = _LITERAL.sub('?', sql).replace('%s', '?')
+    return _IN_LIST.sub('IN (...)', ' '.join(sql.split()))
+
+
+def percentile(ordered, q):
+    """Nearest-rank ``q``th percentile of a sorted list."""
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        self.db_time = 0.0
+        self.queries = 0
+        self.fingerprints = collections.Counter()
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Nesting of instrumented calls, so included templates and cache
+        # calls made by other cache calls are not counted twice.
+        self.template_depth = 0
+        self.cache_depth = 0
+
+    def duplicates(self):
+        """``{fingerprint: count}`` for the queries run more than once."""
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    def server_timing(self):
+        duplicated = sum(count - 1 for count in self.duplicates().values())
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries, {duplicated} duplicated"',
+            f'tpl;dur={self.template_time * 1000:.1f};desc="templates"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'total;dur={self.wall * 1000:.1f}',
+        ])
+
+    def sample(self):
+        return (
+            self.wall * 1000,
+            self.db_time * 1000,
+            self.queries,
+            sum(count - 1 for count in self.duplicates().values()),
+            self.template_time * 1000,
+            self.cache_hits,
+            self.cache_misses,
+        )
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - start
+        stats.queries += 1
+        stats.fingerprints[fingerprint(sql)] += 1
+
+
+@receiver(connection_created)
+def install_query_wrapper(sender, connection, **kwargs):
+    # On every connection rather than around each request: the queries of an
+    # async view run on the connections of other threads.
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def _install_template_timer():
+    render = Template.render
+    if getattr(render, 'store_perf', False):
+        return
+
+    def timed_render(self, context):
+        stats = _current.get()
+        if stats is None or stats.template_depth:
+            return render(self, context)
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.template_depth -= 1
+            stats.template_time += time.perf_counter() - start
+
+    timed_render.store_perf = True
+    Template.render = timed_render
+
+
+def _install_cache_counters(cls):
+    if cls.__dict__.get('store_perf'):
+        return
+    get, get_many = cls.get, cls.get_many
+
+    def counted_get(self, key, default=None, version=None):
+        stats = _current.get()
+        if stats is None or stats.cache_depth:
+            return get(self, key, default, version=version)
+        stats.cache_depth += 1
+        try:
+            value = get(self, key, _MISSING, version=version)
+        finally:
+            stats.cache_depth -= 1
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+
+    def counted_get_many(self, keys, version=None):
+        stats = _current.get()
+        if stats is None or stats.cache_depth:
+            return get_many(self, keys, version=version)
+        keys = list(keys)
+        stats.cache_depth += 1
+        try:
+            found = get_many(self, keys, version=version)
+        finally:
+            stats.cache_depth -= 1
+        stats.cache_hits += len(found)
+        stats.cache_misses += len(keys) - len(found)
+        return found
+
+    cls.get, cls.get_many, cls.store_perf = counted_get, counted_get_many, True
+
+
+class Window:
+    """The last ``size`` request samples of every view."""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def add(self, view, sample):
+        with self._lock:
+            if view not in self._samples:
+                self._samples[view] = collections.deque(maxlen=self.size)
+            self._samples[view].append(sample)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """One dict per view, slowest p95 first."""
+        with self._lock:
+            samples = {view: list(rows) for view, rows in self._samples.items()}
+        views = []
+        for view, rows in samples.items():
+            walls = sorted(row[0] for row in rows)
+            count = len(rows)
+            hits = sum(row[5] for row in rows)
+            lookups = hits + sum(row[6] for row in rows)
+            buckets = [0] * len(BUCKETS)
+            for wall in walls:
+                buckets[next(i for i, bound in enumerate(BUCKETS) if bound is None or wall <= bound)] += 1
+            tallest = max(buckets)
+            views.append({
+                'view': view,
+                'requests': count,
+                'p50': percentile(walls, 50),
+                'p95': percentile(walls, 95),
+                'p99': percentile(walls, 99),
+                'db': sum(row[1] for row in rows) / count,
+                'queries': sum(row[2] for row in rows) / count,
+                'duplicates': max(row[3] for row in rows),
+                'templates': sum(row[4] for row in rows) / count,
+                'cache_hit_rate': 100 * hits / lookups if lookups else None,
+                'buckets': [
+                    {'label': bucket_label(i), 'count': n, 'height': round(100 * n / tallest)}
+                    for i, n in enumerate(buckets)
+                ],
+            })
+        views.sort(key=lambda row: row['p95'], reverse=True)
+        return views
+
+
+def bucket_label(index):
+    bound = BUCKETS[index]
+    return f'≤{bound} ms' if bound is not None else f'>{BUCKETS[index - 1]} ms'
+
+
+class Sampler:
+    """Samples the stacks of the registered threads from a daemon thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}
+        self._busy = threading.Event()
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._active[ident] = collections.Counter()
+            self._busy.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='perf-sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, ident):
+        """Stop sampling ``ident``; return its ``{folded stack: samples}``."""
+        with self._lock:
+            stacks = self._active.pop(ident, collections.Counter())
+            if not self._active:
+                self._busy.clear()
+        return stacks
+
+    def _run(self):
+        while True:
+            self._busy.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[fold(frame)] += 1
+
+
+def fold(frame):
+    """The stack above ``frame`` as ``outermost;...;innermost`` module:function names."""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+_window = None
+_sampler = None
+_lock = threading.Lock()
+
+
+def get_window():
+    global _window
+    with _lock:
+        if _window is None:
+            _window = Window(getattr(settings, 'PERF_WINDOW', 1000))
+        return _window
+
+
+def get_sampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = Sampler(getattr(settings, 'PERF_PROFILE_INTERVAL_MS', 5) / 1000)
+        return _sampler
+
+
+def profile_dir():
+    return getattr(settings, 'PERF_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def save_profile(view, stats, stacks):
+    """Write ``stacks`` in folded format and keep only the newest ``PERF_PROFILE_KEEP`` files."""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{re.sub(r'[^A-Za-z0-9_.-]', '_', view)}-{stats.wall * 1000:.0f}ms.folded"
+    with open(os.path.join(directory, name), 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    for old in recent_profiles()[getattr(settings, 'PERF_PROFILE_KEEP', 50):]:
+        os.remove(os.path.join(directory, old))
+    return name
+
+
+def recent_profiles():
+    """Names of the saved profiles, newest first."""
+    try:
+        names = [name for name in os.listdir(profile_dir()) if name.endswith('.folded')]
+    except FileNotFoundError:
+        return []
+    return sorted(names, reverse=True)
+
+
+def profile_path(name):
+    """Path of the saved profile ``name``, or ``None`` if there is no such profile."""
+    if name not in recent_profiles():
+        return None
+    return os.path.join(profile_dir(), name)
+
+
+class PerformanceMiddleware:
+    """
+    Put this first in ``MIDDLEWARE`` so the other middleware is measured too.
+    Time a streaming response spends producing its body is not included.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        _install_template_timer()
+        for alias in settings.CACHES:
+            _install_cache_counters(type(caches[alias]))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        sampler = get_sampler() if getattr(settings, 'PERF_PROFILE', False) else None
+        ident = threading.get_ident()
+        if sampler:
+            sampler.start(ident)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            stats.wall = time.perf_counter() - stats.started
+            stacks = sampler.stop(ident) if sampler else None
+
+        view = self.record(request, stats)
+        if stacks and stats.wall * 1000 >= getattr(settings, 'PERF_SLOW_MS', 500):
+            save_profile(view, stats, stacks)
+        if self.show_timing(request):
+            response['Server-Timing'] = stats.server_timing()
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+            stats.wall = time.perf_counter() - stats.started
+
+        self.record(request, stats)
+        if await self.ashow_timing(request):
+            response['Server-Timing'] = stats.server_timing()
+        return response
+
+    def record(self, request, stats):
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        get_window().add(view, stats.sample())
+        return view
+
+    def show_timing(self, request):
+        if getattr(settings, 'PERF_SERVER_TIMING', False):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+    async def ashow_timing(self, request):
+        if getattr(settings, 'PERF_SERVER_TIMING', False):
+            return True
+        auser = getattr(request, 'auser', None)
+        user = await auser() if auser else None
+        return bool(user and user.is_staff)
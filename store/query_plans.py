@@ -0,0 +1,119 @@
+# store/query_plans.py
+"""
+Query plans for the storefront's querysets.
+
+``view_querysets()`` rebuilds the querysets the views run, with sample
+values taken from the database, and ``check()`` runs EXPLAIN on each of them
+and reports full table scans and sorts that an index should have answered.
+The ``check_query_plans`` command prints the report.
+
+On PostgreSQL sequential scans are disabled while explaining, so the planner
+picks an index whenever one can be used no matter how small the table is; a
+"Seq Scan" left in the plan means no usable index exists.
+"""
+import re
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+
+from . import order_export
+from .models import Address, Cart, Category, DailySales, FacetCount, Order, OrderItem, OrderTracking, Product
+from .pagination import ORDERINGS, KeysetPaginator, encode_cursor
+
+# Small lookup tables that are cheaper to scan than to index.
+ALLOWED_SCANS = {'store_category', 'store_facetcount'}
+
+SQLITE_SCAN = re.compile(r'\bSCAN (\w+)(.*)$', re.MULTILINE)
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+POSTGRES_SORT = re.compile(r'\bSort Key: ')
+
+
+def _pages(queryset, ordering, per_page, cursor):
+    paginator = KeysetPaginator(queryset, ordering, per_page)
+    return paginator.query(), paginator.query(cursor)
+
+
+def view_querysets():
+    """Return ``[(label, queryset)]`` for the querysets the views run."""
+    user = User.objects.values_list('pk', flat=True).first() or 0
+    category = Category.objects.values_list('pk', flat=True).first() or 0
+    order = Order.objects.values_list('pk', flat=True).first() or 0
+    now = datetime.now(timezone.utc)
+    newest = encode_cursor([now, 0])
+    by_price = encode_cursor([Decimal('0'), 0])
+    by_discount = encode_cursor([0, 0])
+
+    available = Product.objects.filter(available=True)
+    in_category = available.filter(category=category)
+    plans = [
+        ('home: featured products', available[:8]),
+        ('home: latest products', available.order_by('-created_at')[:12]),
+        ('product detail', Product.objects.select_related('category').filter(slug='sample', available=True).order_by()),
+        ('product detail: related', available.filter(neighbor_of__product=0).order_by('neighbor_of__rank')[:4]),
+        ('product detail: related fallback', in_category.exclude(id=0)[:4]),
+        ('cart', Cart.objects.filter(user=user).select_related('product')),
+        ('cart api', Cart.objects.filter(user=user).select_related('product').order_by('added_at')),
+        ('addresses', Address.objects.filter(user=user)),
+        ('order detail: items', OrderItem.objects.filter(order=order).select_related('product')),
+        ('order detail: tracking', OrderTracking.objects.filter(order=order)),
+        ('dashboard: recent orders', Order.objects.select_related('user').order_by('-created_at')[:10]),
+        ('dashboard: daily sales', DailySales.objects.filter(day__gte=now.date(), day__lte=now.date())),
+        ('paid orders', Order.objects.filter(payment_status=True).order_by().values('total_amount')),
+        ('admin products', Product.objects.select_related('category').order_by('-created_at')[:20]),
+        ('product list: facet counts', FacetCount.objects.filter(products__gt=0)),
+        ('order export', order_export.filtered(date_from=now.date()).order_by('created_at', 'pk')),
+        ('order export by status',
+         order_export.filtered('delivered', now.date(), now.date()).order_by('created_at', 'pk')),
+        ('order export: items', OrderItem.objects.filter(order__in=[order]).select_related('product').order_by('pk')),
+    ]
+    for name, ordering, cursor in [
+        ('newest', ORDERINGS['newest'], newest),
+        ('price_low', ORDERINGS['price_low'], by_price),
+        ('price_high', ORDERINGS['price_high'], by_price),
+        ('discount', ORDERINGS['discount'], by_discount),
+    ]:
+        first, later = _pages(available, ordering, 12, cursor)
+        plans += [(f'product list ({name})', first), (f'product list ({name}, later page)', later)]
+        first, later = _pages(in_category, ordering, 12, cursor)
+        plans += [(f'category ({name})', first), (f'category ({name}, later page)', later)]
+    for label, queryset, per_page in [
+        ('orders', Order.objects.filter(user=user), 20),
+        ('admin orders', Order.objects.select_related('user'), 50),
+        ('admin orders by status', Order.objects.select_related('user').filter(status='pending'), 50),
+    ]:
+        first, later = _pages(queryset, ORDERINGS['newest'], per_page, newest)
+        plans += [(label, first), (f'{label} (later page)', later)]
+    return plans
+
+
+def explain(queryset):
+    """Return ``(vendor, plan)`` for ``queryset``."""
+    connection = connections[router.db_for_read(queryset.model)]
+    if connection.vendor != 'postgresql':
+        return connection.vendor, queryset.explain()
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return connection.vendor, queryset.explain()
+
+
+def problems(vendor, plan, allowed_scans=ALLOWED_SCANS):
+    """Return ``(scanned tables, sorts)`` found in an EXPLAIN output."""
+    if vendor == 'postgresql':
+        scans = POSTGRES_SCAN.findall(plan)
+        sorts = len(POSTGRES_SORT.findall(plan))
+    else:
+        scans = [table for table, rest in SQLITE_SCAN.findall(plan) if 'USING' not in rest]
+        sorts = len(SQLITE_SORT.findall(plan))
+    return sorted(set(scans) - set(allowed_scans)), sorts
+
+
+def check(allowed_scans=ALLOWED_SCANS):
+    """Yield ``(label, plan, scanned tables, sorts)`` for every view queryset."""
+    for label, queryset in view_querysets():
+        vendor, plan = explain(queryset)
+        scans, sorts = problems(vendor, plan, allowed_scans)
+        yield label, plan, scans, sorts
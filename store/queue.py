@@ -0,0 +1,165 @@
+# store/queue.py
+"""
+A small database-backed task queue.
+
+Register a function with ``@task`` and call ``enqueue()`` from a view or
+service; the task row is written in the caller's transaction, so work is
+queued if and only if the change that caused it commits. ``manage.py
+run_workers`` claims due tasks and runs them in a thread or process pool.
+
+* Retries: a task that raises is retried with exponential backoff and jitter
+  until ``max_attempts`` is reached, then marked failed.
+* Idempotency: ``enqueue(..., key=...)`` stores at most one task per key, so
+  enqueuing the same work twice is harmless. Task functions should still
+  tolerate running more than once, since a worker can die after finishing a
+  task but before marking it done.
+* Leases: a task claimed by a worker that stops responding is queued again
+  once ``TASK_LEASE_SECONDS`` have passed.
+"""
+import datetime
+import logging
+import random
+import traceback
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name=None, max_attempts=5):
+    """Register a function as a task; its keyword arguments must be JSON-serializable."""
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[task_name] = func
+        func.task_name = task_name
+        func.max_attempts = max_attempts
+        return func
+    return register
+
+
+def enqueue(func, key=None, delay=None, **kwargs):
+    """
+    Queue ``func(**kwargs)`` and return the Task. With ``key``, return the
+    existing task for that key instead of queueing a second one.
+    """
+    fields = {
+        'name': func.task_name,
+        'payload': kwargs,
+        'max_attempts': func.max_attempts,
+        'run_at': timezone.now() + (delay or datetime.timedelta()),
+    }
+    if key is None:
+        return Task.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Task.objects.create(idempotency_key=key, **fields)
+    except IntegrityError:
+        return Task.objects.get(idempotency_key=key)
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts`` (1-based), with full jitter."""
+    base = getattr(settings, 'TASK_BACKOFF_SECONDS', 5)
+    cap = getattr(settings, 'TASK_BACKOFF_MAX_SECONDS', 3600)
+    return random.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+
+
+def _release_expired(now):
+    lease = datetime.timedelta(seconds=getattr(settings, 'TASK_LEASE_SECONDS', 300))
+    Task.objects.filter(status=Task.RUNNING, locked_at__lt=now - lease).update(
+        status=Task.QUEUED, locked_by='', locked_at=None,
+    )
+
+
+def claim(worker, limit=1):
+    """Mark up to ``limit`` due tasks as running for ``worker`` and return them."""
+    now = timezone.now()
+    _release_expired(now)
+    due = Task.objects.filter(status=Task.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            tasks = list(due.select_for_update(skip_locked=True)[:limit])
+            Task.objects.filter(pk__in=[t.pk for t in tasks]).update(
+                status=Task.RUNNING, locked_by=worker, locked_at=now,
+            )
+    else:
+        # No row locks (SQLite): the conditional UPDATE decides which worker
+        # gets each task.
+        tasks = []
+        for candidate in due[:limit]:
+            claimed = Task.objects.filter(pk=candidate.pk, status=Task.QUEUED).update(
+                status=Task.RUNNING, locked_by=worker, locked_at=now,
+            )
+            if claimed:
+                tasks.append(candidate)
+    for t in tasks:
+        t.status, t.locked_by, t.locked_at = Task.RUNNING, worker, now
+    return tasks
+
+
+def run(t):
+    """Run a claimed task and record the outcome."""
+    func = _registry.get(t.name)
+    worker = t.locked_by
+    t.attempts += 1
+    try:
+        if func is None:
+            raise LookupError(f'No task registered as {t.name!r}')
+        func(**t.payload)
+    except Exception:
+        t.last_error = traceback.format_exc()
+        if t.attempts >= t.max_attempts:
+            t.status = Task.FAILED
+            t.finished_at = timezone.now()
+            logger.error('Task %s #%s failed for good after %d attempts', t.name, t.pk, t.attempts)
+        else:
+            t.status = Task.QUEUED
+            t.run_at = timezone.now() + datetime.timedelta(seconds=backoff(t.attempts))
+            logger.warning('Task %s #%s failed, retrying at %s', t.name, t.pk, t.run_at)
+    else:
+        t.status = Task.DONE
+        t.finished_at = timezone.now()
+    t.locked_by, t.locked_at = '', None
+    # Only write back if the lease has not expired and moved to another worker.
+    Task.objects.filter(pk=t.pk, status=Task.RUNNING, locked_by=worker).update(
+        status=t.status, attempts=t.attempts, run_at=t.run_at, last_error=t.last_error,
+        finished_at=t.finished_at, locked_by='', locked_at=None,
+    )
+    return t
+
+
+def run_pending(worker='inline', limit=100):
+    """Run every due task in this thread; return how many ran. Handy in tests and shells."""
+    count = 0
+    while count < limit:
+        tasks = claim(worker, min(10, limit - count))
+        if not tasks:
+            break
+        for t in tasks:
+            run(t)
+        count += len(tasks)
+    return count
+
+
+def work(worker, stop, poll_seconds=1.0, once=False, batch=1):
+    """Claim and run tasks until ``stop`` (an Event) is set, or the queue is empty with ``once``."""
+    try:
+        while not stop.is_set():
+            tasks = claim(worker, batch)
+            if not tasks:
+                if once:
+                    break
+                stop.wait(poll_seconds)
+                continue
+            for t in tasks:
+                run(t)
+    finally:
+        # Each thread or process has its own connection.
+        connection.close()
@@ -0,0 +1,183 @@
+# store/recommendations.py
+"""
+Related products for the product page.
+
+``build()`` is a batch job (``manage.py build_recommendations``) that scores
+every pair of available products and keeps the ``NEIGHBORS`` best of each in
+``ProductNeighbor``, so the product page loads its recommendations with one
+lookup on the (product, rank) index. Two signals are mixed:
+
+* co-purchase: the cosine of the products' order vectors, i.e. the orders
+  containing both over the square root of the product of their order counts;
+* content: the cosine of TF-IDF vectors of name, category and description,
+  hashed into ``DIMENSIONS`` columns.
+
+The scoring is vectorised with NumPy, which only the batch job imports. Rows
+are scored against the whole catalog a chunk at a time, so memory stays
+bounded (the content matrix is products x ``DIMENSIONS`` float32) but the
+work grows with the square of the catalog.
+
+Products added since the last build, or none of whose neighbors are still
+available, fall back to other products of their category.
+"""
+import zlib
+
+from django.db import transaction
+
+from . import caching, search
+from .models import OrderItem, Product, ProductNeighbor
+
+# Neighbors stored per product, and how many the product page shows.
+NEIGHBORS = 8
+SHOWN = 4
+
+CO_PURCHASE_WEIGHT = 0.7
+CONTENT_WEIGHT = 0.3
+
+# Columns the content vocabulary is hashed into.
+DIMENSIONS = 256
+
+# Relative weight of each field in the content vectors.
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+# Only the first lines of larger orders are paired, so that one bulk order
+# cannot relate everything in it.
+MAX_BASKET = 50
+
+# Scores held in memory at once: rows per chunk x catalog size.
+CHUNK_CELLS = 1 << 22
+
+
+def related_products(product, limit=SHOWN):
+    """Up to ``limit`` available products to show next to ``product``."""
+    available = Product.objects.for_listing()
+    related = list(available.filter(neighbor_of__product=product).order_by('neighbor_of__rank')[:limit])
+    if not related:
+        related = list(available.filter(category_id=product.category_id).exclude(pk=product.pk)[:limit])
+    return related
+
+
+def content_vectors(np, documents):
+    """L2-normalised, hashed TF-IDF rows for ``documents`` (store.search.SearchDocument)."""
+    rows, columns, weights = [], [], []
+    for row, doc in enumerate(documents):
+        for text, weight in ((doc.name, NAME_WEIGHT), (doc.category, CATEGORY_WEIGHT),
+                             (doc.description, DESCRIPTION_WEIGHT)):
+            for token in search.tokenize(text):
+                rows.append(row)
+                columns.append(zlib.crc32(token.encode()) % DIMENSIONS)
+                weights.append(weight)
+    matrix = np.zeros((len(documents), DIMENSIONS), dtype=np.float32)
+    np.add.at(matrix, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)),
+              np.array(weights, dtype=np.float32))
+    frequency = np.count_nonzero(matrix, axis=0)
+    matrix = np.log1p(matrix) * (np.log((1 + len(documents)) / (1 + frequency)) + 1).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def co_purchases(np, ids):
+    """
+    ``(a, b, score)`` arrays for every ordered pair of products bought in
+    the same order, ``a`` and ``b`` being positions in the sorted ``ids``.
+    Sorted by ``a``.
+    """
+    empty = np.zeros(0, dtype=np.intp)
+    items = np.fromiter(
+        (value for row in OrderItem.objects.values_list('order_id', 'product_id').iterator(chunk_size=10000)
+         for value in row),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    if not len(items):
+        return empty, empty, np.zeros(0, dtype=np.float32)
+
+    # Keep the products still in the catalog, each once per order.
+    positions = np.searchsorted(ids, items[:, 1]).clip(max=len(ids) - 1)
+    known = ids[positions] == items[:, 1]
+    items = np.unique(np.column_stack([items[known, 0], positions[known]]), axis=0)
+    if not len(items):
+        return empty, empty, np.zeros(0, dtype=np.float32)
+
+    def baskets(orders):
+        starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+        return starts, np.diff(np.r_[starts, len(orders)])
+
+    starts, sizes = baskets(items[:, 0])
+    items = items[np.arange(len(items)) - np.repeat(starts, sizes) < MAX_BASKET]
+    starts, sizes = baskets(items[:, 0])
+    products = items[:, 1]
+    bought = np.bincount(products, minlength=len(ids))
+
+    # Every line of a basket against every line of the same basket.
+    basket = np.repeat(np.arange(len(starts)), sizes)
+    repeats = sizes[basket]
+    first = np.repeat(np.arange(len(items)), repeats)
+    offset = np.arange(len(first)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    second = starts[basket[first]] + offset
+    a, b = products[first], products[second]
+    keep = a != b
+    pairs, together = np.unique(a[keep] * len(ids) + b[keep], return_counts=True)
+    a, b = pairs // len(ids), pairs % len(ids)
+    return a, b, (together / np.sqrt(bought[a] * bought[b])).astype(np.float32)
+
+
+def neighbors_of(np, content, purchases, neighbors):
+    """``(product, neighbor, rank, score)`` position arrays of the best ``neighbors`` of every row."""
+    count = len(content)
+    a, b, bought = purchases
+    k = min(neighbors, count - 1)
+    chunk = max(1, CHUNK_CELLS // count)
+    results = []
+    for start in range(0, count, chunk):
+        end = min(start + chunk, count)
+        scores = CONTENT_WEIGHT * (content[start:end] @ content.T)
+        low, high = np.searchsorted(a, [start, end])
+        scores[a[low:high] - start, b[low:high]] += CO_PURCHASE_WEIGHT * bought[low:high]
+        rows = np.arange(end - start)
+        scores[rows, rows + start] = -np.inf
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        ranks = np.broadcast_to(np.arange(1, k + 1), top.shape)
+        keep = top_scores > 0
+        results.append((
+            np.broadcast_to(rows[:, None] + start, top.shape)[keep], top[keep], ranks[keep], top_scores[keep],
+        ))
+    return [np.concatenate(column) for column in zip(*results)]
+
+
+def build(neighbors=NEIGHBORS, batch_size=2000):
+    """Recompute every product's neighbors; return the number of products that have some."""
+    import numpy as np
+
+    documents = [
+        search.document_for(product)
+        for product in Product.objects.filter(available=True).select_related('category')
+        .only('id', 'name', 'description', 'category__name').order_by('pk').iterator(chunk_size=batch_size)
+    ]
+    ids = np.array([doc.product_id for doc in documents], dtype=np.int64)
+    rows = []
+    if len(ids) > 1:
+        product, neighbor, rank, score = neighbors_of(
+            np, content_vectors(np, documents), co_purchases(np, ids), neighbors)
+        rows = zip(ids[product].tolist(), ids[neighbor].tolist(), rank.tolist(), score.tolist())
+
+    with transaction.atomic():
+        ProductNeighbor.objects.all().delete()
+        created = set()
+        batch = []
+        for product_id, neighbor_id, position, value in rows:
+            batch.append(ProductNeighbor(product_id=product_id, neighbor_id=neighbor_id, rank=position, score=value))
+            created.add(product_id)
+            if len(batch) >= batch_size:
+                ProductNeighbor.objects.bulk_create(batch)
+                batch = []
+        ProductNeighbor.objects.bulk_create(batch)
+        transaction.on_commit(lambda: caching.invalidate(caching.RECOMMENDATIONS))
+    return len(created)
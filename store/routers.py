@@ -0,0 +1,154 @@
+# store/routers.py
+"""
+Read-replica routing.
+
+With ``DB_REPLICA_ALIASES`` set, ``ReplicaRouter`` sends reads of the catalog
+and order history (``REPLICA_MODELS``) made while serving a request to a
+random replica. Writes and all other reads go to ``default``.
+
+Replicas lag behind the primary, so anything a customer has just changed is
+read back from the primary:
+
+* ``ReplicaMiddleware`` notices when a request writes and keeps that session
+  on the primary for ``REPLICA_STICKY_SECONDS``;
+* views that must always see the latest data (cart, checkout, order detail)
+  are wrapped in ``use_primary()``;
+* reads inside a transaction on the primary, and reads through an object
+  loaded from one database, stay on that database.
+
+Code running outside a request (tasks, management commands) always uses the
+primary.
+"""
+import contextvars
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_MODELS = {
+    'store.category',
+    'store.product',
+    'store.productsearchterm',
+    'store.order',
+    'store.orderitem',
+    'store.ordertracking',
+}
+
+SESSION_KEY = '_primary_until'
+
+
+class RequestState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('store_db_routing', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DB_REPLICA_ALIASES', [])
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside this block (or decorated view)."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    pinned, state.pinned = state.pinned, True
+    try:
+        yield
+    finally:
+        state.pinned = pinned
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        aliases = replicas()
+        if state is None or state.pinned or not aliases or model._meta.label_lower not in REPLICA_MODELS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # e.g. select_for_update() in checkout
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema by replication.
+        return db not in replicas()
+
+
+class ReplicaMiddleware:
+    """Goes after ``SessionMiddleware``; pins sessions that wrote recently to the primary."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        session = getattr(request, 'session', None)
+        until = session.get(SESSION_KEY, 0) if session is not None else 0
+        state = RequestState(pinned=until > time.time())
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and session is not None and replicas():
+            session[SESSION_KEY] = sticky_until()
+        return response
+
+    async def __acall__(self, request):
+        # The state is shared with the sync_to_async threads the view's
+        # queries run in, which get a copy of this context.
+        session = getattr(request, 'session', None)
+        until = await session.aget(SESSION_KEY, 0) if session is not None else 0
+        state = RequestState(pinned=until > time.time())
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and session is not None and replicas():
+            await session.aset(SESSION_KEY, sticky_until())
+        return response
+
+
+def sticky_until():
+    return time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 15)
+
+
+def copy_sqlite(source, target):
+    """Copy the SQLite database file ``source`` into ``target`` with the online backup API."""
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
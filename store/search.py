@@ -0,0 +1,298 @@
+# store/search.py
+"""
+Product search index.
+
+Products are indexed by name, description and category whenever they are
+saved or deleted (see ``store.signals``). Queries return product ids ranked
+by relevance and capped at ``SEARCH_MAX_RESULTS`` so a search costs the same
+whatever the size of the catalog.
+
+Three backends are available, picked by the ``SEARCH_BACKEND`` setting:
+
+* ``sqlite``   - an FTS5 virtual table ranked with bm25()
+* ``postgres`` - a tsvector column with a GIN index ranked with ts_rank_cd()
+* ``python``   - a portable inverted index stored in ``ProductSearchTerm``
+
+``auto`` (the default) picks the native backend for the database vendor and
+falls back to ``python`` when it is not available.
+"""
+import re
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+
+from .models import Product, ProductSearchTerm
+
+FTS_TABLE = 'store_product_fts'
+PG_TABLE = 'store_product_search'
+
+# Relative weight of each field when ranking results.
+NAME_WEIGHT = 10
+CATEGORY_WEIGHT = 4
+DESCRIPTION_WEIGHT = 1
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_fts_databases = set()
+
+SearchDocument = namedtuple('SearchDocument', ['product_id', 'name', 'description', 'category'])
+
+
+def read_connection():
+    """The connection searches read from: a replica while serving a request (see store.routers)."""
+    return connections[router.db_for_read(Product)]
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+def document_for(product):
+    category = product.category
+    return SearchDocument(
+        product_id=product.pk,
+        name=product.name,
+        description=product.description,
+        category=f'{category.get_display_name()} {category.name}',
+    )
+
+
+class BaseSearchBackend:
+    name = None
+
+    def is_available(self):
+        return True
+
+    def index(self, documents):
+        raise NotImplementedError
+
+    def remove(self, product_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, query, limit):
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    name = 'sqlite'
+
+    def is_available(self):
+        if connection.vendor != 'sqlite':
+            return False
+        # Only a positive answer is remembered: the table may still be created
+        # by a later migration in this process.
+        if connection.settings_dict['NAME'] in _fts_databases:
+            return True
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            if cursor.fetchone() is None:
+                return False
+        _fts_databases.add(connection.settings_dict['NAME'])
+        return True
+
+    def index(self, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        self.remove([doc.product_id for doc in documents])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)',
+                [(doc.product_id, doc.name, doc.description, doc.category) for doc in documents],
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Quote every token so user input can never be parsed as FTS syntax,
+        # and prefix-match the last one so results follow the user's typing.
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        with read_connection().cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, %s, %s, %s) LIMIT %s',
+                [' '.join(terms), NAME_WEIGHT, DESCRIPTION_WEIGHT, CATEGORY_WEIGHT, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    name = 'postgres'
+    config = 'english'
+
+    def is_available(self):
+        return connection.vendor == 'postgresql'
+
+    def index(self, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {PG_TABLE} (product_id, document) VALUES ('
+                f'%s, setweight(to_tsvector(%s, %s), \'A\') || '
+                f'setweight(to_tsvector(%s, %s), \'B\') || '
+                f'setweight(to_tsvector(%s, %s), \'C\')) '
+                f'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                [
+                    (doc.product_id, self.config, doc.name, self.config, doc.category,
+                     self.config, doc.description)
+                    for doc in documents
+                ],
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {PG_TABLE} WHERE product_id = ANY(%s)', [list(product_ids)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {PG_TABLE}')
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        with read_connection().cursor() as cursor:
+            cursor.execute(
+                f'SELECT product_id FROM {PG_TABLE} '
+                f'WHERE document @@ to_tsquery(%s, %s) '
+                f'ORDER BY ts_rank_cd(document, to_tsquery(%s, %s)) DESC LIMIT %s',
+                [self.config, tsquery, self.config, tsquery, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PythonSearchBackend(BaseSearchBackend):
+    """Inverted index kept in an ordinary table, for any database."""
+    name = 'python'
+
+    # Shortest last token that is expanded as a prefix for the last token of a query.
+    min_prefix_length = 2
+
+    def index(self, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        rows = []
+        for doc in documents:
+            weights = Counter()
+            for token in tokenize(doc.name):
+                weights[token] += NAME_WEIGHT
+            for token in tokenize(doc.category):
+                weights[token] += CATEGORY_WEIGHT
+            for token in tokenize(doc.description):
+                weights[token] += DESCRIPTION_WEIGHT
+            rows.extend(
+                ProductSearchTerm(product_id=doc.product_id, term=term[:50], weight=weight)
+                for term, weight in weights.items()
+            )
+        with transaction.atomic():
+            self.remove([doc.product_id for doc in documents])
+            ProductSearchTerm.objects.bulk_create(rows, batch_size=500)
+
+    def remove(self, product_ids):
+        ProductSearchTerm.objects.filter(product_id__in=list(product_ids)).delete()
+
+    def clear(self):
+        ProductSearchTerm.objects.all().delete()
+
+    def search(self, query, limit):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        *exact, last = tokens
+        if any(token.startswith(last) for token in exact):
+            # Whatever matches that earlier token matches the prefix too.
+            tokens, condition = exact, Q(term__in=exact)
+        elif len(last) >= self.min_prefix_length:
+            # A range instead of LIKE 'x%' so every database can use the term index.
+            condition = Q(term__gte=last, term__lt=last[:-1] + chr(ord(last[-1]) + 1)) | Q(term__in=exact)
+        else:
+            condition = Q(term=last) | Q(term__in=exact)
+
+        # Every token has to match, so count the query tokens each product's
+        # terms stand for: a prefix can match several terms but is one token.
+        # Ties are broken by the summed field weights.
+        token = Value(last)
+        if exact:
+            token = Case(When(term__in=exact, then=F('term')), default=token, output_field=CharField())
+        return list(
+            ProductSearchTerm.objects.filter(condition)
+            .values('product_id')
+            .annotate(matched=Count(token, distinct=True), score=Sum('weight'))
+            .filter(matched__gte=len(tokens))
+            .order_by('-score', 'product_id')
+            .values_list('product_id', flat=True)[:limit]
+        )
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (SQLiteFTSBackend, PostgresSearchBackend, PythonSearchBackend)
+}
+
+
+def get_backend():
+    name = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if name != 'auto':
+        return BACKENDS[name]()
+    for candidate in (SQLiteFTSBackend(), PostgresSearchBackend()):
+        if candidate.is_available():
+            return candidate
+    return PythonSearchBackend()
+
+
+def max_results():
+    return getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+
+
+def search(query, limit=None):
+    """Return up to ``limit`` product ids matching ``query``, best first."""
+    return get_backend().search(query, limit or max_results())
+
+
+def index_products(products):
+    get_backend().index(document_for(product) for product in products)
+
+
+def remove_products(product_ids):
+    get_backend().remove(product_ids)
+
+
+def rebuild(batch_size=1000):
+    backend = get_backend()
+    queryset = Product.objects.select_related('category').order_by('pk')
+    total = 0
+    with transaction.atomic():
+        backend.clear()
+        batch = []
+        for product in queryset.iterator(chunk_size=batch_size):
+            batch.append(document_for(product))
+            if len(batch) >= batch_size:
+                backend.index(batch)
+                total += len(batch)
+                batch = []
+        backend.index(batch)
+        total += len(batch)
+    return total
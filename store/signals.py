@@ -0,0 +1,133 @@
+# store/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, facets, metrics, search
+from .models import Category, Order, Product
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    products = instance.products.select_related('category')
+    transaction.on_commit(lambda: search.index_products(products))
+
+
+def invalidate_on_commit(*namespaces):
+    # After commit, so that no request can cache the old rows under the new version.
+    namespaces = set(namespaces)
+    transaction.on_commit(lambda: caching.invalidate(*namespaces))
+
+
+@receiver(post_init, sender=Product)
+def remember_cached_state(sender, instance, **kwargs):
+    # Read from __dict__ so that deferred fields are never loaded here.
+    instance._cache_state = (instance.__dict__.get('slug'), instance.__dict__.get('category_id'))
+
+
+def product_namespaces(instance):
+    old_slug, old_category_id = getattr(instance, '_cache_state', (None, None))
+    namespaces = [
+        caching.CATALOG,
+        caching.product_namespace(instance.slug),
+        caching.category_namespace(instance.category_id),
+    ]
+    if old_slug:
+        namespaces.append(caching.product_namespace(old_slug))
+    if old_category_id:
+        namespaces.append(caching.category_namespace(old_category_id))
+    return namespaces
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    invalidate_on_commit(*product_namespaces(instance))
+    instance._cache_state = (instance.slug, instance.category_id)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product(sender, instance, **kwargs):
+    invalidate_on_commit(*product_namespaces(instance))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    namespaces = [caching.CATALOG, caching.category_namespace(instance.pk)]
+    if kwargs.get('created') is False:
+        # Product pages show the name of their category.
+        namespaces.extend(
+            caching.product_namespace(slug)
+            for slug in instance.products.values_list('slug', flat=True)
+        )
+    invalidate_on_commit(*namespaces)
+
+
+@receiver(post_init, sender=Product)
+def remember_facet_state(sender, instance, **kwargs):
+    instance._facet_state = facets.state_of(instance)
+
+
+@receiver(pre_save, sender=Product)
+def load_facet_state(sender, instance, raw=False, **kwargs):
+    if instance._state.adding:
+        instance._facet_state = None
+    elif instance._facet_state is None and not raw:
+        # Loaded with deferred fields: read where the row is counted now.
+        instance._facet_state = facets.stored_state(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def record_facets(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    state = facets.state_of(instance) or facets.stored_state(instance.pk)
+    facets.record(instance._facet_state, state)
+    instance._facet_state = state
+
+
+@receiver(post_delete, sender=Product)
+def remove_facets(sender, instance, **kwargs):
+    facets.record(instance._facet_state or facets.state_of(instance), None)
+
+
+@receiver(post_init, sender=Order)
+def remember_sales_state(sender, instance, **kwargs):
+    instance._sales_state = metrics.state_of(instance)
+
+
+@receiver(pre_save, sender=Order)
+def load_sales_state(sender, instance, raw=False, **kwargs):
+    if instance._state.adding:
+        instance._sales_state = None
+    elif instance._sales_state is None and not raw:
+        # Loaded with deferred fields: read what the row counts for now.
+        instance._sales_state = metrics.stored_state(instance.pk)
+
+
+@receiver(post_save, sender=Order)
+def record_sales(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    state = metrics.state_of(instance) or metrics.stored_state(instance.pk)
+    metrics.record(instance._sales_state, state)
+    instance._sales_state = state
+
+
+@receiver(post_delete, sender=Order)
+def remove_sales(sender, instance, **kwargs):
+    metrics.record(instance._sales_state or metrics.state_of(instance), None)
@@ -0,0 +1,85 @@
+# store/startup.py
+"""
+Cold start of the WSGI entry point.
+
+On Vercel every new function instance imports ``ecommerce/wsgi.py`` and then
+serves its first request, so whatever runs at import time or only on the
+first request is paid again on every cold start. To keep that short:
+
+* ``ADMIN_ENABLED = False`` leaves out ``django.contrib.admin`` and the
+  ``admin`` modules it discovers (the staff dashboard does not use them);
+* requests and urllib3 (``store.payments``) and Pillow (``store.images``)
+  are imported when a gateway is first called or a derivative first built;
+* with ``WARM_ON_STARTUP``, the WSGI module calls ``warm()`` once the
+  application is loaded. It imports the URLconf, views and template tag
+  libraries and compiles ``WARM_TEMPLATES`` into the cached template loader,
+  so the first request does not have to. That only pays off where instances
+  are initialised before traffic reaches them (pre-warmed or provisioned
+  instances): on an on-demand cold start the same work still happens before
+  the first response, plus the templates that request did not need.
+
+``manage.py profile_startup`` measures the result.
+
+``compile_templates()`` (``manage.py compile_templates``, a deploy step)
+compiles every project template and the templates they extend and include,
+so syntax errors and missing templates fail the deploy rather than a page.
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.loader import get_template
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+
+def warm(templates=None):
+    """Load the URLconf and views and compile ``templates`` (default: ``WARM_TEMPLATES``)."""
+    # Importing the URLconf imports the views; reversing builds the lookup
+    # tables {% url %} uses.
+    reverse('store:home')
+    if templates is None:
+        templates = getattr(settings, 'WARM_TEMPLATES', [])
+    for name in templates:
+        try:
+            get_template(name)
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            logger.exception('Could not compile template %s', name)
+
+
+def template_names(engine):
+    """Names of the templates in the project's template directories, not those of installed packages."""
+    names = set()
+    directories = [d for loader in engine.template_loaders if hasattr(loader, 'get_dirs') for d in loader.get_dirs()]
+    for directory in directories:
+        if {'site-packages', 'dist-packages'} & set(os.path.realpath(directory).split(os.sep)):
+            continue
+        for root, _, files in os.walk(directory):
+            for file in files:
+                names.add(os.path.relpath(os.path.join(root, file), directory).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def compile_templates(engine=None):
+    """
+    Compile every project template, then load the templates each one extends
+    or includes by a literal name. Return ``(names, errors)``, ``errors``
+    being ``(name, message)`` pairs.
+    """
+    engine = engine or engines['django'].engine
+    names, errors = template_names(engine), []
+    for name in names:
+        try:
+            template = engine.get_template(name)
+            for node in template.nodelist.get_nodes_by_type((ExtendsNode, IncludeNode)):
+                expression = node.parent_name if isinstance(node, ExtendsNode) else node.template
+                if isinstance(expression.var, str) and not expression.filters:
+                    engine.get_template(expression.var)
+        except TemplateDoesNotExist as e:
+            errors.append((name, f'missing template {e}'))
+        except TemplateSyntaxError as e:
+            errors.append((name, str(e)))
+    return names, errors
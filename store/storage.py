@@ -0,0 +1,78 @@
+# store/storage.py
+"""
+Static files storage for ``collectstatic``.
+
+``CompressedManifestStaticFilesStorage`` copies every file under a
+content-hashed name (``css/site.3f2a1b9c8d7e.css``) listed in
+``staticfiles.json``, as ``ManifestStaticFilesStorage`` does. It then writes
+gzip and, with the ``brotli`` package installed, brotli copies of text
+assets next to them (``site.3f2a1b9c8d7e.css.gz``, ``.br``). ``store.assets``
+serves the smallest copy the browser accepts, so nothing is compressed per
+request.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Images and fonts like woff2 are compressed already.
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot'}
+
+# Smaller files are not worth a second request-time lookup.
+MIN_SIZE = 256
+
+# (Content-Encoding, file suffix), most preferred first
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _encode(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11) if brotli else None
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress(path):
+    """Write the compressed copies of the file at ``path`` that are smaller than it; return their paths."""
+    written = []
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE or os.path.getsize(path) < MIN_SIZE:
+        return written
+    with open(path, 'rb') as f:
+        data = f.read()
+    for encoding, suffix in ENCODINGS:
+        encoded = _encode(encoding, data)
+        target = path + suffix
+        if encoded is None or len(encoded) >= len(data) * 0.95:
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(f'{target}.tmp', 'wb') as f:
+            f.write(encoded)
+        os.replace(f'{target}.tmp', target)
+        written.append(target)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files) | set(self.hashed_files.values()):
+            if self.exists(name):
+                compress(self.path(name))
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # collectstatic has not run (development, tests): use the plain name.
+            return name
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected (a template refers to a file that is not in the
+            # repository): link the plain name, a 404, instead of failing the page.
+            return name
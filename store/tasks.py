@@ -0,0 +1,42 @@
+# store/tasks.py
+"""Background tasks; see store.queue for how they are queued and run."""
+from django.conf import settings
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from . import payments
+from .models import Order, OrderTracking, Payment
+from .queue import task
+
+
+def _send(order, template, context):
+    if not order.user.email:
+        return
+    context = {'order': order, 'user': order.user, **context}
+    subject = render_to_string(f'store/emails/{template}_subject.txt', context).strip()
+    body = render_to_string(f'store/emails/{template}.txt', context)
+    send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [order.user.email])
+
+
+@task()
+def send_order_confirmation(order_id):
+    order = (
+        Order.objects.select_related('user', 'shipping_address')
+        .prefetch_related('items__product')
+        .get(pk=order_id)
+    )
+    _send(order, 'order_confirmation', {'items': order.items.all()})
+
+
+@task()
+def send_status_update(tracking_id):
+    tracking = OrderTracking.objects.select_related('order__user').get(pk=tracking_id)
+    _send(tracking.order, 'status_update', {'tracking': tracking})
+
+
+@task(max_attempts=8)
+def verify_payment(payment_id):
+    # PaymentError propagates, so gateway outages are retried with backoff.
+    payment = Payment.objects.select_related('order').get(pk=payment_id)
+    if payment.provider and payment.status == payments.PENDING:
+        payments.verify(payment)
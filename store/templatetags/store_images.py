@@ -0,0 +1,38 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from store import images
+
+register = template.Library()
+
+
+def _srcset(entries):
+    return ', '.join(f"{default_storage.url(entry['path'])} {entry['width']}w" for entry in entries)
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', size='card', loading='lazy', **attrs):
+    """
+    Render ``image`` (an ImageField value) as a ``<picture>`` offering WebP and
+    JPEG derivatives at every width, so the browser downloads the smallest
+    file that fills ``sizes``. ``size`` picks the fallback ``src``. Any other
+    keyword becomes an attribute of the ``<img>``, e.g. ``class`` or ``alt``.
+    """
+    if not image:
+        return ''
+    attrs = {'loading': loading, 'decoding': 'async', **attrs}
+
+    manifest = images.manifest(image.name)
+    if not manifest:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    jpeg = manifest['jpeg']
+    fallback = next((entry for entry in jpeg if entry['size'] == size), jpeg[-1])
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        _srcset(manifest['webp']), sizes,
+        default_storage.url(fallback['path']), _srcset(jpeg), sizes, flatatt(attrs),
+    )
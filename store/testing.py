@@ -0,0 +1,267 @@
+# store/testing.py
+"""
+Helpers shared by the test suite and the benchmarks.
+
+``seed_store`` fills the database with a synthetic catalog, a customer with a
+cart and order history, and a staff user. ``QueryBudgetMixin`` asserts that a
+view runs at most a fixed number of queries; run the same budgets against
+two seed sizes to catch queries that grow with the data (N+1).
+``FakeGatewayServer`` is a local HTTP server answering the Stripe and
+Paystack verification endpoints that store.payments calls.
+"""
+import json
+import re
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import facets, recommendations
+from .models import Address, Cart, Category, Order, OrderItem, OrderTracking, Payment, Product, UserProfile
+
+PASSWORD = 'secret-password'
+
+
+def seed_store(rows, image='products/rack.jpeg'):
+    """Create ``rows`` products, cart items and orders; return the main objects."""
+    categories = Category.objects.bulk_create(
+        Category(name=name, slug=name.replace('_', '-'))
+        for name, _ in Category.CATEGORY_CHOICES
+    )
+    Product.objects.bulk_create(
+        (
+            Product(
+                category=categories[i % len(categories)],
+                name=f'Product {i}',
+                slug=f'product-{i}',
+                description=f'Synthetic product number {i}',
+                price=Decimal(10 + i % 500),
+                old_price=Decimal(20 + i % 500) if i % 3 == 0 else None,
+                stock=100,
+                image=image,
+                image2=image if i % 2 == 0 else None,
+            )
+            for i in range(rows)
+        ),
+        batch_size=500,
+    )
+    products = list(Product.objects.order_by('pk'))
+    # bulk_create bypasses the signals that keep the facet counts.
+    facets.rebuild()
+
+    customer = User.objects.create_user('customer', password=PASSWORD)
+    staff = User.objects.create_user('staff', password=PASSWORD, is_staff=True)
+    UserProfile.objects.create(user=customer)
+    address = Address.objects.create(
+        user=customer, full_name='Ada Customer', phone_number='08000000000',
+        address_line1='1 Market Road', city='Lagos', state='Lagos',
+        postal_code='100001', is_default=True,
+    )
+
+    Cart.objects.bulk_create(
+        (Cart(user=customer, product=product, quantity=1) for product in products),
+        batch_size=500,
+    )
+
+    orders = Order.objects.bulk_create(
+        (
+            Order(
+                user=customer,
+                order_number=f'ORD-SEED-{i:07d}',
+                delivery_number=f'DEL-SEED-{i:07d}',
+                status=Order.STATUS_CHOICES[i % len(Order.STATUS_CHOICES)][0],
+                payment_method='card',
+                payment_status=i % 2 == 0,
+                total_amount=Decimal(10 + i % 500),
+                shipping_address=address,
+            )
+            for i in range(rows)
+        ),
+        batch_size=500,
+    )
+    order = Order.objects.order_by('pk').first()
+    OrderItem.objects.bulk_create(
+        (OrderItem(order=order, product=product, quantity=1, price=product.price) for product in products),
+        batch_size=500,
+    )
+    OrderTracking.objects.bulk_create(
+        OrderTracking(order=order, status=status, description='Seeded', updated_by=staff)
+        for status, _ in Order.STATUS_CHOICES
+    )
+    Payment.objects.create(order=order, amount=order.total_amount, payment_method='card')
+    recommendations.build()
+
+    return {
+        'categories': categories,
+        'products': products,
+        'customer': customer,
+        'staff': staff,
+        'address': address,
+        'orders': orders,
+        'order': order,
+    }
+
+
+class QueryBudgetMixin:
+    """
+    Test case mixin asserting how many queries a view may run.
+
+    Subclasses set ``seed_rows`` and ``budgets``, a list of
+    ``(user, url name, url kwargs, max queries)`` tuples; url kwargs may be a
+    callable taking the seeded objects. ``user`` is ``None``, ``'customer'``
+    or ``'staff'``.
+    """
+    seed_rows = 10
+    budgets = []
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.seeded = seed_store(cls.seed_rows)
+
+    def setUp(self):
+        super().setUp()
+        # Budgets are for cold caches.
+        cache.clear()
+
+    def count_queries(self, url, user=None):
+        if user:
+            self.client.force_login(self.seeded[user])
+            # Let the session pick up per-user state such as the cart summary.
+            self.client.get(url)
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries), queries
+
+    def assertQueryBudget(self, url, budget, user=None):
+        count, queries = self.count_queries(url, user)
+        if count > budget:
+            sql = '\n'.join(f'{i}. {q["sql"]}' for i, q in enumerate(queries, start=1))
+            self.fail(f'{url} ran {count} queries, budget is {budget}:\n{sql}')
+
+    def test_query_budgets(self):
+        for user, name, kwargs, budget in self.budgets:
+            if callable(kwargs):
+                kwargs = kwargs(self.seeded)
+            with self.subTest(view=name, user=user):
+                self.assertQueryBudget(reverse(name, kwargs=kwargs), budget, user)
+                self.client.logout()
+
+
+class FakeGatewayServer:
+    """
+    A local stand-in for the Stripe and Paystack APIs::
+
+        with FakeGatewayServer() as gateway, override_settings(**gateway.settings()):
+            gateway.add_stripe_intent('ORD-20260101-0001', Decimal('25.00'))
+            payments.reconcile()
+
+    ``requests`` counts the requests served and ``connections`` the TCP
+    connections they came over, so tests can check that clients reuse
+    connections. ``fail_next`` answers that many requests with HTTP 503.
+    """
+    secret = 'sk_test_fake'
+
+    def __init__(self):
+        self.stripe_intents = {}
+        self.paystack_transactions = {}
+        self.requests = 0
+        self.connections = set()
+        self.fail_next = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def settings(self):
+        return {
+            'STRIPE_API_BASE': self.url,
+            'STRIPE_SECRET_KEY': self.secret,
+            'PAYSTACK_API_BASE': self.url,
+            'PAYSTACK_SECRET_KEY': self.secret,
+        }
+
+    def add_stripe_intent(self, order_number, amount, status='succeeded', intent_id=None):
+        intent_id = intent_id or f'pi_{len(self.stripe_intents) + 1:08d}'
+        self.stripe_intents[intent_id] = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'status': status,
+            'amount': int(Decimal(amount) * 100),
+            'amount_received': int(Decimal(amount) * 100) if status == 'succeeded' else 0,
+            'metadata': {'order_number': order_number},
+        }
+        return intent_id
+
+    def add_paystack_transaction(self, reference, amount, status='success'):
+        self.paystack_transactions[reference] = {
+            'id': len(self.paystack_transactions) + 1,
+            'reference': reference,
+            'status': status,
+            'amount': int(Decimal(amount) * 100),
+        }
+
+    def respond(self, path, query, headers):
+        if headers.get('Authorization') != f'Bearer {self.secret}':
+            return 401, {'error': {'message': 'Invalid API key'}}
+        with self.lock:
+            if self.fail_next:
+                self.fail_next -= 1
+                return 503, {'error': {'message': 'Try again'}}
+
+        if path == '/v1/payment_intents/search':
+            match = re.search(r"metadata\['order_number'\]:'([^']*)'", query.get('query', [''])[0])
+            number = match.group(1) if match else None
+            found = [i for i in self.stripe_intents.values() if i['metadata'].get('order_number') == number]
+            return 200, {'object': 'search_result', 'data': found}
+        if path.startswith('/v1/payment_intents/'):
+            intent = self.stripe_intents.get(path.rsplit('/', 1)[1])
+            if intent is None:
+                return 404, {'error': {'message': 'No such payment_intent'}}
+            return 200, intent
+        if path.startswith('/transaction/verify/'):
+            transaction = self.paystack_transactions.get(unquote(path.rsplit('/', 1)[1]))
+            if transaction is None:
+                return 400, {'status': False, 'message': 'Transaction reference not found'}
+            return 200, {'status': True, 'message': 'Verification successful', 'data': transaction}
+        return 404, {'error': {'message': 'Not found'}}
+
+    def _handler(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                with gateway.lock:
+                    gateway.requests += 1
+                    gateway.connections.add(self.client_address)
+                status, body = gateway.respond(url.path, parse_qs(url.query), self.headers)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
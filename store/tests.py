@@ -1,3 +1,1372 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.template import Context, Engine, Template
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .checkout import CheckoutError, place_order
+from . import (
+    benchmarks, catalog, facets, images, metrics, order_export, payments, perf, queue, recommendations, routers,
+    search, startup,
+)
+from .forms import CategoryForm
+from .models import (
+    Address, Cart, Category, DailyCounter, DailySales, Order, OrderItem, Payment, Product, SalesTotal, Task,
+)
+from .numbering import next_order_numbers
+from .pagination import ORDERINGS, KeysetPaginator, decode_cursor, encode_cursor
+from .query_plans import problems
+from .testing import FakeGatewayServer, QueryBudgetMixin, seed_store
+
+
+class SearchBackendTestMixin:
+    backend = None
+
+    def setUp(self):
+        self.enterContext(override_settings(SEARCH_BACKEND=self.backend))
+        if not search.get_backend().is_available():
+            self.skipTest(f'the {self.backend} backend needs another database')
+        category = Category.objects.create(name='computing', slug='computing')
+        self.products = {
+            slug: Product.objects.create(category=category, name=name, slug=slug, description=description,
+                                         price=100, image='products/a.jpg')
+            for slug, name, description in [
+                ('red-phone', 'Red phone', 'Android handset'),
+                ('frame', 'Photo frame', 'Holds a phone photo'),
+                ('dress', 'Red dress', 'Cotton'),
+            ]
+        }
+
+    def search(self, query):
+        slugs = {product.pk: slug for slug, product in self.products.items()}
+        return [slugs[pk] for pk in search.search(query)]
+
+    def test_every_token_must_match(self):
+        self.assertEqual(self.search('red phone'), ['red-phone'])
+        # The prefix matches "phone" and "photo" in the frame, but that is one token, not two.
+        self.assertEqual(self.search('red ph'), ['red-phone'])
+        self.assertEqual(self.search('phone ph'), ['red-phone', 'frame'])
+        self.assertEqual(self.search('blue'), [])
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('phone'), ['red-phone', 'frame'])
+        self.assertCountEqual(self.search('pho'), ['frame', 'red-phone'])
+
+    def test_saves_and_deletes_update_the_index(self):
+        dress = self.products['dress']
+        dress.name = 'Blue dress'
+        dress.save()
+        self.assertEqual(self.search('red'), ['red-phone'])
+        self.assertEqual(self.search('blue'), ['dress'])
+        dress.delete()
+        self.assertEqual(self.search('dress'), [])
+
+
+class SQLiteSearchTests(SearchBackendTestMixin, TestCase):
+    backend = 'sqlite'
+
+
+class PostgresSearchTests(SearchBackendTestMixin, TestCase):
+    backend = 'postgres'
+
+
+class PythonSearchTests(SearchBackendTestMixin, TestCase):
+    backend = 'python'
+
+
+class OrderNumberTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='secret')
+
+    def create_order(self):
+        return Order.objects.create(user=self.user, payment_method='card', total_amount=10)
+
+    def test_numbers_increase_without_counting_orders(self):
+        first = self.create_order()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.create_order()
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+        self.assertTrue(first.order_number.endswith('-0001'))
+        self.assertTrue(second.order_number.endswith('-0002'))
+        self.assertEqual(second.delivery_number, second.order_number.replace('ORD-', 'DEL-'))
+
+    @override_settings(ORDER_NUMBER_BLOCK_SIZE=10)
+    def test_block_allocation_reserves_a_range(self):
+        numbers = [next_order_numbers()[0] for _ in range(12)]
+        self.assertEqual(len(set(numbers)), 12)
+        self.assertEqual(DailyCounter.objects.get(name='order').value, 20)
+
+
+class ParallelCheckoutTests(TransactionTestCase):
+    workers = 8
+    orders_per_worker = 10
+
+    def test_parallel_checkouts_get_unique_numbers(self):
+        total = self.workers * self.orders_per_worker
+        category = Category.objects.create(name='computing', slug='computing')
+        product = Product.objects.create(category=category, name='Mouse', slug='mouse', description='', price=10,
+                                         stock=total, image='products/a.jpg')
+        users = [User.objects.create_user(f'buyer{n}', password='secret') for n in range(self.workers)]
+
+        def check_out(user):
+            try:
+                numbers = []
+                for _ in range(self.orders_per_worker):
+                    Cart.objects.create(user=user, product=product, quantity=1)
+                    cart_items = list(Cart.objects.filter(user=user).select_related('product'))
+                    numbers.append(place_order(user, cart_items, 'card', None).order_number)
+                return numbers
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            numbers = [n for batch in pool.map(check_out, users) for n in batch]
+
+        self.assertEqual(len(set(numbers)), total)
+        self.assertEqual(Order.objects.count(), total)
+        self.assertEqual(DailyCounter.objects.get(name='order').value, total)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 0)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.category = Category.objects.create(name='computing', slug='computing')
+
+    def fill_cart(self, size, stock=5):
+        for i in range(size):
+            product = Product.objects.create(
+                category=self.category, name=f'Laptop {i}', slug=f'laptop-{i}',
+                description='Laptop', price=100, stock=stock, image='products/laptop.jpg',
+            )
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+        return list(Cart.objects.filter(user=self.user).select_related('product'))
+
+    def checkout_queries(self, size):
+        cart_items = self.fill_cart(size)
+        with CaptureQueriesContext(connection) as queries:
+            place_order(self.user, cart_items, 'card', None)
+        Product.objects.all().delete()
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        self.checkout_queries(1)  # creates today's order counter
+        self.assertEqual(self.checkout_queries(1), self.checkout_queries(10))
+
+    def test_order_is_written_and_stock_decremented(self):
+        order = place_order(self.user, self.fill_cart(3), 'card', None)
+        self.assertEqual(order.total_amount, 600)
+        self.assertEqual(order.items.count(), 3)
+        self.assertTrue(order.tracking.exists())
+        self.assertEqual(order.payment.amount, 600)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {3})
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        cart_items = self.fill_cart(3)
+        Product.objects.filter(pk=cart_items[-1].product_id).update(stock=1)
+        with self.assertRaises(CheckoutError):
+            place_order(self.user, cart_items, 'card', None)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(sorted(Product.objects.values_list('stock', flat=True)), [1, 5, 5])
+
+
+ran = []
+ran_lock = threading.Lock()
+
+
+@queue.task(name='tests.record', max_attempts=3)
+def record_task(value, fail=False):
+    if fail:
+        raise ValueError('boom')
+    with ran_lock:
+        ran.append(value)
+
+
+class StockRaceTests(TransactionTestCase):
+    buyers = 8
+    stock = 3
+
+    def test_racing_checkouts_sell_only_the_stock_on_hand(self):
+        category = Category.objects.create(name='computing', slug='computing')
+        product = Product.objects.create(category=category, name='Mouse', slug='mouse', description='', price=10,
+                                         stock=self.stock, image='products/a.jpg')
+        carts = []
+        for n in range(self.buyers):
+            user = User.objects.create_user(f'buyer{n}', password='secret')
+            Cart.objects.create(user=user, product=product, quantity=1)
+            carts.append((user, list(Cart.objects.filter(user=user).select_related('product'))))
+        start = threading.Barrier(self.buyers)
+
+        def check_out(cart):
+            user, cart_items = cart
+            start.wait()
+            try:
+                place_order(user, cart_items, 'card', None)
+                return True
+            except CheckoutError:
+                return False
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.buyers) as pool:
+            results = list(pool.map(check_out, carts))
+
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), self.stock)
+        self.assertEqual(Cart.objects.count(), self.buyers - self.stock)
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        ran.clear()
+
+    def test_key_queues_work_once(self):
+        first = queue.enqueue(record_task, key='same', value=1)
+        second = queue.enqueue(record_task, key='same', value=2)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(queue.run_pending(), 1)
+        self.assertEqual(ran, [1])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        t = queue.enqueue(record_task, value=1, fail=True)
+        with self.assertLogs('store.queue', 'WARNING'):
+            self.assertEqual(queue.run_pending(), 1)
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.attempts), (Task.QUEUED, 1))
+        self.assertIn('ValueError: boom', t.last_error)
+
+        with override_settings(TASK_BACKOFF_SECONDS=0), self.assertLogs('store.queue', 'WARNING') as logs:
+            Task.objects.update(run_at=t.created_at)
+            self.assertEqual(queue.run_pending(), 2)
+        self.assertIn('failed for good after 3 attempts', logs.output[-1])
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.attempts), (Task.FAILED, 3))
+
+    def test_expired_leases_are_released(self):
+        t = queue.enqueue(record_task, value=1)
+        self.assertEqual(queue.claim('dead-worker'), [t])
+        self.assertEqual(queue.claim('other'), [])
+        with override_settings(TASK_LEASE_SECONDS=0):
+            self.assertEqual(queue.run_pending('other'), 1)
+        self.assertEqual(ran, [1])
+
+    def test_checkout_and_status_updates_email_the_customer(self):
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'secret')
+        category = Category.objects.create(name='computing', slug='computing')
+        product = Product.objects.create(
+            category=category, name='Laptop', slug='laptop', description='Laptop',
+            price=100, stock=5, image='products/laptop.jpg',
+        )
+        Cart.objects.create(user=user, product=product, quantity=1)
+        order = place_order(user, list(Cart.objects.filter(user=user).select_related('product')), 'card', None)
+        self.assertEqual(mail.outbox, [])
+
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        self.client.post(
+            reverse('store:admin_order_detail', args=[order.pk]),
+            {'status': 'in_transit', 'description': 'On its way', 'location': 'Lagos'},
+        )
+        self.assertEqual(queue.run_pending(), 2)
+        self.assertEqual([m.subject for m in mail.outbox], [
+            f'Order {order.order_number} confirmed',
+            f'Order {order.order_number}: In Transit',
+        ])
+        self.assertIn('1 x Laptop', mail.outbox[0].body)
+        self.assertIn('On its way', mail.outbox[1].body)
+
+
+class WorkerPoolTests(TransactionTestCase):
+    def test_each_task_runs_once_across_threads(self):
+        ran.clear()
+        for i in range(40):
+            queue.enqueue(record_task, value=i)
+        call_command('run_workers', workers=4, once=True, poll=0.01, stdout=StringIO())
+        self.assertEqual(sorted(ran), list(range(40)))
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 40)
+
+
+class PaymentTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.gateway = self.enterContext(FakeGatewayServer())
+        self.enterContext(override_settings(**self.gateway.settings(), STRIPE_WEBHOOK_SECRET='whsec_test'))
+        self.user = User.objects.create_user('buyer', password='secret')
+
+    def create_payment(self, method, amount='25.00'):
+        order = Order.objects.create(user=self.user, payment_method=method, total_amount=amount)
+        return Payment.objects.create(
+            order=order, amount=amount, payment_method=method, provider=payments.provider_for(method),
+        )
+
+
+class PaymentReconcileTests(PaymentTestMixin, TransactionTestCase):
+    def test_reconcile_verifies_pending_payments_with_each_gateway(self):
+        stripe_paid = self.create_payment('card')
+        self.gateway.add_stripe_intent(stripe_paid.order.order_number, '25.00')
+        stripe_unpaid = self.create_payment('card')
+        paystack_paid = self.create_payment('transfer')
+        self.gateway.add_paystack_transaction(paystack_paid.order.order_number, '25.00')
+        paystack_failed = self.create_payment('transfer')
+        self.gateway.add_paystack_transaction(paystack_failed.order.order_number, '25.00', status='failed')
+        underpaid = self.create_payment('transfer')
+        self.gateway.add_paystack_transaction(underpaid.order.order_number, '2.50')
+        cash = self.create_payment('cash_on_delivery')
+
+        with self.assertLogs('store.payments', 'WARNING'):
+            outcomes = payments.reconcile(workers=2)
+        self.assertEqual(outcomes, {'completed': 2, 'failed': 2, 'pending': 1})
+
+        statuses = dict(Payment.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[stripe_paid.pk], 'completed')
+        self.assertEqual(statuses[stripe_unpaid.pk], 'pending')
+        self.assertEqual(statuses[paystack_paid.pk], 'completed')
+        self.assertEqual(statuses[paystack_failed.pk], 'failed')
+        self.assertEqual(statuses[underpaid.pk], 'failed')
+        self.assertEqual(statuses[cash.pk], 'pending')
+        self.assertTrue(Payment.objects.get(pk=stripe_paid.pk).transaction_id.startswith('pi_'))
+        self.assertEqual(
+            set(Order.objects.filter(payment_status=True).values_list('pk', flat=True)),
+            {stripe_paid.order_id, paystack_paid.order_id},
+        )
+        self.assertEqual(metrics.totals()['revenue'], 50)
+
+    def test_requests_reuse_pooled_connections_and_retry_outages(self):
+        for _ in range(12):
+            payment = self.create_payment('transfer')
+            self.gateway.add_paystack_transaction(payment.order.order_number, '25.00')
+        self.gateway.fail_next = 2
+        self.assertEqual(payments.reconcile(workers=3), {'completed': 12})
+        self.assertEqual(self.gateway.requests, 14)
+        self.assertLessEqual(len(self.gateway.connections), 3)
+
+
+class PaymentWebhookTests(PaymentTestMixin, TestCase):
+    def post_paystack(self, payload, secret=FakeGatewayServer.secret):
+        body = json.dumps(payload).encode()
+        signature = hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+        return self.client.post(
+            reverse('store:payment_webhook', args=['paystack']), body,
+            content_type='application/json', headers={'X-Paystack-Signature': signature},
+        )
+
+    def test_webhook_queues_verification_once_and_returns_immediately(self):
+        payment = self.create_payment('transfer')
+        event = {'event': 'charge.success', 'data': {'id': 77, 'reference': payment.order.order_number}}
+        self.assertEqual(self.post_paystack(event).json(), {'queued': True})
+        self.assertEqual(self.post_paystack(event).json(), {'queued': True})
+        self.assertEqual(self.gateway.requests, 0)
+        self.assertEqual(Task.objects.count(), 1)
+
+        self.gateway.add_paystack_transaction(payment.order.order_number, '25.00')
+        self.assertEqual(queue.run_pending(), 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+
+    def test_bad_signatures_are_rejected(self):
+        payment = self.create_payment('transfer')
+        event = {'event': 'charge.success', 'data': {'id': 1, 'reference': payment.order.order_number}}
+        self.assertEqual(self.post_paystack(event, secret='wrong').status_code, 400)
+
+        body = json.dumps({'id': 'evt_1', 'data': {'object': {'id': 'pi_1'}}}).encode()
+        timestamp = int(time.time())
+        signature = hmac.new(b'whsec_test', f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+        url = reverse('store:payment_webhook', args=['stripe'])
+        good = self.client.post(url, body, content_type='application/json',
+                                headers={'Stripe-Signature': f't={timestamp},v1={signature}'})
+        self.assertEqual(good.json(), {'queued': False})
+        bad = self.client.post(url, body, content_type='application/json',
+                               headers={'Stripe-Signature': f't={timestamp},v1={"0" * 64}'})
+        self.assertEqual(bad.status_code, 400)
+        self.assertFalse(Task.objects.exists())
+
+
+class SalesMetricsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='secret')
+
+    def snapshot(self):
+        return (
+            sorted(SalesTotal.objects.filter(orders__gt=0).values_list('status', 'orders', 'paid_orders', 'revenue')),
+            sorted(DailySales.objects.filter(orders__gt=0).values_list('day', 'orders', 'paid_orders', 'revenue')),
+        )
+
+    def test_incremental_updates_match_a_rebuild(self):
+        orders = [
+            Order.objects.create(user=self.user, payment_method='card', total_amount=amount)
+            for amount in ('10.00', '25.50', '7.25')
+        ]
+        orders[0].status = 'delivered'
+        orders[0].payment_status = True
+        orders[0].save()
+        orders[1].payment_status = True
+        orders[1].total_amount = '30.00'
+        orders[1].save()
+        deferred = Order.objects.only('id').get(pk=orders[2].pk)
+        deferred.status = 'cancelled'
+        deferred.save(update_fields=['status'])
+        orders[1].delete()
+
+        incremental = self.snapshot()
+        self.assertEqual(metrics.rebuild(), 2)
+        self.assertEqual(self.snapshot(), incremental)
+
+        totals = metrics.totals()
+        self.assertEqual(totals['orders'], 2)
+        self.assertEqual(totals['by_status']['delivered'], 1)
+        self.assertEqual(totals['by_status']['cancelled'], 1)
+        self.assertEqual(totals['revenue'], 10)
+
+    def test_daily_series_fills_missing_days(self):
+        Order.objects.create(user=self.user, payment_method='card', total_amount=10, payment_status=True)
+        series = metrics.daily_series(7)
+        self.assertEqual(len(series), 7)
+        self.assertEqual([day['orders'] for day in series], [0] * 6 + [1])
+        self.assertEqual(series[-1]['revenue'], 10)
+
+    def test_dashboard_does_not_read_orders_for_totals(self):
+        Order.objects.create(user=self.user, payment_method='card', total_amount=10)
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('store:admin_dashboard'))
+        self.assertEqual(response.context['total_orders'], 1)
+        self.assertEqual(response.context['pending_orders'], 1)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'] and 'store_order' in q['sql']])
+
+
+def jpeg_bytes(width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'teal').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        cache.clear()
+
+    def test_derivatives_are_resized_and_never_enlarged(self):
+        name = default_storage.save('products/wide.jpeg', SimpleUploadedFile('wide.jpeg', jpeg_bytes(800, 400)))
+        manifest = images.generate(name)
+        self.assertEqual([entry['width'] for entry in manifest['webp']], [160, 480, 800])
+        self.assertEqual([entry['width'] for entry in manifest['jpeg']], [160, 480, 800])
+        with default_storage.open(manifest['jpeg'][0]['path']) as f:
+            self.assertEqual(Image.open(f).size, (160, 80))
+
+    def test_tag_renders_srcset_once_derivatives_exist(self):
+        name = default_storage.save('products/tall.jpeg', SimpleUploadedFile('tall.jpeg', jpeg_bytes(600, 900)))
+        template = Template(
+            '{% load store_images %}{% responsive_image image sizes="50px" size="thumb" alt="Rack" %}'
+        )
+        image = Category(image=name).image
+
+        html = template.render(Context({'image': image}))
+        self.assertNotIn('srcset', html)
+        self.assertIn(f'src="{image.url}"', html)
+
+        images.generate(name)
+        html = template.render(Context({'image': image}))
+        self.assertIn('<source type="image/webp" srcset="/media/derivatives/products/tall/thumb-160.webp 160w,', html)
+        self.assertIn('src="/media/derivatives/products/tall/thumb-160.jpg"', html)
+        self.assertIn('sizes="50px"', html)
+        self.assertIn('alt="Rack"', html)
+
+    def test_form_upload_schedules_derivatives(self):
+        form = CategoryForm(
+            {'name': 'computing', 'slug': 'computing'},
+            {'image': SimpleUploadedFile('computing.jpeg', jpeg_bytes(300, 300), 'image/jpeg')},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            category = form.save()
+        images.wait(timeout=10)
+        self.assertEqual([entry['width'] for entry in images.manifest(category.image.name)['jpeg']], [160, 300])
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    seed_rows = 10
+    budgets = [
+        (None, 'store:home', {}, 2),
+        (None, 'store:product_list', {}, 3),
+        (None, 'store:product_list_by_category', {'category_slug': 'computing'}, 4),
+        (None, 'store:product_detail', lambda seeded: {'slug': seeded['products'][0].slug}, 2),
+        ('customer', 'store:cart_view', {}, 3),
+        ('customer', 'store:checkout', {}, 4),
+        ('customer', 'store:order_list', {}, 3),
+        ('customer', 'store:order_detail', lambda seeded: {'order_id': seeded['order'].pk}, 5),
+        ('customer', 'store:profile', {}, 4),
+        ('staff', 'store:admin_dashboard', {}, 7),
+        ('staff', 'store:admin_order_list', {}, 4),
+        ('staff', 'store:admin_order_detail', lambda seeded: {'order_id': seeded['order'].pk}, 5),
+        ('staff', 'store:admin_product_list', {}, 3),
+    ]
+
+
+class LargeQueryBudgetTests(QueryBudgetTests):
+    seed_rows = 1000
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmarks.seed(products=40, customers=2, orders=6, batch_size=15)
+
+    def test_seed(self):
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Order.objects.count(), 6)
+        self.assertEqual(OrderItem.objects.count(), 12)
+        self.assertEqual(Cart.objects.count(), 6)
+        self.assertEqual(metrics.totals()['orders'], 6)
+
+    def test_every_scenario_runs_through_the_client(self):
+        ctx = benchmarks.load_context()
+        results = benchmarks.run_client(benchmarks.SCENARIOS, ctx, iterations=3, warmup=1)
+        for name, summary in results.items():
+            with self.subTest(scenario=name):
+                self.assertEqual(summary['requests'], 3)
+                self.assertEqual(summary['errors'], 0)
+                self.assertLessEqual(summary['p50'], summary['p99'])
+        self.assertEqual(Order.objects.count(), 6 + 4)
+
+    def test_page_templates_render_on_their_own(self):
+        ctx = benchmarks.load_context()
+        results = benchmarks.render_templates(['home', 'product_list', 'product_search', 'add_to_cart'], ctx, 3)
+        self.assertEqual(list(results), ['store/home.html', 'store/product_list.html'])
+        for summary in results.values():
+            self.assertEqual(summary['requests'], 3)
+            self.assertEqual(summary['errors'], 0)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'client:home': {'p95': 10.0, 'rps': 100.0, 'queries': 3.0, 'errors': 0}}
+        current = {'client:home': {'p95': 11.0, 'rps': 70.0, 'queries': 4.0, 'errors': 0}}
+        regressed = {c.metric for c in benchmarks.compare(current, baseline, threshold=0.2) if c.regressed}
+        self.assertEqual(regressed, {'rps', 'queries'})
+
+
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeded = seed_store(5)
+
+    def setUp(self):
+        cache.clear()
+        perf.get_window().clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('store:product_list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries, \d+ duplicated"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'cache;desc="\d+ hits, [1-9]\d* misses"')
+        self.assertRegex(timing, r'total;dur=[\d.]+')
+
+    @override_settings(PERF_SERVER_TIMING=False)
+    def test_server_timing_is_for_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('store:home')))
+        self.client.force_login(self.seeded['staff'])
+        self.assertIn('Server-Timing', self.client.get(reverse('store:home')))
+
+    @override_settings(PERF_SERVER_TIMING=False)
+    async def test_async_views_are_measured(self):
+        await self.async_client.aforce_login(self.seeded['staff'])
+        response = await self.async_client.get(reverse('store:api_cart'))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries')
+
+    def test_fingerprints_group_repeated_queries(self):
+        self.assertEqual(
+            perf.fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s) LIMIT 21'),
+            perf.fingerprint("SELECT * FROM \"t\" WHERE \"id\" IN (%s)  LIMIT 5"),
+        )
+        stats = perf.RequestStats()
+        stats.fingerprints.update([perf.fingerprint('SELECT 1 FROM "t" WHERE "id" = %s')] * 3)
+        self.assertEqual(list(stats.duplicates().values()), [3])
+
+    def test_dashboard(self):
+        self.client.get(reverse('store:home'))
+        self.client.get(reverse('store:home'))
+        url = reverse('store:admin_perf')
+        self.assertRedirects(self.client.get(url), reverse('store:login') + f'?next={url}')
+
+        self.client.force_login(self.seeded['staff'])
+        response = self.client.get(url)
+        rows = {row['view']: row for row in response.context['views']}
+        self.assertEqual(rows['store:home']['requests'], 2)
+        self.assertEqual(sum(bucket['count'] for bucket in rows['store:home']['buckets']), 2)
+
+    def test_sampler_collects_folded_stacks(self):
+        sampler = perf.Sampler(interval=0.001)
+        sampler.start(threading.get_ident())
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        stacks = sampler.stop(threading.get_ident())
+        self.assertTrue(any(stack.endswith('store.tests:test_sampler_collects_folded_stacks') for stack in stacks))
+
+    def test_slow_requests_are_profiled(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(PERF_PROFILE=True, PERF_SLOW_MS=0, PERF_PROFILE_DIR=directory), \
+                mock.patch.object(perf.Sampler, 'stop', return_value=Counter({'a;b': 2})):
+            self.client.get(reverse('store:home'))
+            [name] = perf.recent_profiles()
+            self.client.force_login(self.seeded['staff'])
+            response = self.client.get(reverse('store:admin_perf'), {'profile': name})
+            self.assertEqual(b''.join(response.streaming_content), b'a;b 2\n')
+            self.assertEqual(self.client.get(reverse('store:admin_perf'), {'profile': '../x'}).status_code, 404)
+
+
+class StartupTests(SimpleTestCase):
+    def test_wsgi_import_skips_admin_and_sdk_modules(self):
+        modules = ('requests', 'urllib3', 'PIL', 'django.contrib.admin', 'store.admin', 'store.views')
+        script = f'import sys, ecommerce.wsgi; print(*[m for m in {modules!r} if m in sys.modules])'
+        done = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env=dict(os.environ, ADMIN_ENABLED='False', WARM_ON_STARTUP='True'),
+        )
+        self.assertEqual(done.returncode, 0, done.stderr)
+        # The warm-up loads the views; the rest waits for first use.
+        self.assertEqual(done.stdout.split(), ['store.views'])
+
+    def test_warm_logs_templates_it_cannot_compile(self):
+        with self.assertLogs('store.startup', 'ERROR') as logs:
+            startup.warm(['store/home.html', 'store/missing.html'])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('store/missing.html', logs.output[0])
+
+    def test_parse_importtime(self):
+        rows = benchmarks.parse_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       300 |        300 |     PIL._util\n'
+            'import time:      1200 |       1500 |   PIL\n'
+            'import time:       500 |       2000 | store.images\n'
+        )
+        self.assertEqual(rows[1], benchmarks.Import('PIL', 1200, 1500, 1))
+        self.assertEqual([row.depth for row in rows], [2, 1, 0])
+        self.assertEqual(benchmarks.package_times(rows), Counter({'PIL': 1.5, 'store': 0.5}))
+
+
+class TemplateTests(TestCase):
+    def test_store_templates_compile(self):
+        names, errors = startup.compile_templates()
+        self.assertIn('base.html', names)
+        self.assertIn('store/product_list.html', names)
+        self.assertEqual(errors, [])
+
+    def test_compile_reports_broken_templates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, source in [
+                ('parent.html', '{% block content %}{% endblock %}'),
+                ('ok.html', '{% extends "parent.html" %}'),
+                ('syntax.html', '{% if %}'),
+                ('include.html', '{% include "missing.html" %}'),
+            ]:
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(source)
+            names, errors = startup.compile_templates(Engine(dirs=[directory]))
+        self.assertEqual(names, ['include.html', 'ok.html', 'parent.html', 'syntax.html'])
+        self.assertEqual([name for name, message in errors], ['include.html', 'syntax.html'])
+        self.assertEqual(errors[0][1], 'missing template missing.html')
+
+
+class CatalogQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='computing', slug='computing')
+        for slug, price, old_price, stock in [('a', 100, 150, 1), ('b', Decimal('19.99'), Decimal('29.99'), 1),
+                                              ('c', 100, None, 0), ('d', 100, 100, 1), ('e', 10, 100, 1)]:
+            Product.objects.create(category=category, name=slug, slug=slug, description='', price=price,
+                                   old_price=old_price, stock=stock, image='products/a.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_discount_is_computed_by_the_database(self):
+        products = Product.objects.order_by('slug')
+        self.assertEqual([p.discount_percentage for p in products], [33, 33, 0, 0, 90])
+        self.assertEqual([p.discount_percentage for p in products], [p.get_discount_percentage() for p in products])
+        self.assertContains(self.client.get(reverse('store:product_list')), '-33%', count=2)
+
+    def test_listing_helpers(self):
+        products = Product.objects.for_listing().order_by('slug')
+        self.assertEqual([p.in_stock for p in products], [True, True, False, True, True])
+        self.assertEqual(
+            list(products.discount_between(30, 50).values_list('slug', flat=True)), ['a', 'b'])
+        self.assertEqual(list(products.discount_between(high=0).values_list('slug', flat=True)), ['c', 'd'])
+
+    def test_sort_by_discount_and_filter(self):
+        response = self.client.get(reverse('store:product_list'), {'sort': 'discount'})
+        self.assertEqual([p.slug for p in response.context['products']], ['e', 'b', 'a', 'd', 'c'])
+        self.assertContains(response, 'Out of stock', count=1)
+        response = self.client.get(reverse('store:product_list'), {'sort': 'discount', 'min_discount': 50})
+        self.assertEqual([p.slug for p in response.context['products']], ['e'])
+        response = self.client.get(reverse('store:product_list'), {'min_discount': 'lots'})
+        self.assertEqual(len(response.context['products']), 5)
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.computing = Category.objects.create(name='computing', slug='computing')
+        self.phones = Category.objects.create(name='phones_tablets', slug='phones-tablets')
+        for slug, category, price, old_price, stock in [
+            ('cheap', self.computing, 1000, None, 1),
+            ('mid', self.computing, 30000, 40000, 5),
+            ('dear', self.computing, 150000, 300000, 0),
+            ('phone', self.phones, 8000, 8050, 2),
+        ]:
+            Product.objects.create(category=category, name=slug, slug=slug, description='', price=price,
+                                   old_price=old_price, stock=stock, image='products/a.jpg')
+
+    def test_incremental_updates_match_a_rebuild(self):
+        product = Product.objects.get(slug='cheap')
+        product.price = 25000
+        product.old_price = 50000
+        product.save()
+        deferred = Product.objects.only('id').get(slug='mid')
+        deferred.stock = 0
+        deferred.save(update_fields=['stock'])
+        Product.objects.filter(slug='phone').get().delete()
+        hidden = Product.objects.get(slug='dear')
+        hidden.available = False
+        hidden.save()
+        Cart.objects.create(user=self.user, product=product, quantity=1)
+        place_order(self.user, list(Cart.objects.filter(user=self.user).select_related('product')), 'card', None)
+
+        incremental = facets.stored_cells()
+        self.assertEqual(incremental, {facets.Cell(self.computing.pk, 2, False, 4): 1,
+                                       facets.Cell(self.computing.pk, 2, False, 3): 1})
+        self.assertEqual(facets.rebuild(), 2)
+        self.assertEqual(facets.stored_cells(), incremental)
+
+    def test_counts_leave_each_facet_open(self):
+        selection = facets.Selection(category=self.computing.pk, in_stock=True, min_discount=10)
+        counts = facets.counts(facets.stored_cells(), selection)
+        self.assertEqual(counts['total'], 1)
+        self.assertEqual(counts['category'], {self.computing.pk: 1})
+        self.assertEqual(counts['price_band'], {2: 1})
+        self.assertEqual(counts['in_stock'], 1)
+        self.assertEqual(counts['discount'], {1: 1, 10: 1, 25: 1, 50: 0})
+        # A range off the band limits is counted from the products themselves.
+        selection = facets.Selection(min_discount=20, max_discount=30)
+        self.assertEqual(facets.counts(facets.cells_for(selection), selection)['total'], 1)
+
+    def test_product_list_filters_and_counts(self):
+        url = reverse('store:product_list_by_category', kwargs={'category_slug': 'computing'})
+        response = self.client.get(url, {'price': 2, 'in_stock': '1'})
+        self.assertEqual([p.slug for p in response.context['products']], ['mid'])
+        self.assertEqual(response.context['products'].count, 1)
+        self.assertEqual([(c.slug, n) for c, n in response.context['categories']], [('computing', 1), ('phones-tablets', 0)])
+        self.assertEqual([n for *_, n in response.context['price_bands']], [1, 0, 1, 0, 0])
+        response = self.client.get(reverse('store:product_list'), {'q': 'phone', 'price': 'x'})
+        self.assertEqual(response.context['products'].count, 1)
+        self.assertEqual([n for _, n in response.context['discount_filters']], [0, 0, 0])
+
+    def test_selling_out_moves_the_product(self):
+        self.client.get(reverse('store:product_list'), {'in_stock': '1'})
+        product = Product.objects.get(slug='phone')
+        Cart.objects.create(user=self.user, product=product, quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.user, list(Cart.objects.filter(user=self.user).select_related('product')), 'card', None)
+        response = self.client.get(reverse('store:product_list'), {'in_stock': '1'})
+        self.assertEqual([p.slug for p in response.context['products']], ['mid', 'cheap'])
+        self.assertEqual(response.context['in_stock_count'], 2)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('buyer', password='secret')
+        computing = Category.objects.create(name='computing', slug='computing')
+        phones = Category.objects.create(name='phones_tablets', slug='phones-tablets')
+        self.products = {
+            slug: Product.objects.create(category=category, name=name, slug=slug, description=name, price=100,
+                                         stock=5, image='products/a.jpg')
+            for slug, category, name in [
+                ('laptop', computing, 'Gaming laptop'),
+                ('mouse', computing, 'Wireless mouse'),
+                ('bag', computing, 'Gaming laptop bag'),
+                ('phone', phones, 'Android phone'),
+                ('case', phones, 'Android phone case'),
+            ]
+        }
+        for basket in [['laptop', 'mouse'], ['laptop', 'mouse', 'phone'], ['laptop', 'laptop']]:
+            order = Order.objects.create(user=self.user, payment_method='card', total_amount=100)
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=self.products[slug], quantity=1, price=100) for slug in basket)
+
+    def neighbors(self, slug):
+        return [p.slug for p in recommendations.related_products(self.products[slug])]
+
+    def test_neighbors_mix_co_purchases_and_content(self):
+        self.assertEqual(recommendations.build(neighbors=3), 5)
+        self.assertEqual(self.neighbors('laptop'), ['mouse', 'phone', 'bag'])
+        self.assertEqual(self.neighbors('case')[0], 'phone')
+        self.assertEqual(self.neighbors('bag')[0], 'laptop')
+        with self.assertNumQueries(1):
+            recommendations.related_products(self.products['laptop'])
+
+    def test_products_without_neighbors_fall_back_to_their_category(self):
+        self.assertEqual(self.neighbors('phone'), ['case'])
+        recommendations.build()
+        Product.objects.filter(slug='case').update(available=False)
+        self.assertEqual(self.neighbors('phone')[:2], ['mouse', 'laptop'])
+        response = self.client.get(reverse('store:product_detail', kwargs={'slug': 'laptop'}))
+        self.assertEqual([p.slug for p in response.context['related_products']][:2], ['mouse', 'phone'])
+
+    def test_co_purchases_count_each_order_once(self):
+        import numpy as np
+
+        ids = np.array(sorted(p.pk for p in self.products.values()), dtype=np.int64)
+        a, b, score = recommendations.co_purchases(np, ids)
+        pairs = {(int(ids[x]), int(ids[y])): round(float(s), 3) for x, y, s in zip(a, b, score)}
+        laptop, mouse, phone = (self.products[slug].pk for slug in ('laptop', 'mouse', 'phone'))
+        # laptop is in 3 orders, mouse in 2 and both in 2: 2 / sqrt(3 * 2)
+        self.assertEqual(pairs[laptop, mouse], pairs[mouse, laptop])
+        self.assertEqual(pairs[laptop, mouse], 0.816)
+        self.assertEqual(pairs[mouse, phone], 0.707)
+        self.assertEqual(len(pairs), 6)
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        cache.clear()
+        self.computing = Category.objects.create(name='computing', slug='computing')
+        self.phones = Category.objects.create(name='phones_tablets', slug='phones-tablets')
+        Product.objects.create(category=self.computing, name='Old laptop', slug='laptop', description='Old',
+                               price=90000, stock=1, image='products/a.jpg')
+
+    def run_import(self, fmt, text, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return catalog.import_products(catalog.read_rows(StringIO(text), fmt), **kwargs)
+
+    def test_csv_creates_updates_and_reports_bad_rows(self):
+        image = default_storage.save('products/mouse.jpeg', SimpleUploadedFile('mouse.jpeg', jpeg_bytes(300, 200)))
+        result = self.run_import('csv', (
+            'slug,name,category,description,price,old_price,stock,available,image\n'
+            f'mouse,Wireless mouse,computing,Quiet,5000,6000,10,yes,{image}\n'
+            'laptop,Gaming laptop,phones_tablets,Fast,250000,,0,true,products/a.jpg\n'
+            'broken,Broken,computing,,-1,,1,true,products/a.jpg\n'
+            'stray,Stray,garden,Lost,10,,1,true,products/a.jpg\n'
+        ), chunk_size=2)
+        self.assertEqual(result[:3], (1, 1, 2))
+        self.assertEqual([line for line, _ in result.errors], [4, 5])
+        self.assertIn('price', result.errors[0][1])
+        self.assertIn("unknown category 'garden'", result.errors[1][1])
+        self.assertEqual((result.images, result.image_errors), (1, []))
+        self.assertEqual(images.manifest(image)['jpeg'][-1]['width'], 300)
+
+        mouse, laptop = Product.objects.get(slug='mouse'), Product.objects.get(slug='laptop')
+        self.assertEqual((mouse.old_price, mouse.discount_percentage, mouse.available), (Decimal('6000.00'), 16, True))
+        self.assertEqual((laptop.category, laptop.stock, laptop.old_price), (self.phones, 0, None))
+        # Bulk writes bypass the signals; the import keeps search and facets current itself.
+        self.assertEqual(facets.stored_cells(), facets.cells(Product.objects.all()))
+        response = self.client.get(reverse('store:product_list'), {'q': 'wireless'})
+        self.assertEqual([p.slug for p in response.context['products']], ['mouse'])
+
+    def test_jsonl_updates_only_the_columns_given(self):
+        result = self.run_import('jsonl', (
+            '{"slug": "laptop", "price": "80000.50"}\n'
+            '\n'
+            'not json\n'
+            '{"slug": "tablet", "name": "Tablet"}\n'
+        ))
+        self.assertEqual(result[:3], (0, 1, 2))
+        self.assertIn('invalid JSON', result.errors[0][1])
+        self.assertIn('category', result.errors[1][1])
+        laptop = Product.objects.get(slug='laptop')
+        self.assertEqual((laptop.name, laptop.price, laptop.category), ('Old laptop', Decimal('80000.50'), self.computing))
+
+    def test_rejected_row_leaves_earlier_rows_of_its_slug_intact(self):
+        result = self.run_import('jsonl', (
+            '{"slug": "mouse", "name": "Mouse", "category": "computing", "description": "Quiet",'
+            ' "price": "5000", "image": "products/a.jpg"}\n'
+            '{"slug": "mouse", "price": "abc"}\n'
+            '{"slug": "laptop", "price": "-5", "stock": 9}\n'
+            '{"slug": "laptop", "name": "Gaming laptop"}\n'
+        ), workers=0)
+        self.assertEqual(result[:3], (1, 1, 2))
+        self.assertEqual([line for line, _ in result.errors], [2, 3])
+        self.assertEqual(Product.objects.get(slug='mouse').price, Decimal('5000.00'))
+        laptop = Product.objects.get(slug='laptop')
+        self.assertEqual((laptop.name, laptop.price, laptop.stock), ('Gaming laptop', Decimal('90000.00'), 1))
+
+    def test_dry_run_saves_nothing(self):
+        result = self.run_import('jsonl', '{"slug": "laptop", "stock": 7}\n', dry_run=True)
+        self.assertEqual(result.updated, 1)
+        self.assertEqual(Product.objects.get(slug='laptop').stock, 1)
+
+    def test_export_round_trips_and_streams_to_staff(self):
+        exported = ''.join(catalog.render(catalog.export_rows(), 'csv'))
+        Product.objects.all().delete()
+        result = self.run_import('csv', exported)
+        self.assertEqual(result[:3], (1, 0, 0))
+        self.assertEqual(''.join(catalog.render(catalog.export_rows(), 'csv')), exported)
+
+        url = reverse('store:admin_product_export')
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url, {'format': 'jsonl'})
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row['slug'], row['category'], row['price']) for row in rows],
+                         [('laptop', 'computing', '90000.00')])
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', email='buyer@example.com', password='secret')
+        category = Category.objects.create(name='computing', slug='computing')
+        mouse = Product.objects.create(category=category, name='Mouse', slug='mouse', description='', price=50,
+                                       image='products/a.jpg')
+        address = Address.objects.create(user=self.user, full_name='Ada Obi', phone_number='080', city='Lagos',
+                                         address_line1='1 Marina', state='Lagos', postal_code='100001')
+        self.orders = []
+        for day, status, quantities in [(1, 'delivered', [1, 2]), (2, 'pending', [3]), (3, 'delivered', [])]:
+            order = Order.objects.create(user=self.user, payment_method='card', total_amount=50 * sum(quantities),
+                                         status=status, shipping_address=address if quantities else None)
+            Order.objects.filter(pk=order.pk).update(
+                created_at=timezone.make_aware(datetime(2026, 3, day, 12)))
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=mouse, quantity=quantity, price=50) for quantity in quantities)
+            self.orders.append(order)
+        Payment.objects.create(order=self.orders[0], amount=150, payment_method='card', status='completed',
+                               transaction_id='T1')
+
+    def test_rows_nest_items_and_read_a_chunk_per_prefetch(self):
+        with self.assertNumQueries(3):
+            rows = list(order_export.export_rows(chunk_size=2))
+        self.assertEqual([row['order_number'] for row in rows], [order.order_number for order in self.orders])
+        self.assertEqual([item['line_total'] for item in rows[0]['items']], [Decimal('50.00'), Decimal('100.00')])
+        self.assertEqual(rows[0]['payment']['transaction_id'], 'T1')
+        self.assertEqual(rows[0]['shipping_address']['city'], 'Lagos')
+        self.assertIsNone(rows[2]['payment'])
+
+        lines = list(order_export.render(iter(rows), 'csv'))
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].startswith('order_number,'))
+        self.assertIn(',T1,', lines[1])
+        self.assertTrue(lines[4].endswith(',,,,,\r\n'))
+
+    def test_filters_by_status_and_local_dates(self):
+        orders = order_export.filtered('delivered', date(2026, 3, 1), date(2026, 3, 2))
+        self.assertEqual(list(orders), [self.orders[0]])
+        self.assertEqual(order_export.filtered(date_from=date(2026, 3, 2)).count(), 2)
+
+        out = StringIO()
+        call_command('export_orders', '--format', 'jsonl', '--status', 'delivered', stdout=out)
+        self.assertEqual([json.loads(line)['order_number'] for line in out.getvalue().splitlines()],
+                         [self.orders[0].order_number, self.orders[2].order_number])
+
+    def test_dashboard_streams_the_export_to_staff(self):
+        url = reverse('store:admin_order_export')
+        self.client.force_login(self.user)
+        self.assertRedirects(self.client.get(url), reverse('store:home'))
+
+        self.client.force_login(User.objects.create_user('staff', password='secret', is_staff=True))
+        response = self.client.get(url, {'status': 'pending', 'from': '2026-03-01', 'to': 'soon'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders-2026-03-01.csv"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn(self.orders[1].order_number, lines[1])
+
+
+class DatabaseTuningTests(TestCase):
+    def test_sqlite_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_tuned_writers_do_not_fail(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        results = benchmarks.sqlite_write_comparison(directory, writers=4, transactions=20, readers=1)
+        self.assertEqual(results['tuned']['requests'], 80)
+        self.assertEqual(results['tuned']['errors'], 0)
+
+
+@override_settings(DB_REPLICA_ALIASES=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def in_request(self, pinned=False):
+        token = routers._state.set(routers.RequestState(pinned))
+        self.addCleanup(routers._state.reset, token)
+
+    def test_catalog_reads_go_to_a_replica_during_requests(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.in_request()
+        self.assertEqual(self.router.db_for_read(Product), 'replica1')
+        self.assertEqual(self.router.db_for_read(Order), 'replica1')
+        self.assertEqual(self.router.db_for_read(Cart), 'default')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_primary_reads(self):
+        self.in_request()
+        with routers.use_primary():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertEqual(self.router.db_for_read(Product), 'replica1')
+        order = Order()
+        order._state.db = 'default'
+        self.assertEqual(self.router.db_for_read(OrderItem, instance=order), 'default')
+
+    def test_writes_pin_the_request(self):
+        self.in_request(pinned=True)
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertEqual(self.router.db_for_write(Product), 'default')
+        self.assertTrue(routers._state.get().wrote)
+
+    def test_copy_sqlite(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        primary, replica = f'{directory}/primary.sqlite3', f'{directory}/replica.sqlite3'
+        db = sqlite3.connect(primary)
+        db.execute('CREATE TABLE t (x)')
+        db.execute('INSERT INTO t VALUES (1)')
+        db.commit()
+        db.close()
+        routers.copy_sqlite(primary, replica)
+        db = sqlite3.connect(replica)
+        self.assertEqual(db.execute('SELECT x FROM t').fetchall(), [(1,)])
+        db.close()
+
+
+@override_settings(DB_REPLICA_ALIASES=['replica1'])
+class StickySessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeded = seed_store(2)
+
+    def test_writing_keeps_the_session_on_the_primary(self):
+        self.client.force_login(self.seeded['customer'])
+        self.client.get(reverse('store:home'))
+        self.assertNotIn(routers.SESSION_KEY, self.client.session)
+        self.client.post(reverse('store:add_to_cart', args=[self.seeded['products'][0].pk]))
+        self.assertGreater(self.client.session[routers.SESSION_KEY], time.time())
+
+    async def test_async_views_write_through_the_async_path(self):
+        await self.async_client.aforce_login(self.seeded['customer'])
+        response = await self.async_client.post(
+            reverse('store:api_cart'), {'items': [{'product_id': self.seeded['products'][0].pk, 'quantity': 1}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        session = await self.async_client.asession()
+        self.assertGreater(await session.aget(routers.SESSION_KEY), time.time())
+
+
+class AssetServingTests(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(STATIC_ROOT=self.static_root, MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(f'{self.static_root}/staticfiles.json') as f:
+            hashed = json.load(f)['paths']['admin/css/base.css']
+        self.assertRegex(hashed, r'^admin/css/base\.[0-9a-f]{12}\.css$')
+
+        response = self.client.get(f'/static/{hashed}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        with open(f'{self.static_root}/{hashed}', 'rb') as f:
+            self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), f.read())
+
+        response = self.client.get(f'/static/{hashed}', HTTP_IF_NONE_MATCH=response['ETag'],
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        with open(f'{self.static_root}/site.css', 'wb') as f:
+            f.write(b'0123456789')
+        response = self.client.get('/static/site.css', HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        response = self.client.get('/static/site.css', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(self.client.get('/static/site.css', HTTP_RANGE='bytes=20-').status_code, 416)
+
+    async def test_served_under_asgi(self):
+        with open(f'{self.static_root}/site.css', 'wb') as f:
+            f.write(b'body {}')
+        response = await self.async_client.get('/static/site.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(b''.join(response.streaming_content), b'body {}')
+
+    def test_media_revalidation(self):
+        os.makedirs(f'{self.media_root}/products')
+        with open(f'{self.media_root}/products/rack.jpeg', 'wb') as f:
+            f.write(b'not really a jpeg')
+        response = self.client.get('/media/products/rack.jpeg')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=86400')
+        response = self.client.get('/media/products/rack.jpeg', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+
+class AsgiTests(TestCase):
+    @override_settings(DEBUG=True)
+    async def test_async_views_are_not_adapted(self):
+        # Django logs every sync/async adapter it puts in the chain, but only with DEBUG on.
+        user = await User.objects.acreate(username='buyer')
+        await self.async_client.aforce_login(user)
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            response = await self.async_client.get(reverse('store:api_cart'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_store(45)
+
+    def walk(self, queryset, ordering):
+        paginator = KeysetPaginator(queryset, ordering, 10)
+        page = paginator.page()
+        pages = [page]
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            pages.append(page)
+        return paginator, pages
+
+    def test_pages_cover_every_row_once_in_order(self):
+        # Many products share a price, so the id tie-breaker matters.
+        Product.objects.filter(pk__lte=Product.objects.order_by('pk')[20].pk).update(price=99)
+        for name, ordering in ORDERINGS.items():
+            with self.subTest(ordering=name):
+                _, pages = self.walk(Product.objects.all(), ordering)
+                ids = [product.pk for page in pages for product in page]
+                expected = list(Product.objects.order_by(*ordering).values_list('pk', flat=True))
+                self.assertEqual(ids, expected)
+                self.assertEqual([len(page) for page in pages], [10, 10, 10, 10, 5])
+
+    def test_previous_cursor_returns_the_page_before(self):
+        paginator, pages = self.walk(Order.objects.all(), ORDERINGS['newest'])
+        self.assertFalse(pages[0].has_previous())
+        for before, page in zip(pages, pages[1:]):
+            previous = paginator.page(page.previous_cursor)
+            self.assertEqual(list(previous), list(before))
+
+    def test_invalid_cursor_starts_over(self):
+        self.assertEqual(decode_cursor('not a cursor'), (None, False))
+        paginator = KeysetPaginator(Product.objects.all(), ORDERINGS['newest'], 10)
+        first = list(paginator.page())
+        self.assertEqual(list(paginator.page('not a cursor')), first)
+        self.assertEqual(list(paginator.page(encode_cursor([1]))), first)
+
+    def test_cursor_with_wrong_typed_values_starts_over(self):
+        for sort, values in [('price_low', ['abc', 1]), ('newest', ['yesterday', 1]), ('newest', [None, 1]),
+                             ('discount', [[50], 1]), ('price_high', [1, 'x'])]:
+            with self.subTest(sort=sort, values=values):
+                response = self.client.get(reverse('store:product_list'),
+                                           {'sort': sort, 'cursor': encode_cursor(values)})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context['products'].has_previous())
+        self.client.force_login(User.objects.create_user('manager', password='secret', is_staff=True))
+        response = self.client.get(reverse('store:admin_order_list'), {'cursor': encode_cursor(['soon', 'x'])})
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_list_follows_next_cursor(self):
+        response = self.client.get(reverse('store:product_list'), {'sort': 'price_low'})
+        page = response.context['products']
+        self.assertEqual(page.count, 45)
+        response = self.client.get(reverse('store:product_list'), {'sort': 'price_low', 'cursor': page.next_cursor})
+        second = response.context['products']
+        self.assertEqual(len(second), 12)
+        self.assertFalse({p.pk for p in page} & {p.pk for p in second})
+        self.assertContains(response, 'sort=price_low')
+
+
+class QueryPlanTests(TestCase):
+    def test_view_queries_use_indexes(self):
+        seed_store(20)
+        out = StringIO()
+        call_command('check_query_plans', fail=True, stdout=out)
+        self.assertIn('Every query uses an index.', out.getvalue())
+
+    def test_problems_reads_sqlite_and_postgres_plans(self):
+        sqlite_plan = (
+            '2 0 0 SCAN store_order\n'
+            '5 0 0 SCAN store_product USING INDEX store_product_new_idx\n'
+            '9 0 0 USE TEMP B-TREE FOR ORDER BY'
+        )
+        self.assertEqual(problems('sqlite', sqlite_plan), (['store_order'], 1))
+        postgres_plan = (
+            'Limit  (cost=10.1..10.2 rows=12 width=8)\n'
+            '  ->  Sort  (cost=10.1..10.2 rows=40 width=8)\n'
+            '        Sort Key: price\n'
+            '        ->  Seq Scan on store_product  (cost=0.0..9.0 rows=40 width=8)\n'
+            '  ->  Seq Scan on store_category  (cost=0.0..1.0 rows=7 width=8)'
+        )
+        self.assertEqual(problems('postgresql', postgres_plan), (['store_product'], 1))
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='computing', slug='computing')
+        self.product = Product.objects.create(
+            category=self.category, name='Laptop', slug='laptop', description='Laptop',
+            price=100, stock=5, image='products/laptop.jpg',
+        )
+
+    def test_warm_catalog_pages_skip_the_database(self):
+        for url in [
+            reverse('store:home'),
+            reverse('store:product_list'),
+            reverse('store:product_list_by_category', kwargs={'category_slug': 'computing'}),
+            reverse('store:product_detail', kwargs={'slug': 'laptop'}),
+        ]:
+            with self.subTest(url=url):
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    self.client.get(url)
+
+    def test_saving_a_product_invalidates_its_pages(self):
+        detail = reverse('store:product_detail', kwargs={'slug': 'laptop'})
+        self.client.get(detail)
+        self.client.get(reverse('store:home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Gaming laptop'
+            self.product.save()
+        self.assertContains(self.client.get(detail), 'Gaming laptop')
+        self.assertContains(self.client.get(reverse('store:home')), 'Gaming laptop')
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='secret')
+        category = Category.objects.create(name='computing', slug='computing')
+        self.products = [
+            Product.objects.create(
+                category=category, name=f'Laptop {i}', slug=f'laptop-{i}', description='Laptop',
+                price=100 + i, stock=5, image='products/laptop.jpg',
+            )
+            for i in range(2)
+        ]
+        self.client.force_login(self.user)
+
+    def summary(self):
+        return self.client.session['cart_summary']
+
+    def test_cart_actions_keep_the_summary_in_step(self):
+        for product in self.products + self.products[:1]:
+            self.client.get(reverse('store:add_to_cart', kwargs={'product_id': product.pk}))
+        self.assertEqual(self.summary(), {'count': 2, 'subtotal': '301.00'})
+
+        item = Cart.objects.get(product=self.products[0])
+        self.client.post(reverse('store:update_cart', kwargs={'cart_id': item.pk}), {'action': 'decrease'})
+        self.assertEqual(self.summary(), {'count': 2, 'subtotal': '201.00'})
+
+        self.client.post(reverse('store:remove_from_cart', kwargs={'cart_id': item.pk}))
+        self.assertEqual(self.summary(), {'count': 1, 'subtotal': '101.00'})
+
+    def test_header_badge_does_not_query_the_cart(self):
+        self.client.get(reverse('store:add_to_cart', kwargs={'product_id': self.products[0].pk}))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('store:order_list'))
+        self.assertEqual(response.context['cart_items_count'], 1)
+        self.assertFalse([q for q in queries if 'store_cart' in q['sql']])
+
+
+class CartApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='secret')
+        category = Category.objects.create(name='computing', slug='computing')
+        self.products = [
+            Product.objects.create(
+                category=category, name=f'Laptop {i}', slug=f'laptop-{i}', description='Laptop',
+                price=100, stock=5, image='products/laptop.jpg',
+            )
+            for i in range(3)
+        ]
+        self.url = reverse('store:api_cart')
+
+    def post(self, items):
+        return self.client.post(self.url, {'items': items}, content_type='application/json')
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_batch_is_applied_in_a_fixed_number_of_queries(self):
+        self.client.force_login(self.user)
+        Cart.objects.create(user=self.user, product=self.products[0], quantity=1)
+        Cart.objects.create(user=self.user, product=self.products[2], quantity=1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post([
+                {'product_id': self.products[0].pk, 'quantity': 3},
+                {'product_id': self.products[1].pk, 'quantity': 2},
+                {'product_id': self.products[2].pk, 'quantity': 0},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(response.json()['subtotal'], '500.00')
+        self.assertEqual(
+            dict(Cart.objects.values_list('product_id', 'quantity')),
+            {self.products[0].pk: 3, self.products[1].pk: 2},
+        )
+        self.assertEqual(len([q for q in queries if 'store_cart' in q['sql']]), 3)
+
+    def test_invalid_batch_changes_nothing(self):
+        self.client.force_login(self.user)
+        response = self.post([
+            {'product_id': self.products[0].pk, 'quantity': 1},
+            {'product_id': self.products[1].pk, 'quantity': 50},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Cart.objects.exists())
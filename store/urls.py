@@ -1,6 +1,6 @@
 # store/urls.py
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'store'
 
@@ -16,6 +16,8 @@ urlpatterns = [
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/update/<int:cart_id>/', views.update_cart, name='update_cart'),
     path('cart/remove/<int:cart_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('api/cart/', api.cart, name='api_cart'),
+    path('api/payments/<str:provider>/webhook/', api.payment_webhook, name='payment_webhook'),
 
     # Checkout and orders
     path('checkout/', views.checkout, name='checkout'),
@@ -36,9 +38,12 @@ urlpatterns = [
 
     # Admin views - CHANGED URL PATTERN
     path('dashboard/', views.admin_dashboard, name='admin_dashboard'),  # Changed from admin/dashboard/
+    path('dashboard/perf/', views.admin_perf, name='admin_perf'),
     path('dashboard/orders/', views.admin_order_list, name='admin_order_list'),
+    path('dashboard/orders/export/', views.admin_order_export, name='admin_order_export'),
     path('dashboard/orders/<int:order_id>/', views.admin_order_detail, name='admin_order_detail'),
     path('dashboard/products/', views.admin_product_list, name='admin_product_list'),
+    path('dashboard/products/export/', views.admin_product_export, name='admin_product_export'),
     path('dashboard/products/create/', views.admin_product_create, name='admin_product_create'),
     path('dashboard/products/edit/<int:product_id>/', views.admin_product_edit, name='admin_product_edit'),
     path('dashboard/products/delete/<int:product_id>/', views.admin_product_delete, name='admin_product_delete'),
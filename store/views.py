@@ -2,76 +2,163 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib import messages
-from django.db.models import Q
-from django.core.paginator import Paginator
-from django.http import JsonResponse
-from .models import *
-from .forms import *
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Prefetch
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from .models import Address, Cart, Category, Order, OrderItem, OrderTracking, Product, UserProfile
+from .forms import (
+    AddressForm, CategoryForm, CheckoutForm, LoginForm, OrderStatusForm, ProductForm, UserProfileForm,
+    UserRegistrationForm,
+)
+from . import caching, cart_summary, catalog, facets, metrics, order_export, perf, queue, recommendations, search, tasks
+from .checkout import CheckoutError, place_order
+from .pagination import ORDERINGS, KeysetPaginator, paginate_sequence
+from .routers import use_primary
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
+from django.utils.functional import SimpleLazyObject
+from urllib.parse import urlencode
+import hashlib
+
+
+# Minimum discounts the product list offers as filters.
+DISCOUNT_FILTERS = [10, 25, 50]
+
+
+def _percent(value):
+    """A 0-100 percentage from a query parameter, or ``None``."""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if 0 <= value <= 100 else None
+
+
+def _price_band(value):
+    """A price band (see store.facets) from a query parameter, or ``None``."""
+    try:
+        band = int(value)
+    except (TypeError, ValueError):
+        return None
+    return band if 0 <= band <= len(facets.PRICE_LIMITS) else None
 
 
 def home(request):
+    # The querysets are only evaluated when the cached fragments in the
+    # template have expired or been invalidated.
     categories = Category.objects.all()
-    featured_products = Product.objects.filter(available=True)[:8]
-    latest_products = Product.objects.filter(available=True).order_by('-created_at')[:12]
+    products = Product.objects.for_listing()
+    featured_products = products[:8]
+    latest_products = products.order_by('-created_at')[:12]
 
     context = {
         'categories': categories,
         'featured_products': featured_products,
         'latest_products': latest_products,
+        'cache_version': caching.versions(caching.CATALOG),
+        'cache_timeout': caching.timeout(),
     }
     return render(request, 'store/home.html', context)
 
 
 def product_list(request, category_slug=None):
-    categories = Category.objects.all()
-    products = Product.objects.filter(available=True)
+    categories = caching.cached('categories', [caching.CATALOG], lambda: list(Category.objects.all()))
 
+    category = None
     if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
-        products = products.filter(category=category)
-
-    # Search functionality
-    query = request.GET.get('q')
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query)
+        category = caching.cached(
+            f'category:{category_slug}',
+            [caching.CATALOG],
+            lambda: Category.objects.filter(slug=category_slug).first(),
         )
+        if category is None:
+            raise Http404('No Category matches the given query.')
 
-    # Sorting
+    query = request.GET.get('q')
     sort_by = request.GET.get('sort')
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'newest':
-        products = products.order_by('-created_at')
+    cursor = request.GET.get('cursor')
+    selection = facets.Selection(
+        category=category.pk if category else None,
+        price_band=_price_band(request.GET.get('price')),
+        in_stock=request.GET.get('in_stock') == '1',
+        min_discount=_percent(request.GET.get('min_discount')),
+        max_discount=_percent(request.GET.get('max_discount')),
+    )
+    products = facets.apply(Product.objects.for_listing(), selection)
+    params = hashlib.md5(f'{category_slug}?{urlencode(sorted(request.GET.lists()), doseq=True)}'.encode())
 
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Facet counts are summed from the count table, read once per catalog
+    # version. A search, or a discount range off the band limits, is counted
+    # from the matching products instead (see store.facets).
+    ranked_ids = None
+    if query:
+        def build_search():
+            ids = search.search(query)
+            return ids, facets.cells_for(selection, ids)
+
+        ranked_ids, cell_counts = caching.cached(
+            f'product_search:{params.hexdigest()}', [caching.CATALOG], build_search)
+    elif facets.on_band_limits(selection):
+        cell_counts = caching.cached('facet_cells', [caching.CATALOG], facets.stored_cells)
+    else:
+        cell_counts = caching.cached(
+            f'product_facets:{params.hexdigest()}', [caching.CATALOG], lambda: facets.cells_for(selection))
+    counts = facets.counts(cell_counts, selection)
+
+    def build_page():
+        nonlocal products
+
+        # Search functionality
+        if query:
+            products = products.filter(id__in=ranked_ids)
+
+            if not sort_by:
+                # Keep the relevance order: paginate the ranked ids and only
+                # load the products shown on the requested page.
+                matching = set(products.values_list('id', flat=True))
+                page = paginate_sequence([pk for pk in ranked_ids if pk in matching], cursor, 12)
+                products_by_id = products.in_bulk(page.object_list)
+                page.object_list = [products_by_id[pk] for pk in page.object_list]
+                return page
+
+        # Sorting
+        ordering = ORDERINGS.get(sort_by, ORDERINGS['newest'])
+        page = KeysetPaginator(products, ordering, 12).page(cursor)
+        page.count = counts['total']
+        return page
+
+    page_obj = caching.cached(f'product_list:{params.hexdigest()}', [caching.CATALOG], build_page)
 
     context = {
-        'categories': categories,
+        'categories': [(c, counts['category'][c.pk]) for c in categories],
         'products': page_obj,
         'selected_category': category_slug,
+        'price_bands': [(band, low, high, counts['price_band'][band]) for band, low, high in facets.price_bands()],
+        'in_stock_count': counts['in_stock'],
+        'discount_filters': [(percent, counts['discount'][percent]) for percent in DISCOUNT_FILTERS],
     }
     return render(request, 'store/product_list.html', context)
 
 
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug, available=True)
-    related_products = Product.objects.filter(
-        category=product.category,
-        available=True
-    ).exclude(id=product.id)[:4]
+    def load_product():
+        # get() rather than first(): a unique lookup needs no ORDER BY.
+        try:
+            return Product.objects.select_related('category').get(slug=slug, available=True)
+        except Product.DoesNotExist:
+            return None
+
+    product = caching.cached(f'product_detail:{slug}', [caching.product_namespace(slug)], load_product)
+    if product is None:
+        raise Http404('No Product matches the given query.')
 
     context = {
         'product': product,
-        'related_products': related_products,
+        # Only loaded when the cached fragment showing them has expired.
+        'related_products': SimpleLazyObject(lambda: recommendations.related_products(product)),
+        'cache_version': caching.versions(caching.category_namespace(product.category_id), caching.RECOMMENDATIONS),
+        'cache_timeout': caching.timeout(),
     }
     return render(request, 'store/product_detail.html', context)
 
@@ -92,17 +179,21 @@ def add_to_cart(request, product_id):
     if not created:
         cart_item.quantity += 1
         cart_item.save()
+        cart_summary.adjust(request, amount=product.price)
         messages.success(request, f'{product.name} quantity updated in cart.')
     else:
+        cart_summary.adjust(request, lines=1, amount=product.price)
         messages.success(request, f'{product.name} added to cart.')
 
     return redirect('store:cart_view')
 
 
 @login_required
+@use_primary()
 def cart_view(request):
-    cart_items = Cart.objects.filter(user=request.user)
-    total = sum(item.get_total_price() for item in cart_items)
+    cart_items = list(Cart.objects.filter(user=request.user).select_related('product'))
+    # The items are loaded anyway, so resynchronise the summary for free.
+    count, total = cart_summary.recalculate(request, cart_items)
 
     context = {
         'cart_items': cart_items,
@@ -113,18 +204,22 @@ def cart_view(request):
 
 @login_required
 def update_cart(request, cart_id):
-    cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
+    cart_item = get_object_or_404(Cart.objects.select_related('product'), id=cart_id, user=request.user)
 
     if request.method == 'POST':
         action = request.POST.get('action')
+        price = cart_item.product.price
 
         if action == 'increase':
             cart_item.quantity += 1
+            cart_summary.adjust(request, amount=price)
         elif action == 'decrease':
             if cart_item.quantity > 1:
                 cart_item.quantity -= 1
+                cart_summary.adjust(request, amount=-price)
             else:
                 cart_item.delete()
+                cart_summary.adjust(request, lines=-1, amount=-price)
                 return redirect('store:cart_view')
 
         cart_item.save()
@@ -134,88 +229,60 @@ def update_cart(request, cart_id):
 
 @login_required
 def remove_from_cart(request, cart_id):
-    cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
+    cart_item = get_object_or_404(Cart.objects.select_related('product'), id=cart_id, user=request.user)
     cart_item.delete()
+    cart_summary.adjust(request, lines=-1, amount=-cart_item.get_total_price())
     messages.success(request, 'Item removed from cart.')
     return redirect('store:cart_view')
 
 
 @login_required
+@use_primary()
 def checkout(request):
-    cart_items = Cart.objects.filter(user=request.user)
+    cart_items = list(Cart.objects.filter(user=request.user).select_related('product'))
 
-    if not cart_items.exists():
+    if not cart_items:
         messages.error(request, 'Your cart is empty.')
         return redirect('store:cart_view')
 
-    addresses = Address.objects.filter(user=request.user)
-    default_address = addresses.filter(is_default=True).first()
+    addresses = list(Address.objects.filter(user=request.user))
+    default_address = next((address for address in addresses if address.is_default), None)
 
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
 
         if form.is_valid():
-            # Get or create address
             address_id = form.cleaned_data.get('address')
-            if address_id:
-                shipping_address = get_object_or_404(Address, id=address_id, user=request.user)
-            else:
-                # Create new address
-                shipping_address = Address.objects.create(
-                    user=request.user,
-                    full_name=form.cleaned_data['full_name'],
-                    phone_number=form.cleaned_data['phone_number'],
-                    address_line1=form.cleaned_data['address_line1'],
-                    address_line2=form.cleaned_data['address_line2'],
-                    city=form.cleaned_data['city'],
-                    state=form.cleaned_data['state'],
-                    postal_code=form.cleaned_data['postal_code'],
-                    country=form.cleaned_data['country'],
-                )
-
-            # Calculate total
-            total = sum(item.get_total_price() for item in cart_items)
-
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                status='pending',
-                payment_method=form.cleaned_data['payment_method'],
-                total_amount=total,
-                shipping_address=shipping_address,
-            )
-
-            # Create order items
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    price=item.product.price,
-                )
-
-                # Update product stock
-                item.product.stock -= item.quantity
-                item.product.save()
-
-            # Clear cart
-            cart_items.delete()
-
-            # Create initial tracking
-            OrderTracking.objects.create(
-                order=order,
-                status='pending',
-                description='Order has been placed',
-                updated_by=request.user,
-            )
-
-            # Create payment record
-            Payment.objects.create(
-                order=order,
-                amount=total,
-                payment_method=form.cleaned_data['payment_method'],
-            )
+            try:
+                with transaction.atomic():
+                    # Get or create address
+                    if address_id:
+                        shipping_address = get_object_or_404(Address, id=address_id, user=request.user)
+                    else:
+                        # Create new address
+                        shipping_address = Address.objects.create(
+                            user=request.user,
+                            full_name=form.cleaned_data['full_name'],
+                            phone_number=form.cleaned_data['phone_number'],
+                            address_line1=form.cleaned_data['address_line1'],
+                            address_line2=form.cleaned_data['address_line2'],
+                            city=form.cleaned_data['city'],
+                            state=form.cleaned_data['state'],
+                            postal_code=form.cleaned_data['postal_code'],
+                            country=form.cleaned_data['country'],
+                        )
+
+                    order = place_order(
+                        request.user,
+                        cart_items,
+                        form.cleaned_data['payment_method'],
+                        shipping_address,
+                    )
+            except CheckoutError as e:
+                messages.error(request, str(e))
+                return redirect('store:cart_view')
 
+            cart_summary.clear(request)
             messages.success(request, f'Order placed successfully! Order Number: {order.order_number}')
             return redirect('store:order_detail', order_id=order.id)
 
@@ -249,14 +316,23 @@ def checkout(request):
 
 @login_required
 def order_list(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    orders = KeysetPaginator(
+        Order.objects.filter(user=request.user), ORDERINGS['newest'], 20
+    ).page(request.GET.get('cursor'))
     context = {'orders': orders}
     return render(request, 'store/order_list.html', context)
 
 
 @login_required
+@use_primary()
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = get_object_or_404(
+        Order.objects.select_related('shipping_address').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        ),
+        id=order_id,
+        user=request.user,
+    )
     tracking_history = order.tracking.all()
 
     context = {
@@ -302,6 +378,7 @@ def user_login(request):
 
             if user is not None:
                 login(request, user)
+                cart_summary.recalculate(request)
                 messages.success(request, 'Welcome back!')
                 return redirect('store:home')
             else:
@@ -419,22 +496,24 @@ def admin_dashboard(request):
         messages.error(request, 'Access denied.')
         return redirect('store:home')
 
-    total_orders = Order.objects.count()
-    pending_orders = Order.objects.filter(status='pending').count()
-    delivered_orders = Order.objects.filter(status='delivered').count()
-    total_revenue = Order.objects.filter(payment_status=True).aggregate(
-        total=models.Sum('total_amount')
-    )['total'] or 0
+    totals = metrics.totals()
+    sales = metrics.daily_series(30)
+    busiest = max(day['orders'] for day in sales) or 1
+    for day in sales:
+        day['height'] = round(100 * day['orders'] / busiest)
 
-    recent_orders = Order.objects.all().order_by('-created_at')[:10]
-    products = Product.objects.all().order_by('-created_at')[:20]
-    categories = Category.objects.all()
+    recent_orders = Order.objects.select_related('user').order_by('-created_at')[:10]
+    products = Product.objects.select_related('category').order_by('-created_at')[:20]
+    categories = Category.objects.annotate(product_count=Count('products'))
 
     context = {
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'delivered_orders': delivered_orders,
-        'total_revenue': total_revenue,
+        'total_orders': totals['orders'],
+        'pending_orders': totals['by_status']['pending'],
+        'delivered_orders': totals['by_status']['delivered'],
+        'total_revenue': totals['revenue'],
+        'sales': sales,
+        'sales_orders': sum(day['orders'] for day in sales),
+        'sales_revenue': sum(day['revenue'] for day in sales),
         'recent_orders': recent_orders,
         'products': products,
         'categories': categories,
@@ -442,6 +521,34 @@ def admin_dashboard(request):
     return render(request, 'store/admin_dashboard.html', context)
 
 
+@login_required
+def admin_perf(request):
+    if not request.user.is_staff:
+        messages.error(request, 'Access denied.')
+        return redirect('store:home')
+
+    if request.method == 'POST':
+        perf.get_window().clear()
+        messages.success(request, 'Performance statistics reset.')
+        return redirect('store:admin_perf')
+
+    profile = request.GET.get('profile')
+    if profile:
+        path = perf.profile_path(profile)
+        if path is None:
+            raise Http404('No such profile.')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=profile, content_type='text/plain')
+
+    context = {
+        'views': perf.get_window().summary(),
+        'profiles': perf.recent_profiles()[:20],
+        'profiling': getattr(settings, 'PERF_PROFILE', False),
+        'slow_ms': getattr(settings, 'PERF_SLOW_MS', 500),
+        'window': getattr(settings, 'PERF_WINDOW', 1000),
+    }
+    return render(request, 'store/admin_perf.html', context)
+
+
 @login_required
 def admin_order_list(request):
     if not request.user.is_staff:
@@ -450,24 +557,65 @@ def admin_order_list(request):
 
     status_filter = request.GET.get('status')
     if status_filter:
-        orders = Order.objects.filter(status=status_filter).order_by('-created_at')
+        orders = Order.objects.filter(status=status_filter)
     else:
-        orders = Order.objects.all().order_by('-created_at')
+        orders = Order.objects.all()
+    orders = KeysetPaginator(
+        orders.select_related('user'), ORDERINGS['newest'], 50, estimate_count=True
+    ).page(request.GET.get('cursor'))
 
     context = {
         'orders': orders,
         'status_filter': status_filter,
+        'status_choices': Order.STATUS_CHOICES,
     }
     return render(request, 'store/admin_order_list.html', context)
 
 
+def _date(value):
+    """A date from a query parameter, or ``None``."""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+@login_required
+def admin_order_export(request):
+    if not request.user.is_staff:
+        messages.error(request, 'Access denied.')
+        return redirect('store:home')
+
+    status = request.GET.get('status')
+    if status not in dict(Order.STATUS_CHOICES):
+        status = None
+    date_from, date_to = _date(request.GET.get('from')), _date(request.GET.get('to'))
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in catalog.FORMATS:
+        fmt = 'csv'
+    orders = order_export.filtered(status, date_from, date_to)
+    # Streamed a chunk of orders at a time, so memory stays flat however many match.
+    response = StreamingHttpResponse(
+        order_export.render(order_export.export_rows(orders), fmt),
+        content_type=f'{catalog.FORMATS[fmt]}; charset=utf-8',
+    )
+    period = '-'.join(f'{day:%Y-%m-%d}' for day in (date_from, date_to) if day) or 'all'
+    response['Content-Disposition'] = f'attachment; filename="orders-{period}.{fmt}"'
+    return response
+
+
 @login_required
 def admin_order_detail(request, order_id):
     if not request.user.is_staff:
         messages.error(request, 'Access denied.')
         return redirect('store:home')
 
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(
+        Order.objects.select_related('shipping_address').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        ),
+        id=order_id,
+    )
     tracking_history = order.tracking.all()
 
     if request.method == 'POST':
@@ -478,18 +626,22 @@ def admin_order_detail(request, order_id):
             description = form.cleaned_data['description']
             location = form.cleaned_data['location']
 
-            # Update order status
-            order.status = new_status
-            order.save()
+            with transaction.atomic():
+                # Update order status
+                order.status = new_status
+                order.save()
+
+                # Create tracking update
+                tracking = OrderTracking.objects.create(
+                    order=order,
+                    status=new_status,
+                    description=description,
+                    location=location,
+                    updated_by=request.user,
+                )
 
-            # Create tracking update
-            OrderTracking.objects.create(
-                order=order,
-                status=new_status,
-                description=description,
-                location=location,
-                updated_by=request.user,
-            )
+                # Let the customer know once the change is committed.
+                queue.enqueue(tasks.send_status_update, key=f'order-status:{tracking.pk}', tracking_id=tracking.pk)
 
             messages.success(request, 'Order status updated successfully.')
             return redirect('store:admin_order_detail', order_id=order.id)
@@ -510,11 +662,27 @@ def admin_product_list(request):
         messages.error(request, 'Access denied.')
         return redirect('store:home')
 
-    products = Product.objects.all().order_by('-created_at')
+    products = Product.objects.select_related('category').order_by('-created_at')
     context = {'products': products}
     return render(request, 'store/admin_product_list.html', context)
 
 
+@login_required
+def admin_product_export(request):
+    if not request.user.is_staff:
+        messages.error(request, 'Access denied.')
+        return redirect('store:home')
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in catalog.FORMATS:
+        fmt = 'csv'
+    # Streamed a row at a time, so a large catalog is never held in memory.
+    response = StreamingHttpResponse(
+        catalog.render(catalog.export_rows(), fmt), content_type=f'{catalog.FORMATS[fmt]}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="products-{timezone.localdate():%Y-%m-%d}.{fmt}"'
+    return response
+
+
 @login_required
 def admin_product_create(request):
     if not request.user.is_staff:
@@ -569,10 +737,8 @@ def admin_product_delete(request, product_id):
 
 # Context Processor
 def cart_items_count(request):
-    count = 0
-    if request.user.is_authenticated:
-        count = Cart.objects.filter(user=request.user).count()
-    return {'cart_items_count': count}
+    count, subtotal = cart_summary.get_summary(request)
+    return {'cart_items_count': count, 'cart_subtotal': subtotal}
 
 
 @login_required